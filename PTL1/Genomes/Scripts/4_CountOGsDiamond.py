@@ -15,7 +15,8 @@ import argparse, os, re, sys
 from argparse import RawTextHelpFormatter, SUPPRESS
 from distutils import spawn
 from Bio import SeqIO
-from statistics import mean
+
+import HookLens
 
 
 #----------------------------- Colors For Print Statements ------------------------------#
@@ -243,16 +244,8 @@ def update_fasta(args):
 
 	hook_fasta = [file for file in os.listdir(args.databases + '/db_OG') if file.endswith('.fasta')][0]
 
-	#Getting average length in Hook: addition per 9/2023 update
-	OGLenDB = {}
-	for rec in SeqIO.parse(args.databases + '/db_OG/' + hook_fasta, 'fasta'):
-		if rec.id[-10:] not in OGLenDB:
-			OGLenDB.update({ rec.id[-10:] : [] })
-
-		OGLenDB[rec.id[-10:]].append(len(str(rec.seq)))
-
-	for og in OGLenDB:
-		OGLenDB[og] = mean(OGLenDB[og])
+	#Getting average length in Hook: addition per 9/2023 update (cached next to the Hook fasta by HookLens.py)
+	OGLenDB = HookLens.og_mean_lens([args.databases + '/db_OG/' + hook_fasta])
 
 	keep = [i for i in open(args.tsv_out).read().split('\n') if i != '']
 	
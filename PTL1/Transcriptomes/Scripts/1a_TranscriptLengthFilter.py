@@ -72,6 +72,10 @@ def check_args():
 	help=color.BOLD+color.GREEN+'Assembly from Genbank\n (Will include Accession Number in'\
 	' contig name)\n'+color.END)
 
+	optional_arg_group.add_argument('--streaming', action='store_true',
+	help=color.BOLD+color.GREEN+'Reads the assembly in two passes without holding the\n sequences in'\
+	' memory (for very large assemblies)\n'+color.END)
+
 	optional_arg_group.add_argument('-author', action='store_true',
 	help=color.BOLD+color.GREEN+' Print author contact information\n'+color.END)
 	
@@ -155,6 +159,54 @@ def prep_folders(args):
 		os.system('mkdir ' + '/'.join(args.output_file.split('/')[:-1]) + '/XlaneBleeding/')
 
 
+###########################################################################################
+###-------------- Streams Contigs Within the Length Limits, Longest First --------------###
+###########################################################################################
+
+## First pass: records only the byte offset of the header line and the sequence length of
+## each contig within the length limits (lengths are counted as BioPython would parse them)
+def index_contigs(args):
+
+	contigs = []
+	offset = 0; start = None; length = 0
+
+	with open(args.input_file, 'rb') as f:
+		for line in f:
+			if line.startswith(b'>'):
+				if start != None and length >= args.minLen and length <= args.maxLen:
+					contigs.append((start, length))
+				start = offset; length = 0
+			elif start != None:
+				length += len(line.rstrip().replace(b' ', b'').replace(b'\r', b''))
+			offset += len(line)
+
+	if start != None and length >= args.minLen and length <= args.maxLen:
+		contigs.append((start, length))
+
+	return contigs
+
+
+## Second pass: seeks back to each indexed contig, longest first (ties keep their order in
+## the file), and yields its (title, sequence)
+def stream_contigs(args):
+
+	contigs = index_contigs(args)
+	contigs.sort(key = lambda contig: -contig[1])
+
+	with open(args.input_file, 'rb') as f:
+		for offset, length in contigs:
+			f.seek(offset)
+			title = f.readline().decode()[1:].rstrip()
+
+			lines = []
+			for line in f:
+				if line.startswith(b'>'):
+					break
+				lines.append(line.rstrip())
+
+			yield title, b''.join(lines).replace(b' ', b'').replace(b'\r', b'').decode()
+
+
 ###########################################################################################
 ###---------- Renames the Contigs, Writes them out, and Calculates Basic Info ----------###
 ###########################################################################################
@@ -165,55 +217,56 @@ def rename_Transcriptome(args):
 
 	print (color.BOLD+'\n\nPrepping '+color.GREEN+args.input_file.split('/')[-1]+color.END)
 
-	inFasta = [i for i in SeqIO.parse(args.input_file,'fasta') if len(i.seq) >= args.minLen and len(i.seq) <= args.maxLen]
-	inFasta.sort(key=lambda seq_rec: -len(seq_rec.seq))
-
-	renamed_seqs = []
-	seq_code_dict = {}
+	if args.streaming == True:
+		inFasta = stream_contigs(args)
+	else:
+		inFasta = [i for i in SeqIO.parse(args.input_file,'fasta') if len(i.seq) >= args.minLen and len(i.seq) <= args.maxLen]
+		inFasta.sort(key=lambda seq_rec: -len(seq_rec.seq))
+		inFasta = [(seq_rec.description, str(seq_rec.seq)) for seq_rec in inFasta]
 
 	count = 1
 
 	seq_name_start = 'Contig'
 
-	if args.genbank == True:
-		for seq_rec in inFasta:
-			seq_code_dict.setdefault(seq_rec.id,[]).append(seq_rec.id.split('_')[-1].split('.')[0]+'_Contig_'+str(count)+'_Len'+str(len(seq_rec.seq)))
-			seq_code_dict.setdefault(seq_rec.id,[]).append(str(seq_rec.seq).upper())
-			renamed_seqs.append('>'+seq_rec.id.split('_')[-1].split('.')[0]+'_Contig_'+str(count)+'_Len'+str(len(seq_rec.seq))+'\n'+str(seq_rec.seq).upper())
-			count += 1
-	elif args.spades == True:
-		for seq_rec in inFasta:
-			seq_code_dict.setdefault(seq_rec.description,[]).append(seq_name_start+'_'+str(count)+'_Len'+str(len(seq_rec.seq))+'_Cov'+str(int(round(float(seq_rec.description.split('_')[-3])))))
-			seq_code_dict.setdefault(seq_rec.description,[]).append(seq_rec.description.split('_')[5])
-			seq_code_dict.setdefault(seq_rec.description,[]).append(str(seq_rec.seq).upper())
-			renamed_seqs.append('>'+seq_name_start+'_'+str(count)+'_Len'+str(len(seq_rec.seq))+'_Cov'+str(int(round(float(seq_rec.description.split('_')[-3]))))+'\n'+str(seq_rec.seq).upper())
-			count += 1
-	else:
-		for seq_rec in inFasta:
-			seq_code_dict.setdefault(seq_rec.description,[]).append(seq_name_start+'_'+str(count)+'_Len'+str(len(seq_rec.seq)))
-			seq_code_dict.setdefault(seq_rec.description,[]).append(str(seq_rec.seq).upper())
-			renamed_seqs.append('>'+seq_name_start+'_'+str(count)+'_Len'+str(len(seq_rec.seq))+'\n'+str(seq_rec.seq).upper())
-			count += 1
-	
-	print (color.BOLD+'\n\nThere are '+color.RED+str(len(renamed_seqs))+' contigs > '+str(args.minLen)\
-	+color.END+color.BOLD+' in '+color.DARKCYAN+args.input_file.split('/')[-1]+color.END)
-	
+	## Contigs are written out as they are renamed; only the first contig with a given name
+	## gets a line in the SeqCodes spreadsheet
+	seen_names = set()
+
 	with open(home_folder + args.output_file.split('/')[-1] + '.' + str(args.minLen)+'bp.fasta','w+') as w:
-		for seq in renamed_seqs:
-			w.write(seq+'\n')
+		with open(home_folder + args.output_file.split('/')[-1] + '.' + str(args.minLen) + 'bp.SeqCodes.tsv','w+') as t:
+			if args.spades != True:
+				t.write('Original Name\tNew Name\tSeq Length\t Seq GC\n')
+			else:
+				t.write('Original Name\tNew Name\tSeq Length\tSeq GC\tSeq Coverage\n')
+
+			for description, seq in inFasta:
+				seq = seq.upper()
+
+				if args.genbank == True:
+					name = description.split(None, 1)[0] if description != '' else ''
+					new_name = name.split('_')[-1].split('.')[0]+'_Contig_'+str(count)+'_Len'+str(len(seq))
+				elif args.spades == True:
+					name = description
+					new_name = seq_name_start+'_'+str(count)+'_Len'+str(len(seq))+'_Cov'+str(int(round(float(description.split('_')[-3]))))
+				else:
+					name = description
+					new_name = seq_name_start+'_'+str(count)+'_Len'+str(len(seq))
+
+				w.write('>'+new_name+'\n'+seq+'\n')
+
+				if name not in seen_names:
+					seen_names.add(name)
+					if args.spades != True:
+						t.write(name+'\t'+new_name+'\t'+str(len(seq))+'\t'+str(GC(seq))+'\n')
+					else:
+						t.write(name+'\t'+new_name+'\t'+str(len(seq))+'\t'+str(GC(seq))+'\t'+str(description.split('_')[5])+'\n')
+
+				count += 1
 	
-	if args.spades != True:
-		with open(home_folder + args.output_file.split('/')[-1] + '.' + str(args.minLen) + 'bp.SeqCodes.tsv','w+') as w:
-			w.write('Original Name\tNew Name\tSeq Length\t Seq GC\n')
-			for k, v in seq_code_dict.items():
-				w.write(k+'\t'+v[0]+'\t'+str(len(v[1]))+'\t'+str(GC(v[1]))+'\n')
-	else:
-		with open(home_folder + args.output_file.split('/')[-1] + '.' + str(args.minLen) + 'bp.SeqCodes.tsv','w+') as w:
-			w.write('Original Name\tNew Name\tSeq Length\tSeq GC\tSeq Coverage\n')
-			for k, v in seq_code_dict.items():
-				w.write(k+'\t'+v[0]+'\t'+str(len(v[2]))+'\t'+str(GC(v[2]))+'\t'+str(v[1])+'\n')
+	print (color.BOLD+'\n\nThere are '+color.RED+str(count - 1)+' contigs > '+str(args.minLen)\
+	+color.END+color.BOLD+' in '+color.DARKCYAN+args.input_file.split('/')[-1]+color.END)
+
 
-	
 ###########################################################################################
 ###-------------------------- Cleans Up the PostAssembly Folder ------------------------###
 ###########################################################################################
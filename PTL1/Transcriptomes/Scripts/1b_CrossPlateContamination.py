@@ -74,80 +74,87 @@ def sort_cluster(folder, listtaxa, minlen, conspecific_names):
 	os.system('vsearch --cluster_fast ' + '/'.join(folder.split('/')[:-1]) + '/forclustering.fasta --strand both --query_cov '+str(seqcoverage)+' --id '+str(toosim) +' --uc ' + '/'.join(folder.split('/')[:-1]) + '/clusteringresults_vsearch/results_forclustering.uc --threads 60' )
 	
 	cluster_output = '/'.join(folder.split('/')[:-1]) + '/clusteringresults_vsearch/results_forclustering.uc'
-	out2 = open('/'.join(folder.split('/')[:-1]) + '/fastatokeep.fas','w+')
-	out3 = open('/'.join(folder.split('/')[:-1]) + '/fastatoremoved.fas','w+')
-	out4 = open('/'.join(folder.split('/')[:-1]) + '/fastatoremoved.uc','w+')
-	
+
 	print("Creating a dictionary with clustering results\n")
-	clustdict= {}; clustlist = []; allseq = []; clustline = {}; list= []; i=0; j=0
-	for row2 in open(cluster_output, 'r'):
-		if row2.split('\t')[0] == 'C' and int(row2.split('\t')[2]) < 2: # keep all unique sequences
-			out2.write('>'+row2.split('\t')[8] + '\n' + str(fastadict[row2.split('\t')[8]])+ '\n')
-		if row2.split('\t')[0] == 'C' and int(row2.split('\t')[2]) > 1: # create another dictionary
-			clustdict.setdefault(row2.split('\t')[8], [row2.split('\t')[8]])
-			clustlist.append(row2.split('\t')[8])
-
-	for row3 in open(cluster_output, 'r'):
-		if row3.split('\t')[0] == 'H':
-			clustdict[row3.split('\t')[9].replace('\n','')].append(row3.split('\t')[8].replace('\n',''))
-			clustline[row3.split('\t')[8].replace('\n','')] = row3.replace('\n','')
-			clustline[row3.split('\t')[9].replace('\n','')] = row3.replace('\n','')
-
-	print("Parsing the clusters: keeping seed sequences (highest coverage) for each cluster")
-	#For each cluster
-	for clust in clustlist:
-		#Define the highest covered sequence in the cluster as the 'master,' against which all
-		#more lowly covered sequences will be compared.
-		list = sorted(clustdict[clust], reverse = True, key=lambda x: int(x.split('_Cov')[1]))
-		master = list[0]
-		Covmaster = int(list[0].split('_Cov')[1])
-		master8dig = ('_').join(list[0].split('_')[0:3])[:-2]
-		
-		#For each sequence that is not the highest covered sequence in the cluster
-		for seq in list:
-			clustered =  seq.replace('\n','')
-			Covclustered = int(clustered.split('_Cov')[1])
-			clustered8dig = ('_').join(clustered.split('_')[0:3])[:-2]
-
-			#Keep any sequence if it has more than 1/10 the coverage of the highest covered sequence in the cluster
-			if float(Covmaster/Covclustered) < 10:
-				out2.write('>'+clustered + '\n' + str(fastadict[clustered])+ '\n')
-				i +=1
-			#Don't remove a sequence if it is from the same taxon as the highest covered sequence in the cluster
-			elif conspecific_names_dict[master[:10]] == conspecific_names_dict[clustered[:10]]:
-				out2.write('>'+clustered + '\n' + str(fastadict[clustered])+ '\n')
-				i +=1
-			#Keep any sequence with coverage >= 50
-			elif Covclustered >= 50:				
-				out2.write('>'+clustered + '\n' + str(fastadict[clustered])+ '\n')
-				i +=1
-			#Otherwise, remove the lower covered sequence
-			else:
-				j +=1
-				out4 = open('/'.join(folder.split('/')[:-1]) + '/fastatoremoved.uc','a')
-				out3.write('>'+clustered + '\n' + str(fastadict[clustered])+ '\n')
-				print(clustline[clustered],'\t' , master )
-				out4.write(clustline[clustered]+ '\t' + master + '\n')
-				out4.close()
+	#The .uc file is read once: C records give the size of each cluster (by its seed) and H records
+	#give the members of each cluster (query, column 9) along with the line describing each hit
+	singletons = []; clustdict= {}; clustlist = []; clustline = {}; members = {}; i=0; j=0
+	for row in open(cluster_output, 'r'):
+		row = row.rstrip('\n'); fields = row.split('\t')
+		if fields[0] == 'C' and int(fields[2]) < 2: # keep all unique sequences
+			singletons.append(fields[8])
+		elif fields[0] == 'C': # create another dictionary
+			clustdict.setdefault(fields[8], [fields[8]])
+			clustlist.append(fields[8])
+		elif fields[0] == 'H':
+			members.setdefault(fields[9], []).append(fields[8])
+			clustline[fields[8]] = row
+			clustline[fields[9]] = row
 
+	for clust in clustlist:
+		clustdict[clust] += members.get(clust, [])
+
+	#All three outputs stay open (and buffered) for the whole evaluation
+	with open('/'.join(folder.split('/')[:-1]) + '/fastatokeep.fas','w+') as out2, open('/'.join(folder.split('/')[:-1]) + '/fastatoremoved.fas','w+') as out3, open('/'.join(folder.split('/')[:-1]) + '/fastatoremoved.uc','w+') as out4:
+		for seed in singletons:
+			out2.write('>'+seed + '\n' + str(fastadict[seed])+ '\n')
+
+		print("Parsing the clusters: keeping seed sequences (highest coverage) for each cluster")
+		#For each cluster
+		for clust in clustlist:
+			#Define the highest covered sequence in the cluster as the 'master,' against which all
+			#more lowly covered sequences will be compared.
+			list = sorted(clustdict[clust], reverse = True, key=lambda x: int(x.split('_Cov')[1]))
+			master = list[0]
+			Covmaster = int(list[0].split('_Cov')[1])
+			master8dig = ('_').join(list[0].split('_')[0:3])[:-2]
+
+			#For each sequence that is not the highest covered sequence in the cluster
+			for seq in list:
+				clustered =  seq.replace('\n','')
+				Covclustered = int(clustered.split('_Cov')[1])
+				clustered8dig = ('_').join(clustered.split('_')[0:3])[:-2]
+
+				#Keep any sequence if it has more than 1/10 the coverage of the highest covered sequence in the cluster
+				if float(Covmaster/Covclustered) < 10:
+					out2.write('>'+clustered + '\n' + str(fastadict[clustered])+ '\n')
+					i +=1
+				#Don't remove a sequence if it is from the same taxon as the highest covered sequence in the cluster
+				elif conspecific_names_dict[master[:10]] == conspecific_names_dict[clustered[:10]]:
+					out2.write('>'+clustered + '\n' + str(fastadict[clustered])+ '\n')
+					i +=1
+				#Keep any sequence with coverage >= 50
+				elif Covclustered >= 50:
+					out2.write('>'+clustered + '\n' + str(fastadict[clustered])+ '\n')
+					i +=1
+				#Otherwise, remove the lower covered sequence
+				else:
+					j +=1
+					out3.write('>'+clustered + '\n' + str(fastadict[clustered])+ '\n')
+					print(clustline[clustered],'\t' , master )
+					out4.write(clustline[clustered]+ '\t' + master + '\n')
 
 	print('there are ', str(i),' sequences kept and ',str(j),' sequences removed')
-	
-	out2.close()
-	out3.close()
 
 	splittaxa(folder, listtaxa, minlen)
 
-#Rewriting the files per taxon, minus the sequences removed by the similarity comparison
+#Rewriting the files per taxon, minus the sequences removed by the similarity comparison. The merged
+#file of kept sequences is read once, and each sequence is written to the file of its taxon (the first
+#10 characters of its name).
 def splittaxa(folder, listtaxa, minlen):
+	taxon_files = {}
 	for taxa in listtaxa:
 		tax_sf_path = '/'.join(folder.split('/')[:-1]) + '/' + taxa + '/SizeFiltered/'
 		os.system('mv ' + tax_sf_path + taxa + '.' + str(minlen) + 'bp.fasta' + ' ' + tax_sf_path + taxa + '.' + str(minlen) + 'bp.preXPlate.fasta')
 
-		with open(tax_sf_path + taxa + '.' + str(minlen) + 'bp.fasta','w') as o:
-			for kept in SeqIO.parse('/'.join(folder.split('/')[:-1]) + '/fastatokeep.fas','fasta'):
-				if taxa in kept.description:
-					o.write('>' + kept.description.replace(taxa + '_', '') + '\n' + str(kept.seq) + '\n')
+		taxon_files[taxa] = open(tax_sf_path + taxa + '.' + str(minlen) + 'bp.fasta','w')
+
+	for kept in SeqIO.parse('/'.join(folder.split('/')[:-1]) + '/fastatokeep.fas','fasta'):
+		if kept.description[:10] in taxon_files:
+			taxon_files[kept.description[:10]].write('>' + kept.description[11:] + '\n' + str(kept.seq) + '\n')
+
+	for taxa in taxon_files:
+		taxon_files[taxa].close()
 
 	os.system('mv ' + '/'.join(folder.split('/')[:-1]) + '/fastatokeep.fas ' + '/'.join(folder.split('/')[:-1]) + '/clusteringresults_vsearch/')
 	os.system('mv ' + '/'.join(folder.split('/')[:-1]) + '/fastatoremoved.fas ' + '/'.join(folder.split('/')[:-1]) + '/clusteringresults_vsearch/')
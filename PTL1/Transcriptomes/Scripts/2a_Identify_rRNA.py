@@ -157,14 +157,14 @@ def remove_rDNA(args, rRNA_folder):
 	blast_output = rRNA_folder + args.input_file.split('/')[-1].split('.200bp.fasta')[0]+'_allSSULSUresults.tsv'
 	
 	BLASTN_cmd = 'blastn -query ' + args.input_file + ' -evalue 1e-10 -max_target_seqs 1 -outfmt'\
-	' 6 -db ' + args.databases + '/db_BvsE/SSULSUdb -num_threads 2 -out ' + blast_output
+	' 6 -db ' + args.databases + '/db_BvsE/SSULSUdb -num_threads ' + str(args.threads) + ' -out ' + blast_output
 		
 	print (color.BOLD+'\n\nBLASTing '+color.DARKCYAN+args.input_file.split('/')[-1]+color.END\
 		+color.BOLD+ ' against the rDNA database\n\n' + color.END)
 
 	os.system(BLASTN_cmd)		
 
-	rDNA_Hits = list(set([i.split('\t')[0] for i in open(blast_output).readlines()]))
+	rDNA_Hits = set([i.split('\t')[0] for i in open(blast_output)])
 
 	print (color.BOLD+'Binning Sequences from '+color.DARKCYAN+args.input_file.split('/')[-1]\
 		+color.END+color.BOLD+'\nas rDNA OR Potentially Protein-Coding\n\n'+color.END)
@@ -172,17 +172,13 @@ def remove_rDNA(args, rRNA_folder):
 	no_SSULSU = 0
 	with_SSULSU = 0
 
-	inFasta = [seq_rec for seq_rec in SeqIO.parse(args.input_file,'fasta')]
-
-	with open(rRNA_folder + args.input_file.split('/')[-1].split('.200bp.fasta')[0]+'_rRNAseqs.fasta','w+') as HasSSU:
-		for seq_rec in inFasta:
+	#Splitting the transcripts into the two files in a single pass
+	with open(rRNA_folder + args.input_file.split('/')[-1].split('.200bp.fasta')[0]+'_rRNAseqs.fasta','w+') as HasSSU, open(rRNA_folder + args.input_file.split('/')[-1].split('.200bp.fasta')[0] + '_NorRNAseqs.fasta','w+') as NoSSU:
+		for seq_rec in SeqIO.parse(args.input_file,'fasta'):
 			if seq_rec.description in rDNA_Hits:
 				HasSSU.write('>'+seq_rec.description+'\n'+str(seq_rec.seq)+'\n')
 				with_SSULSU += 1
-
-	with open(rRNA_folder + args.input_file.split('/')[-1].split('.200bp.fasta')[0] + '_NorRNAseqs.fasta','w+') as NoSSU:
-		for seq_rec in inFasta:
-			if seq_rec.description not in rDNA_Hits:
+			else:
 				NoSSU.write('>'+seq_rec.description+'\n'+str(seq_rec.seq)+'\n')
 				no_SSULSU += 1
 
@@ -16,6 +16,16 @@
 # ones provided on the GitHub) is in the proper database folder 
 # (Databases/BvsE/eukout.dmnd and micout.dmnd).
 
+# With --combined_db, the two databases are instead merged (once) into a single source-tagged
+# database (Databases/db_BvsE/BvE_combined.dmnd), so that each transcriptome is only translated
+# and searched once. Because DIAMOND e-values scale with database size, the e-value of each hit
+# is rescaled to the size of the database it came from before the comparison above. This mode is
+# an approximation of the default one, not an exact equivalent: the default searches keep the best
+# hit from each database, but the combined search keeps only the best --combined_targets hits
+# (default 25) across both. If a contig has more than that many better hits in one database, its
+# best hit in the other is lost and the contig is classified as if it had no hit there (e.g. "P"
+# or "E" where the default mode might give "U"). Raising --combined_targets makes this rarer.
+
 
 import argparse, os, sys
 from argparse import RawTextHelpFormatter,SUPPRESS
@@ -89,6 +99,16 @@ def check_args():
 	help=color.BOLD+color.GREEN+"Path to databases"+color.END)
 
 	optional_arg_group = parser.add_argument_group(color.ORANGE+color.BOLD+'Options'+color.END)
+	optional_arg_group.add_argument('--combined_db', action='store_true',
+	help=color.BOLD+color.GREEN+' Search a single combined Euk/Prok database once\n (built from'\
+	' eukout.dmnd and micout.dmnd the first time it is needed).\n Approximates the two separate'\
+	' searches: a contig whose\n best hit in one database ranks below --combined_targets\n hits from'\
+	' the other is treated as having no hit there\n'+color.END)
+	optional_arg_group.add_argument('--combined_targets', type=int, default=25,
+	help=color.BOLD+color.GREEN+' Number of target sequences to keep per contig (across\n both databases) when'\
+	' searching the combined database\n (default = 25)\n'+color.END)
+	optional_arg_group.add_argument('--threads','-t', default='60',
+	help=color.BOLD+color.GREEN+' Number of threads to use for DIAMOND\n (default = 60)\n'+color.END)
 	optional_arg_group.add_argument('-author', action='store_true',
 	help=color.BOLD+color.GREEN+' Print author contact information\n'+color.END)
 
@@ -187,6 +207,51 @@ def prep_folders(args):
 		os.system('mkdir '+BvE_folder)
 
 		
+###########################################################################################
+###-------------- Builds the Combined (Source-Tagged) Bact and Euk Database -------------###
+###########################################################################################
+
+def db_letters(diamond_path, db):
+
+	for line in os.popen(diamond_path + ' dbinfo -d ' + db).read().split('\n'):
+		if line.strip().startswith('Letters'):
+			return int(line.split()[-1])
+
+
+def make_combined_db(args, diamond_path):
+
+	db_folder = args.databases + '/db_BvsE/'
+	sources = { 'EUK__' : db_folder + 'eukout.dmnd', 'PROK__' : db_folder + 'micout.dmnd' }
+
+	#Rebuilt only if missing or older than either of the two source databases
+	if not os.path.isfile(db_folder + 'BvE_combined.dmnd') or not os.path.isfile(db_folder + 'BvE_combined.letters') \
+		or any(os.path.getmtime(sources[tag]) > os.path.getmtime(db_folder + 'BvE_combined.dmnd') for tag in sources):
+
+		print(color.BOLD+'\n\nBuilding the combined PROK/EUK database: ' + color.DARKCYAN + 'BvE_combined.dmnd' + color.END + '\n\n')
+
+		#Every subject ID is tagged with its source, and written under a temporary name so that
+		#several taxa started at the same time never search a partial database
+		tmp_name = db_folder + 'BvE_combined.' + str(os.getpid())
+		os.system('rm -f ' + tmp_name + '.fasta')
+		for tag in sources:
+			os.system(diamond_path + ' getseq -d ' + sources[tag] + ' | sed "s/^>/>' + tag + '/" >> ' + tmp_name + '.fasta')
+		os.system(diamond_path + ' makedb --in ' + tmp_name + '.fasta -d ' + tmp_name)
+		os.remove(tmp_name + '.fasta')
+
+		with open(tmp_name + '.letters', 'w') as o:
+			for tag in sources:
+				o.write(tag + '\t' + str(db_letters(diamond_path, sources[tag])) + '\n')
+			o.write('ALL\t' + str(db_letters(diamond_path, tmp_name + '.dmnd')) + '\n')
+
+		os.replace(tmp_name + '.letters', db_folder + 'BvE_combined.letters')
+		os.replace(tmp_name + '.dmnd', db_folder + 'BvE_combined.dmnd')
+
+	#Factor by which to scale combined e-values to those against each source database alone
+	letters = { line.split('\t')[0] : int(line.split('\t')[1]) for line in open(db_folder + 'BvE_combined.letters') }
+
+	return db_folder + 'BvE_combined.dmnd', { tag : letters[tag]/letters['ALL'] for tag in sources }
+
+
 ###########################################################################################
 ###---------------- Runs Diamond on Bact and Euk small RefSeq Databases ----------------###
 ###########################################################################################
@@ -197,25 +262,38 @@ def ublast_BvE(args, diamond_path):
 	mic_output = args.input_file.split('/')[-1]+'micresults.'
 	euk_output = args.input_file.split('/')[-1]+'eukresults.'
 
+	if args.combined_db:
+		combined_db, scale = make_combined_db(args, diamond_path)
+
+		print(color.BOLD+'\n\n"BLAST"-ing against combined PROK/EUK database using DIAMOND: ' + color.DARKCYAN + 'BvE_combined.dmnd' + color.END + '\n\n')
+
+		#The e-value cutoff is loosened here and applied again after rescaling (in compare_hits)
+		Combined_diamond_cmd = diamond_path + ' blastx -q ' + args.input_file + ' --max-target-seqs ' + str(args.combined_targets) + ' -d ' + combined_db + ' --evalue ' + str(1e-5/min(scale.values())) + ' --threads ' + str(args.threads) + ' --outfmt 6 -o ' + BvE_folder + 'allBvEresults.tsv'
+
+		os.system(Combined_diamond_cmd)
+
+		return scale
+
 	print(color.BOLD+'\n\n"BLAST"-ing against PROK database using DIAMOND: ' + color.DARKCYAN + 'micout.dmnd' + color.END + '\n\n')
 
-	Prok_diamond_cmd = diamond_path + ' blastx -q ' + args.input_file + ' --max-target-seqs 1 -d ' + args.databases + '/db_BvsE/micout.dmnd --evalue 1e-5 --threads 60 --outfmt 6 -o ' + BvE_folder + 'allmicresults.tsv'
+	Prok_diamond_cmd = diamond_path + ' blastx -q ' + args.input_file + ' --max-target-seqs 1 -d ' + args.databases + '/db_BvsE/micout.dmnd --evalue 1e-5 --threads ' + str(args.threads) + ' --outfmt 6 -o ' + BvE_folder + 'allmicresults.tsv'
 
 	os.system(Prok_diamond_cmd)
 
 	print(color.BOLD+'\n\n"BLAST"-ing against EUK database using DIAMOND: ' + color.DARKCYAN + 'eukout.dmnd' + color.END + '\n\n')
 
-	Euk_diamond_cmd = diamond_path + ' blastx -q ' + args.input_file + ' --max-target-seqs 1 -d ' + args.databases + '/db_BvsE/eukout.dmnd --evalue 1e-5 --threads 60 --outfmt 6 -o ' + BvE_folder + 'alleukresults.tsv'
+	Euk_diamond_cmd = diamond_path + ' blastx -q ' + args.input_file + ' --max-target-seqs 1 -d ' + args.databases + '/db_BvsE/eukout.dmnd --evalue 1e-5 --threads ' + str(args.threads) + ' --outfmt 6 -o ' + BvE_folder + 'alleukresults.tsv'
 
 	os.system(Euk_diamond_cmd)
 
+	return None
 
 
 ###########################################################################################
 ###---------------- Compares Bacterial and Euk Hits for Classification -----------------###
 ###########################################################################################
 
-def compare_hits(args):
+def compare_hits(args, scale):
 
 	BvE_folder = '/'.join(args.input_file.split('/')[:-1]) + '/BvE/'
 	
@@ -230,19 +308,31 @@ def compare_hits(args):
 			ProkDict[seq_rec.description] = ''
 			CompDict[seq_rec.description] = []
 
-	inEukHits = [i for i in open(BvE_folder + 'alleukresults.tsv').readlines()]
-	inEukHits.sort(key=lambda x: (float(x.split('\t')[-2]), -int(x.split('\t')[3])))
-	
-	inProkHits = [i for i in open(BvE_folder + 'allmicresults.tsv').readlines()]
-	inProkHits.sort(key=lambda x: (float(x.split('\t')[-2]), -int(x.split('\t')[3])))
-	
-	for i in inEukHits:
-		if EukDict[i.split('\t')[0]] == '':
-			EukDict[i.split('\t')[0]] = float(i.split('\t')[-2])
-	
-	for i in inProkHits:
-		if ProkDict[i.split('\t')[0]] == '':
-			ProkDict[i.split('\t')[0]] = float(i.split('\t')[-2])
+	if args.combined_db:
+		#One streaming pass over the combined hits, keeping the best (lowest) rescaled e-value
+		#per contig from each source
+		for i in open(BvE_folder + 'allBvEresults.tsv'):
+			i = i.split('\t')
+			tag = 'EUK__' if i[1].startswith('EUK__') else 'PROK__'
+			evalue = float(i[-2])*scale[tag]
+			SourceDict = EukDict if tag == 'EUK__' else ProkDict
+
+			if evalue <= 1e-5 and (SourceDict[i[0]] == '' or evalue < SourceDict[i[0]]):
+				SourceDict[i[0]] = evalue
+	else:
+		inEukHits = [i for i in open(BvE_folder + 'alleukresults.tsv').readlines()]
+		inEukHits.sort(key=lambda x: (float(x.split('\t')[-2]), -int(x.split('\t')[3])))
+
+		inProkHits = [i for i in open(BvE_folder + 'allmicresults.tsv').readlines()]
+		inProkHits.sort(key=lambda x: (float(x.split('\t')[-2]), -int(x.split('\t')[3])))
+
+		for i in inEukHits:
+			if EukDict[i.split('\t')[0]] == '':
+				EukDict[i.split('\t')[0]] = float(i.split('\t')[-2])
+
+		for i in inProkHits:
+			if ProkDict[i.split('\t')[0]] == '':
+				ProkDict[i.split('\t')[0]] = float(i.split('\t')[-2])
 	
 	for k in CompDict.keys():
 		if EukDict[k] != '':
@@ -364,9 +454,9 @@ def main():
 
 	prep_folders(args)
 	
-	ublast_BvE(args, usearch_path)
+	scale = ublast_BvE(args, usearch_path)
 
-	Euk_Contigs, Prok_Contigs, Und_Contigs = compare_hits(args)
+	Euk_Contigs, Prok_Contigs, Und_Contigs = compare_hits(args, scale)
 		
 	clean_up(args)
 	
@@ -84,8 +84,8 @@ def check_args():
 	help=color.BOLD+color.GREEN+"Path to fasta file with Hook sequences"+color.END)
 
 	optional_arg_group = parser.add_argument_group(color.ORANGE+color.BOLD+'Options'+color.END)
-	optional_arg_group.add_argument('--threads','-t', default='2',
-	help=color.BOLD+color.GREEN+' Number of threads to use for BLAST\n (default = 2)\n'+color.END)
+	optional_arg_group.add_argument('--threads','-t', default='60',
+	help=color.BOLD+color.GREEN+' Number of threads to use for DIAMOND\n (default = 60)\n'+color.END)
 	optional_arg_group.add_argument('--evalue','-e', default=1e-5, type = float,
 	help=color.BOLD+color.GREEN+' Maximum e-value for OG assignment\n (default = 1e-5)\n'+color.END)
 	optional_arg_group.add_argument('-author', action='store_true',
@@ -199,7 +199,7 @@ def OG_diamond(args, diamond_path):
 
 	print (color.BOLD + '\n\n"BLAST"-ing against OG database using DIAMOND: ' + color.DARKCYAN + db + color.END + '\n\n')
 			
-	OG_diamond_cmd = diamond_path + ' blastx -q ' + args.input_file + ' -d ' + args.databases + '/db_OG/' + db + ' --evalue ' + str(args.evalue) + ' --threads 60 --subject-cover 0.35 --outfmt 6 -o ' + OG_folder + 'allOGresults.tsv'
+	OG_diamond_cmd = diamond_path + ' blastx -q ' + args.input_file + ' -d ' + args.databases + '/db_OG/' + db + ' --evalue ' + str(args.evalue) + ' --threads ' + str(args.threads) + ' --subject-cover 0.35 --outfmt 6 -o ' + OG_folder + 'allOGresults.tsv'
 	
 	os.system(OG_diamond_cmd)	
 
@@ -214,16 +214,18 @@ def keep_best(args):
 	
 	OG_folder = '/'.join(args.input_file.split('/')[:-1]) + '/DiamondOG/'
 		
-	inTSV = [i for i in open(OG_folder + 'allOGresults.tsv').readlines()]
-	
-	inTSV.sort(key = lambda x: -float(x.split('\t')[-1]))
-	
-	keep = []
-	for i in inTSV:
-		if any(i.split('\t')[0] in j for j in keep) != True:
-			keep.append(i)
-
-	updated_lines = list(set([line.split('\t')[0]+'_'+'_'.join(line.split('\t')[1].split('_')[-2:])+'\t'+'\t'.join(line.split('\t')[1:]) for line in keep]))
+	# Streams the DIAMOND table once, keeping the highest scoring hit (last column) per
+	# transcript; ties go to the earlier line in the table.
+	best_hits = {}
+	for line in open(OG_folder + 'allOGresults.tsv'):
+		if line.strip() == '':
+			continue
+		query = line.split('\t')[0]
+		score = float(line.split('\t')[-1])
+		if query not in best_hits or score > best_hits[query][0]:
+			best_hits[query] = (score, line)
+
+	updated_lines = [line.split('\t')[0]+'_'+'_'.join(line.split('\t')[1].split('_')[-2:])+'\t'+'\t'.join(line.split('\t')[1:]) for score, line in best_hits.values()]
 		
 	with open(args.input_file.replace('.fasta','.Renamed_allOGCleanresults.tsv'), 'w+') as w:
 		for i in updated_lines:
@@ -53,6 +53,7 @@ from distutils import spawn
 from Bio import SeqIO
 from Bio.Seq import Seq
 from Bio.Data.CodonTable import CodonTable
+import numpy as np
 
 
 #-------------------------- Set-up Codon Tables (Genetic Codes) --------------------------#
@@ -167,8 +168,13 @@ def check_args():
 	help=color.BOLD+color.GREEN+"sequence number cutoff"+color.END)
 
 	optional_arg_group = parser.add_argument_group(color.ORANGE+color.BOLD+'Options'+color.END)
+	optional_arg_group.add_argument('--threads','-t', default='60',
+	help=color.BOLD+color.GREEN+' Number of threads to use for DIAMOND\n (default = 60)\n'+color.END)
 	optional_arg_group.add_argument('-author', action='store_true',
 	help=color.BOLD+color.GREEN+' Prints author contact information\n'+color.END)
+	optional_arg_group.add_argument('--batched', action='store_true',
+	help=color.BOLD+color.GREEN+' Searches the TAA, TGA and TAG translations against\n'\
+	' RepEukProts in a single DIAMOND run\n'+color.END)
 
 	if len(sys.argv[1:]) == 0:
 		print (parser.description)
@@ -269,197 +275,80 @@ def prep_folders(args):
 ###--------------------- Translates Sequences with Each Stop Codon ---------------------###
 ###########################################################################################
 
+#Trims the ORF out of a transcript given its coordinates from the OG hit, running from the
+#start of the hit up to the first stop codon of the given table (or the end of the hit)
+def trim_orf(seq, coords, table):
+
+	if coords[0] == 'F':
+		temp = seq[coords[1]:]
+		temp_prot = str(temp.translate(table=table))
+		if '*' in temp_prot:
+			return temp[:(temp_prot.index('*')+1)*3]
+		return seq[coords[1]:coords[2]]
+
+	temp = seq[:coords[1]].reverse_complement()
+	temp_prot = str(temp.translate(table=table))
+	if '*' in temp_prot:
+		return temp[:(temp_prot.index('*')+1)*3]
+	return seq[coords[2]:coords[1]].reverse_complement()
+
+
 def prep_translations(args):
 	print (color.BOLD+'\nIdentifying ORFs in the Fasta file based on the output of 3_CountOGsDiamond.py\n'+color.END)
 	
 	intsv = [i for i in open(args.input_file.replace('.fasta','_allOGCleanresults.tsv')).readlines() if i != '\n']
 
-	inFasta = [i for i in SeqIO.parse(args.input_file,'fasta')]
-
+	#ORF coordinates (from the first hit) and OG assignments (from all hits) per sequence
 	prot_dict = {}
+	og_dict = {}
 	for i in intsv:
-#		print i
-		prot_dict.setdefault(i.split('\t')[0],[])
-		if int(i.split('\t')[6]) < int(i.split('\t')[7]):
-			prot_dict[i.split('\t')[0]].append('F')
-			if (int(i.split('\t')[6])) < 5:
-				prot_dict[i.split('\t')[0]].append(int(i.split('\t')[6])-1)
-			else:
-				prot_dict[i.split('\t')[0]].append(int(i.split('\t')[6])-1)
-			prot_dict[i.split('\t')[0]].append(int(i.split('\t')[7])+3)
-		if int(i.split('\t')[7]) < int(i.split('\t')[6]):
-			prot_dict[i.split('\t')[0]].append('RC')
-			prot_dict[i.split('\t')[0]].append(int(i.split('\t')[6]))
-			if (int(i.split('\t')[7])-4) < 5:
-				prot_dict[i.split('\t')[0]].append(int(i.split('\t')[7]))
-			else:
-				prot_dict[i.split('\t')[0]].append(int(i.split('\t')[7])-4)
+		key = i.split('\t')[0]
+		start = int(i.split('\t')[6]); end = int(i.split('\t')[7])
+
+		if key not in prot_dict:
+			if start < end:
+				prot_dict.update({ key : ['F', start-1, end+3] })
+			elif end < start:
+				if (end-4) < 5:
+					prot_dict.update({ key : ['RC', start, end] })
+				else:
+					prot_dict.update({ key : ['RC', start, end-4] })
+
+		og = i.split('\t')[1][-10:]
+		if 'no_group' in og:
+			og = 'no_group'
+		og_dict.setdefault(key, [])
+		if og not in og_dict[key]:
+			og_dict[key].append(og)
 
 	print(args.seq_count)
-	if len(list(prot_dict.keys())) < 50:
+	if len(list(og_dict.keys())) < 50:
 		with open(args.databases +'/Taxa_with_few_sequences.txt', "a") as f:
 			f.write("\n" +args.input_file.split('/')[-1] )
 		exit()
 
+	#Index the renamed transcripts by sequence ID once, keeping only those with OG hits
+	seq_index = { rec.id : rec.seq for rec in SeqIO.parse(args.input_file,'fasta') if rec.id in prot_dict }
 
-	#------------- Prep translation with 'TAA' as the only Stop -------------#
-	
-	print (color.BOLD+'\n\nTranslating DNA using'+color.RED+' TAA'+color.END\
-	+color.BOLD+' as the sole STOP codon\n'+color.END)
-
-	for key, value in prot_dict.items():
-		for seq_rec in inFasta:
-			if key in seq_rec.description:
-				stop_pos = 0
-				if prot_dict[key][0] == 'F':
-					temp = seq_rec.seq[prot_dict[key][1]:]
-					temp_prot = str(temp.translate(table=c_uncinata_table))
-					if '*' in temp_prot:		
-						stop_pos = (temp_prot.index('*')+1)*3
-						prot_dict[key].append(temp[:stop_pos])
-					else:
-						prot_dict[key].append(seq_rec.seq[prot_dict[key][1]:prot_dict[key][2]])
-				if prot_dict[key][0] == 'RC':
-					temp = seq_rec.seq[:prot_dict[key][1]].reverse_complement()
-					temp_prot = str(temp.translate(table=c_uncinata_table))
-					if '*' in temp_prot:		
-						stop_pos = (temp_prot.index('*')+1)*3
-						prot_dict[key].append(temp[:stop_pos])
-					else:
-						prot_dict[key].append(seq_rec.seq[prot_dict[key][2]:prot_dict[key][1]].reverse_complement())
-
-
-	#------------- Prep translation with 'TGA' as the only Stop -------------#
-	print (color.BOLD+'\n\nTranslating DNA using'+color.RED+' TGA'+color.END\
-	+color.BOLD+' as the sole STOP codon\n'+color.END)	
-	
-	for key, value in prot_dict.items():
-		for seq_rec in inFasta:
-			if key in seq_rec.description:
-				stop_pos = 0
-				if prot_dict[key][0] == 'F':
-					temp = seq_rec.seq[prot_dict[key][1]:]
-					temp_prot = str(temp.translate(table=6))
-					if '*' in temp_prot:		
-						stop_pos = (temp_prot.index('*')+1)*3
-						prot_dict[key].append(temp[:stop_pos])
-					else:
-						prot_dict[key].append(seq_rec.seq[prot_dict[key][1]:prot_dict[key][2]])
-				if prot_dict[key][0] == 'RC':
-					temp = seq_rec.seq[:prot_dict[key][1]].reverse_complement()
-					temp_prot = str(temp.translate(table=6))
-					if '*' in temp_prot:		
-						stop_pos = (temp_prot.index('*')+1)*3
-						prot_dict[key].append(temp[:stop_pos])
-					else:
-						prot_dict[key].append(seq_rec.seq[prot_dict[key][2]:prot_dict[key][1]].reverse_complement())
-	
-			
-	#------------- Prep translation with 'TAG' as the only Stop -------------#
-	print (color.BOLD+'\n\nTranslating DNA using'+color.RED+' TAG'+color.END\
-	+color.BOLD+' as the sole STOP codon\n'+color.END)
-	
-	
-	for key, value in prot_dict.items():
-		for seq_rec in inFasta:
-			if key in seq_rec.description:
-				stop_pos = 0
-				if prot_dict[key][0] == 'F':
-					temp = seq_rec.seq[prot_dict[key][1]:]
-					temp_prot = str(temp.translate(table=tag_table))
-					if '*' in temp_prot:		
-						stop_pos = (temp_prot.index('*')+1)*3
-						prot_dict[key].append(temp[:stop_pos])
-					else:
-						prot_dict[key].append(seq_rec.seq[prot_dict[key][1]:prot_dict[key][2]])
-				if prot_dict[key][0] == 'RC':
-					temp = seq_rec.seq[:prot_dict[key][1]].reverse_complement()
-					temp_prot = str(temp.translate(table=tag_table))
-					if '*' in temp_prot:		
-						stop_pos = (temp_prot.index('*')+1)*3
-						prot_dict[key].append(temp[:stop_pos])
-					else:
-						prot_dict[key].append(seq_rec.seq[prot_dict[key][2]:prot_dict[key][1]].reverse_complement())
-					
-	#------------ Parsing through data to maintain OG assignments ------------#
-	inOGs = intsv
-	inOGs = [i.split('\t')[0]+';'+i.split('\t')[1][-10:] for i in inOGs]
-	inOGs2 = []
-	for i in inOGs:
-		if 'no_group' not in i.split(';')[1]:
-			inOGs2.append(i)
-		else:
-			inOGs2.append(i.split(';')[0]+';no_group')
-	inOGs2 = list(set(inOGs2))
+	for stop, table in (('taa', c_uncinata_table), ('tga', 6), ('tag', tag_table)):
+
+		print (color.BOLD+'\n\nTranslating DNA using'+color.RED+' '+stop.upper()+color.END\
+		+color.BOLD+' as the sole STOP codon\n'+color.END)
+
+		orfs = { key : trim_orf(seq, prot_dict[key], table) for key, seq in seq_index.items() }
+
+		#---------------- Write files with only one Stop ----------------#
 
-	#---------------- Write file with 'TAA' is the only Stop ----------------#
-						
-	with open(args.input_file.split('.fas')[0]+'_taa_ORF.fasta','w+') as w:
-		print (color.BOLD+'\n\nWriting FASTA files with ORF and Protein sequences with'+color.RED\
-		+' TAA '+color.END+color.BOLD+'as only STOP codon\n'+color.END)
-		
-		for key, value in prot_dict.items():
-			for j in inOGs2:
-				if key == j.split(';')[0]:
-					if len(prot_dict[key]) < 4:
-						pass
-					else:
-						w.write('>'+key+'_'+j.split(';')[1]+'\n'+str(value[-3]).upper()+'\n')
-						
-	with open(args.input_file.split('.fas')[0]+'_taa_ORF.aa.fasta','w+') as w:
-		for key, value in prot_dict.items():
-			for j in inOGs2:
-				if key == j.split(';')[0]:
-					if len(prot_dict[key]) < 4:
-						pass
-					else:
-						w.write('>'+key+'_'+j.split(';')[1]+'\n'+str(Seq(str(value[-3])).translate(table=c_uncinata_table)).upper()+'\n')					
-
-	#---------------- Write file with 'TGA' is the only Stop ----------------#
-	
-	with open(args.input_file.split('.fas')[0]+'_tga_ORF.fasta','w+') as w:
-		print (color.BOLD+'\n\nWriting FASTA files with ORF and Protein sequences with'+color.RED\
-		+' TGA '+color.END+color.BOLD+'as only STOP codon\n'+color.END)
-	
-		for key, value in prot_dict.items():
-			for j in inOGs2:
-				if key == j.split(';')[0]:
-					if len(prot_dict[key]) < 4:
-						pass
-					else:
-						w.write('>'+key+'_'+j.split(';')[1]+'\n'+str(value[-2]).upper()+'\n')
-					
-	with open(args.input_file.split('.fas')[0]+'_tga_ORF.aa.fasta','w+') as w:
-		for key, value in prot_dict.items():
-			for j in inOGs2:
-				if key == j.split(';')[0]:
-					if len(prot_dict[key]) < 4:
-						pass
-					else:
-						w.write('>'+key+'_'+j.split(';')[1]+'\n'+str(Seq(str(value[-2])).translate(table=6)).upper()+'\n')
-						
-	#---------------- Write file with 'TAG' is the only Stop ----------------#
-	
-	with open(args.input_file.split('.fas')[0]+'_tag_ORF.fasta','w+') as w:
 		print (color.BOLD+'\n\nWriting FASTA files with ORF and Protein sequences with'+color.RED\
-		+' TAG '+color.END+color.BOLD+'as only STOP codon\n'+color.END)
-		
-		for key, value in prot_dict.items():
-			for j in inOGs2:
-				if key == j.split(';')[0]:
-					if len(prot_dict[key]) < 4:
-						pass
-					else:
-						w.write('>'+key+'_'+j.split(';')[1]+'\n'+str(value[-1]).upper()+'\n')
-	
-	with open(args.input_file.split('.fas')[0]+'_tag_ORF.aa.fasta','w+') as w:
-		for key, value in prot_dict.items():
-			for j in inOGs2:
-				if key == j.split(';')[0]:
-					if len(prot_dict[key]) < 4:
-						pass
-					else:
-						w.write('>'+key+'_'+j.split(';')[1]+'\n'+str(Seq(str(value[-1])).translate(table=tag_table)).upper()+'\n')				
+		+' '+stop.upper()+' '+color.END+color.BOLD+'as only STOP codon\n'+color.END)
+
+		with open(args.input_file.split('.fas')[0]+'_'+stop+'_ORF.fasta','w+') as w:
+			with open(args.input_file.split('.fas')[0]+'_'+stop+'_ORF.aa.fasta','w+') as w_aa:
+				for key in og_dict:
+					if key in orfs:
+						for og in og_dict[key]:
+							w.write('>'+key+'_'+og+'\n'+str(orfs[key]).upper()+'\n')
+							w_aa.write('>'+key+'_'+og+'\n'+str(orfs[key].translate(table=table)).upper()+'\n')
 
 
 ###########################################################################################		
@@ -467,11 +356,37 @@ def prep_translations(args):
 ###########################################################################################
 
 def diamond_ProtDB(args, diamond_path):
-	os.system(diamond_path + ' blastp -q ' + args.input_file.split('.fas')[0] + '_tag_ORF.aa.fasta -d ' + args.databases + '/db_StopFreq/RepEukProts.dmnd --evalue 1e-5 --max-target-seqs 1 --threads 60 --outfmt 6 -o ' + args.input_file.split('.fas')[0] + '_tag_ORF.RepEukProts.tsv')
+	if args.batched:
+		#Tags each query with its stop codon so that all three translations are searched in one
+		#DIAMOND run (loading the database once), then splits the hits back out by tag
+		prefix = args.input_file.split('.fas')[0]
+
+		with open(prefix + '_all_ORF.aa.fasta', 'w') as w:
+			for stop in ('tag', 'tga', 'taa'):
+				for line in open(prefix + '_' + stop + '_ORF.aa.fasta'):
+					if line.startswith('>'):
+						line = '>' + stop + '__' + line[1:]
+					w.write(line)
+
+		os.system(diamond_path + ' blastp -q ' + prefix + '_all_ORF.aa.fasta -d ' + args.databases + '/db_StopFreq/RepEukProts.dmnd --evalue 1e-5 --max-target-seqs 1 --threads ' + str(args.threads) + ' --outfmt 6 -o ' + prefix + '_all_ORF.RepEukProts.tsv')
+
+		hits = { 'tag' : [], 'tga' : [], 'taa' : [] }
+		for line in open(prefix + '_all_ORF.RepEukProts.tsv'):
+			if line.strip() != '':
+				hits[line.split('__')[0]].append(line.split('__', 1)[1])
+
+		for stop in hits:
+			with open(prefix + '_' + stop + '_ORF.RepEukProts.tsv', 'w') as o:
+				o.write(''.join(hits[stop]))
+
+		os.system('rm ' + prefix + '_all_ORF.aa.fasta ' + prefix + '_all_ORF.RepEukProts.tsv')
 
-	os.system(diamond_path + ' blastp -q ' + args.input_file.split('.fas')[0] + '_tga_ORF.aa.fasta -d ' + args.databases + '/db_StopFreq/RepEukProts.dmnd --evalue 1e-5 --max-target-seqs 1 --threads 60 --outfmt 6 -o ' + args.input_file.split('.fas')[0] + '_tga_ORF.RepEukProts.tsv')
+	else:
+		os.system(diamond_path + ' blastp -q ' + args.input_file.split('.fas')[0] + '_tag_ORF.aa.fasta -d ' + args.databases + '/db_StopFreq/RepEukProts.dmnd --evalue 1e-5 --max-target-seqs 1 --threads ' + str(args.threads) + ' --outfmt 6 -o ' + args.input_file.split('.fas')[0] + '_tag_ORF.RepEukProts.tsv')
+
+		os.system(diamond_path + ' blastp -q ' + args.input_file.split('.fas')[0] + '_tga_ORF.aa.fasta -d ' + args.databases + '/db_StopFreq/RepEukProts.dmnd --evalue 1e-5 --max-target-seqs 1 --threads ' + str(args.threads) + ' --outfmt 6 -o ' + args.input_file.split('.fas')[0] + '_tga_ORF.RepEukProts.tsv')
 
-	os.system(diamond_path + ' blastp -q ' + args.input_file.split('.fas')[0] + '_taa_ORF.aa.fasta -d ' + args.databases + '/db_StopFreq/RepEukProts.dmnd --evalue 1e-5 --max-target-seqs 1 --threads 60 --outfmt 6 -o ' + args.input_file.split('.fas')[0] + '_taa_ORF.RepEukProts.tsv')
+		os.system(diamond_path + ' blastp -q ' + args.input_file.split('.fas')[0] + '_taa_ORF.aa.fasta -d ' + args.databases + '/db_StopFreq/RepEukProts.dmnd --evalue 1e-5 --max-target-seqs 1 --threads ' + str(args.threads) + ' --outfmt 6 -o ' + args.input_file.split('.fas')[0] + '_taa_ORF.RepEukProts.tsv')
 
 
 ###########################################################################################	
@@ -479,6 +394,50 @@ def diamond_ProtDB(args, diamond_path):
 ###########################################################################################
 
 
+#Counts the in-frame TAG, TGA and TAA codons (and all codons) in a window of each ORF, given
+#as (sequence, first codon position, end position). Every sequence is uppercased and encoded
+#once, and all of them are concatenated so that stop codons are found in a single vectorized
+#pass; prefix sums of each stop codon along each of the three frames then give the count
+#in any window. Returns an array with one row of [TAG, TGA, TAA, codons] per window.
+def scan_stops(windows):
+
+	if len(windows) == 0:
+		return np.zeros((0, 4), dtype = np.int64)
+
+	lengths = np.array([len(seq) for seq, start, end in windows], dtype = np.int64)
+	offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+	starts = np.array([start for seq, start, end in windows], dtype = np.int64)
+	ends = np.array([end for seq, start, end in windows], dtype = np.int64)
+
+	seqs = np.frombuffer(''.join([seq for seq, start, end in windows]).upper().encode(), dtype = np.uint8)
+	first = seqs[:-2] == ord('T'); second = seqs[1:-1]; third = seqs[2:]
+
+	#Every window position is counted as a codon, but a stop codon can only be found where a
+	#full codon remains in the sequence
+	n_codons = np.maximum(ends - starts + 2, 0) // 3
+	n_full = np.maximum(np.minimum(ends, lengths - 2) - starts + 2, 0) // 3
+
+	frames = (offsets + starts) % 3
+	first_idx = (offsets + starts) // 3
+
+	counts = np.zeros((len(windows), 4), dtype = np.int64)
+	counts[:, 3] = n_codons
+	for col, stop in enumerate(((ord('A'), ord('G')), (ord('G'), ord('A')), (ord('A'), ord('A')))):
+		is_stop = (first & (second == stop[0]) & (third == stop[1])).astype(np.int64)
+
+		per_frame = np.zeros((3, len(is_stop)//3 + 2), dtype = np.int64)
+		for frame in range(3):
+			in_frame = np.cumsum(is_stop[frame::3])
+			per_frame[frame, 1:len(in_frame)+1] = in_frame
+			per_frame[frame, len(in_frame)+1:] = in_frame[-1] if len(in_frame) > 0 else 0
+
+		lo = np.minimum(first_idx, per_frame.shape[1] - 1)
+		hi = np.minimum(first_idx + n_full, per_frame.shape[1] - 1)
+		counts[:, col] = per_frame[frames, hi] - per_frame[frames, lo]
+
+	return counts
+
+
 def hunt_for_stops(args):
 		
 	#------------------------ Open Fasta Files ------------------------#
@@ -529,153 +488,36 @@ def hunt_for_stops(args):
 		taa_dict.setdefault(i.split('\t')[0].replace('_Chilo',''),[]).append(int(i.split('\t')[-6]))
 		taa_dict.setdefault(i.split('\t')[0].replace('_Chilo',''),[]).append(int(i.split('\t')[-5]))
 
-	#-------------- Preparing In-Frame Stop Codon Counts --------------#
+	#-------- Gathering In-frame Stop Codon Density Information --------#
+
+	windows = []; table_rows = {}
+	for stop, inFasta, hits in (('TGA', TGAinFasta, tga_dict), ('TAG', TAGinFasta, tag_dict), ('TAA', TAAinFasta, taa_dict)):
+		print (color.BOLD+'\nCollecting in-frame stop codon information when'+color.RED\
+		+' '+stop+color.END+color.BOLD+' is the only STOP\n'+color.END)
+
+		first_row = len(windows)
+		for i in inFasta:
+			if i.description in hits:
+				windows.append((str(i.seq), (hits[i.description][0]-1)*3, (hits[i.description][1]*3)-3))
+		table_rows.update({ stop : (first_row, len(windows)) })
+
+	counts = scan_stops(windows)
 
 # All the data when TGA is the sole stop codon
-	tga_codons = 0
-	tga_data_tag = 0
-	tga_data_tga = 0
-	tga_data_taa = 0
-	tga_seq_count = 0 
-
-# All the data when TAG is the sole stop codon	
-	tag_codons = 0
-	tag_data_tag = 0
-	tag_data_tga = 0
-	tag_data_taa = 0
-	tag_seq_count = 0
-	
-# All the data when TAA is the sole stop codon	
-	taa_codons = 0
-	taa_data_tag = 0
-	taa_data_tga = 0
-	taa_data_taa = 0
-	taa_seq_count = 0
-	
-# All the data for each stop codon combined
-	tga_inframe = 0
-	tag_inframe = 0
-	taa_inframe = 0
-	total_codons = 0
-	total_seq_counts = len(open(args.input_file).read().split('>'))-1
+	tga_data_tag, tga_data_tga, tga_data_taa, tga_codons = [int(n) for n in counts[table_rows['TGA'][0]:table_rows['TGA'][1]].sum(axis = 0)]
+	tga_seq_count = table_rows['TGA'][1] - table_rows['TGA'][0]
 
+# All the data when TAG is the sole stop codon
+	tag_data_tag, tag_data_tga, tag_data_taa, tag_codons = [int(n) for n in counts[table_rows['TAG'][0]:table_rows['TAG'][1]].sum(axis = 0)]
+	tag_seq_count = table_rows['TAG'][1] - table_rows['TAG'][0]
 
-	#-------- Gathering In-frame Stop Codon Density Information --------#
-	
-### Collect in-frame stop information for "TAA" and "TAG" when TGA is the ONLY stop	
-	print (color.BOLD+'\nCollecting in-frame stop codon information when'+color.RED\
-	+' TGA'+color.END+color.BOLD+' is the only STOP\n'+color.END)
-	
-	for i in TGAinFasta:
-		try:
-			if tga_dict[i.description][0] == 1:
-				for n in range((tga_dict[i.description][0]-1),((tga_dict[i.description][1])*3)-3,3):
-					if str(i.seq).upper()[n:n+3] == 'TAG':
-						tga_data_tag += 1
-						tag_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TAA':
-						tga_data_taa += 1
-						taa_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TGA':
-						tga_data_tga += 1
-						tga_inframe += 1
-					tga_codons += 1
-					total_codons += 1
-				tga_seq_count += 1 
-					
-			else:
-				for n in range(((tga_dict[i.description][0]-1)*3),((tga_dict[i.description][1])*3)-3,3):
-					if str(i.seq).upper()[n:n+3] == 'TAG':
-						tga_data_tag += 1
-						tag_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TAA':
-						tga_data_taa += 1
-						taa_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TGA':
-						tga_data_tga += 1
-						tga_inframe += 1
-					tga_codons += 1 
-					total_codons += 1
-				tga_seq_count += 1
-		except:
-			pass		
-			
-### Collect in-frame stop information for "TAA" and "TGA" when TAG is the ONLY stop	
-	print (color.BOLD+'\nCollecting in-frame stop codon information when'+color.RED\
-	+' TAG'+color.END+color.BOLD+' is the only STOP\n'+color.END)	
-
-	for i in TAGinFasta:
-		try:
-			if tag_dict[i.description][0] == 1:
-				for n in range((tag_dict[i.description][0]-1),((tag_dict[i.description][1])*3)-3,3):
-					if str(i.seq).upper()[n:n+3] == 'TAG':
-						tag_data_tag += 1
-						tag_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TAA':	
-						tag_data_taa += 1
-						taa_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TGA':	
-						tag_data_tga += 1
-						tga_inframe += 1
-					tag_codons += 1
-					total_codons += 1 
-				tag_seq_count += 1
-				
-			else:
-				for n in range(((tag_dict[i.description][0]-1)*3),(tag_dict[i.description][1]*3)-3,3):
-					if str(i.seq).upper()[n:n+3] == 'TAG':
-						tag_data_tag += 1
-						tag_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TAA':	
-						tag_data_taa += 1
-						taa_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TGA':	
-						tag_data_tga += 1
-						tga_inframe += 1
-					tag_codons += 1 
-					total_codons += 1
-				tag_seq_count += 1
-		except:
-			pass
-
-
-### Collect in-frame stop information for "TGA" and "TAG" when TAA is the ONLY stop	
-	print (color.BOLD+'\nCollecting in-frame stop codon information when'+color.RED\
-	+' TAA'+color.END+color.BOLD+' is the only STOP\n'+color.END)
-		
-	for i in TAAinFasta:
-		try:
-			if taa_dict[i.description][0] == 1:
-				for n in range((taa_dict[i.description][0]-1),((taa_dict[i.description][1])*3)-3,3):
-					if str(i.seq).upper()[n:n+3] == 'TAG':
-						taa_data_tag += 1
-						tag_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TAA':	
-						taa_data_taa += 1
-						taa_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TGA':	
-						taa_data_tga += 1
-						tga_inframe += 1
-					taa_codons += 1 
-					total_codons += 1
-				taa_seq_count += 1
-				
-			else:
-				for n in range(((taa_dict[i.description][0]-1)*3),(taa_dict[i.description][1]*3)-3,3):
-					if str(i.seq).upper()[n:n+3] == 'TAG':
-						taa_data_tag += 1
-						tag_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TAA':	
-						taa_data_taa += 1
-						taa_inframe += 1
-					if str(i.seq).upper()[n:n+3].upper() == 'TGA':	
-						taa_data_tga += 1
-						tga_inframe += 1
-					tag_codons += 1 
-					total_codons += 1
-				taa_seq_count += 1
-		except:
-			pass
+# All the data when TAA is the sole stop codon
+	taa_data_tag, taa_data_tga, taa_data_taa, taa_codons = [int(n) for n in counts[table_rows['TAA'][0]:table_rows['TAA'][1]].sum(axis = 0)]
+	taa_seq_count = table_rows['TAA'][1] - table_rows['TAA'][0]
+
+# All the data for each stop codon combined
+	tag_inframe, tga_inframe, taa_inframe, total_codons = [int(n) for n in counts.sum(axis = 0)]
+	total_seq_counts = len(open(args.input_file).read().split('>'))-1
 
 	#-------------- Writing Data Out and Print Statement --------------#	
 
@@ -25,6 +25,7 @@ from argparse import RawTextHelpFormatter,SUPPRESS
 from Bio import SeqIO
 from Bio.Seq import Seq
 from Bio.Data.CodonTable import CodonTable
+import numpy as np
 
 
 #-------------------------- Set-up Codon Tables (Genetic Codes) --------------------------#
@@ -256,6 +257,7 @@ def check_args():
 	args.ntd_out = args.input_file.split('.fas')[0]+'_'+args.genetic_code.title()+'_NTD.ORF.fasta'
 	args.aa_out = args.input_file.split('.fas')[0]+'_'+args.genetic_code.title()+'_AA.ORF.fasta'
 	args.tsv_out = args.input_file.split('.fas')[0]+'_'+args.genetic_code.title()+'_allOGCleanresults.tsv'
+	args.short_out = args.input_file.split('.fas')[0]+'_'+args.genetic_code.title()+'_ShortTranscripts_FromTranslation.txt'
 
 	args.home_folder = '/'.join(args.input_file.split('/')[:-1])
 	args.Diamond_Folder = args.home_folder+'/DiamondOG'
@@ -353,14 +355,102 @@ def prep_folders(args):
 
 
 
+##########################################################################################
+###------------ Precompiled Genetic Codes and Batched Codon Translation ---------------###
+##########################################################################################
+
+#Codon codes for each byte: A, C, G and T (in either case) are 0-3, anything else is 4
+base_code = np.full(256, 4, dtype = np.uint8)
+for n, base in enumerate('ACGT'):
+	base_code[ord(base)] = n
+	base_code[ord(base.lower())] = n
+
+## A genetic code compiled into a 64-entry lookup array (index 16*first + 4*second + third,
+## with A/C/G/T as 0-3). Each entry is filled in by BioPython itself, so translations match
+## Seq.translate exactly; codons with any other character (N, etc.) are left to BioPython
+## and remembered.
+class GeneticCode(object):
+
+	def __init__(self, codon_table):
+
+		self.codon_table = codon_table
+		self.lookup = np.zeros(65, dtype = np.uint8)
+		for n, codon in enumerate([a + b + c for a in 'ACGT' for b in 'ACGT' for c in 'ACGT']):
+			self.lookup[n] = ord(str(Seq(codon).translate(table = codon_table)))
+
+		self.other_codons = {}
+
+	def other_codon(self, codon):
+
+		codon = codon.upper()
+		if codon not in self.other_codons:
+			self.other_codons.update({ codon : str(Seq(codon).translate(table = self.codon_table)) })
+
+		return self.other_codons[codon]
+
+
+## All transcripts of a taxon, concatenated and encoded once into the lookup index of the
+## codon starting at every position (64 for codons with a non-ACGT character), so that any
+## stretch of any transcript can be translated under any compiled code by array indexing.
+class CodonIndex(object):
+
+	def __init__(self, seqs):
+
+		self.joined = ''.join(seqs)
+		self.lengths = np.array([len(seq) for seq in seqs], dtype = np.int64)
+		self.offsets = np.cumsum(self.lengths) - self.lengths
+
+		#One byte per base throughout (codon indices are at most 64), built in place to keep the
+		#temporary arrays small on large transcriptomes
+		codes = base_code[np.frombuffer(self.joined.encode(), dtype = np.uint8)]
+		self.codons = codes[:-2]*16
+		self.codons += codes[1:-1]*4
+		self.codons += codes[2:]
+
+		other = codes == 4
+		del codes
+		other = other[:-2] | other[1:-1] | other[2:]
+		self.codons[other] = 64
+
+	#Translates seqs[n][start:end] (a partial codon at the end is dropped, as in BioPython)
+	def translate(self, n, start, end, gcode):
+
+		start, end, step = slice(start, end).indices(int(self.lengths[n]))
+		n_codons = max(0, (end - start)//3)
+		first = int(self.offsets[n]) + start
+
+		codons = self.codons[first:first + 3*n_codons:3]
+		prot = gcode.lookup[codons]
+		for i in np.flatnonzero(codons == 64):
+			prot[i] = ord(gcode.other_codon(self.joined[first + 3*i:first + 3*i + 3]))
+
+		return prot.tobytes().decode()
+
+	#Translates every sequence in full, in one batch
+	def translate_all(self, gcode):
+
+		n_codons = self.lengths//3
+		ends = np.cumsum(n_codons)
+		within = np.arange(ends[-1] if len(ends) > 0 else 0) - np.repeat(ends - n_codons, n_codons)
+		positions = np.repeat(self.offsets, n_codons) + 3*within
+
+		codons = self.codons[positions]
+		prots = gcode.lookup[codons]
+		for i in np.flatnonzero(codons == 64):
+			prots[i] = ord(gcode.other_codon(self.joined[positions[i]:positions[i] + 3]))
+
+		prots = prots.tobytes().decode()
+		return [prots[end - n:end] for n, end in zip(n_codons.tolist(), ends.tolist())]
+
+
 ##########################################################################################
 ###---------------- Scans 5-Prime End of Transcript for In-Frame "ATG" ----------------###
 ##########################################################################################
 
-def check_new_start_new(some_seq, low_lim, upper_lim, old_start, codon_table):
+def check_new_start_new(transcripts, n, low_lim, upper_lim, old_start, gcode, universal):
 
 	## Looks for in-frame STOP codons in the UTR of the transcript
-	prime5 = str(Seq(some_seq[low_lim:upper_lim]).translate(table=codon_table)).replace('*','x')
+	prime5 = transcripts.translate(n, low_lim, upper_lim, gcode).replace('*','x')
 	in_frame_stops = [stops.start() for stops in re.finditer('x',prime5)]
 
 	## Looks for in-frame START codons in the UTR of the transcript
@@ -386,7 +476,7 @@ def check_new_start_new(some_seq, low_lim, upper_lim, old_start, codon_table):
 	else:
 	## Double checks that there are NO IN-FRAME stop codons between the NEW-SUGGESTED Start
 	## position and the OLD-SUPPORTED stop position! 
-		between_new_old_start = str(Seq(some_seq[new_start:old_start]).translate(table=1)).replace('*','x')
+		between_new_old_start = transcripts.translate(n, new_start, old_start, universal).replace('*','x')
 		in_frame_stops_check = [stops.start() for stops in re.finditer('x',between_new_old_start)]
 		in_frame_starts_check = [starts.start() for starts in re.finditer('M',between_new_old_start)]
 		if len(in_frame_starts_check) != 0:
@@ -412,7 +502,13 @@ def extract_ORF(prot_dict, codon_table, args):
 	print (color.BOLD+'\n\nExtracting '+color.PURPLE+'ORFs'+color.END+color.BOLD+' from'\
 	' the transcriptomic data-set\n\n'+color.END)
 
-	for k, v in prot_dict.items():
+	## Compiles the genetic code (and the universal code, used to double check new starts)
+	## and encodes all transcripts once for translation
+	gcode = GeneticCode(codon_table)
+	universal = GeneticCode(1)
+	transcripts = CodonIndex([v[-1] for v in prot_dict.values()])
+
+	for n, (k, v) in enumerate(prot_dict.items()):
 
 	## Attempting to find the most-likely START (ATG) position in the transcript (tricky)
 	## Skips this if the initial Methionine (ATG) is likely present 
@@ -428,13 +524,13 @@ def extract_ORF(prot_dict, codon_table, args):
 			if max_start < 0:
 				max_start = min_start%3
 #			print k+'\tOld_start\t'+str(old_start)+'\tMin_Dist/Start\t'+str(min_dist)+'/'+str(min_start)+'\tMax_Dist/Start\t'+str(max_dist)+'/'+str(max_start)+'\n'
-			updated_start = check_new_start_new(v[-1], max_start, min_start, old_start, codon_table)
+			updated_start = check_new_start_new(transcripts, n, max_start, min_start, old_start, gcode, universal)
 		else:
 			updated_start = old_start
 		temp = prot_dict[k][-1][updated_start:]
 	
 	## Uses the given genetic code to identify the stop position of the ORF
-		temp_prot = str(Seq(temp).translate(table=codon_table))						
+		temp_prot = transcripts.translate(n, updated_start, None, gcode)
 		if '*' in temp_prot:		
 			stop_pos = (temp_prot.index('*')+1)*3
 			prot_dict[k].append(temp[:stop_pos])
@@ -459,7 +555,7 @@ def extract_ORF(prot_dict, codon_table, args):
 			look_good.append(k)
 
 	if len(awkward_list) != 0:
-		with open('ShortTranscripts_FromTranslation.txt','w+') as x:
+		with open(args.short_out,'w+') as x:
 			for entry in awkward_list:
 				x.write(entry+'\n')
 	else:
@@ -468,8 +564,10 @@ def extract_ORF(prot_dict, codon_table, args):
 	print (color.BOLD+'\n\nTranslating '+color.PURPLE+'ORFs'+color.END+color.BOLD+' from'\
 	' using the '+color.DARKCYAN+args.genetic_code.title()+' genetic code'+color.END)
 	
-	for k, v in prot_dict.items():
-		prot_dict[k].append(str(Seq(v[-1]).translate(table=codon_table)).rstrip('*'))	
+	## Translates all ORFs in one batch
+	ORFs = CodonIndex([v[-1] for v in prot_dict.values()])
+	for k, prot in zip(list(prot_dict.keys()), ORFs.translate_all(gcode)):
+		prot_dict[k].append(prot.rstrip('*'))
 
 	return prot_dict
 	
@@ -703,6 +801,8 @@ def clean_up(args):
 		os.system('cp ' + args.tsv_out + ' ' + args.all_output_folder)
 		os.system('cp ' + args.ntd_out + ' ' + args.all_output_folder)
 		os.system('cp ' + args.aa_out + ' ' + args.all_output_folder)
+		if os.path.isfile(args.short_out):
+			os.system('cp ' + args.short_out + ' ' + args.all_output_folder)
 		
 	os.system('mv ' + args.home_folder + ' ' + args.all_output_folder + 'TranslatedTranscriptomes')
 
@@ -16,7 +16,6 @@
 #Dependencies
 from Bio import SeqIO
 from Bio.Seq import Seq
-from statistics import mean
 
 from distutils import spawn
 import argparse, os, sys, time, re
@@ -24,6 +23,8 @@ from argparse import RawTextHelpFormatter,SUPPRESS
 
 from tqdm import tqdm
 
+import HookLens
+
 
 #------------------------------ Colors For Print Statements ------------------------------#
 class color:
@@ -116,6 +117,8 @@ def check_args():
 
 	args.file_listTSV = [args.all_output_folder + i for i in os.listdir(args.all_output_folder) if args.file_prefix in i and i.endswith('results.tsv')]
 
+	args.file_listShort = [args.all_output_folder + i for i in os.listdir(args.all_output_folder) if args.file_prefix in i and i.endswith('ShortTranscripts_FromTranslation.txt')]
+
 	quit_eval = return_more_info(args)
 	if quit_eval > 0:
 		print ('\n')
@@ -265,6 +268,55 @@ def merge_relevant_data(args):
 ###-------------------- Removes Nearly Identical ORFs from Data Set -------------------###
 ##########################################################################################
 
+def find_root(parent, seq):
+
+	#Union-find lookup (with path halving) of the component a sequence belongs to
+	while parent[seq] != seq:
+		parent[seq] = parent[parent[seq]]
+		seq = parent[seq]
+
+	return seq
+
+
+def remove_partials(pairs):
+
+	#Sequences are grouped into connected components of the (query, subject) hit graph with
+	#union-find. Pairs are always within one OG, so components never span OGs. Within each
+	#component, master sequences are visited by decreasing score (cov*len), and every sequence
+	#that hits a master that has not itself been removed is removed. Components are independent,
+	#so this gives the same result as iterating over all sequences of an OG at once.
+	parent = { }; queries_per_subject = { }
+	for query, subject in pairs:
+		for seq in (query, subject):
+			if seq not in parent:
+				parent.update({ seq : seq })
+
+		if subject not in queries_per_subject:
+			queries_per_subject.update({ subject : [] })
+		queries_per_subject[subject].append(query)
+
+		query_root = find_root(parent, query); subject_root = find_root(parent, subject)
+		if query_root != subject_root:
+			parent[query_root] = subject_root
+
+	components = { }
+	for seq in parent:
+		root = find_root(parent, seq)
+		if root not in components:
+			components.update({ root : [] })
+		components[root].append(seq)
+
+	partials_to_remove = set(); pairs_with_query_removed = set()
+	for component in components.values():
+		for master in sorted(component, key = lambda x : -(int(x.split('Len')[-1].split('_')[0]) * int(x.split('Cov')[-1].split('_')[0]))):
+			if master not in partials_to_remove:
+				for query in queries_per_subject.get(master, []):
+					partials_to_remove.add(query)
+					pairs_with_query_removed.add((query, master))
+
+	return partials_to_remove, pairs_with_query_removed
+
+
 def filter_NTD_data(args, OGLenDB):
 
 	cat_folder = args.all_output_folder + args.file_prefix + '/Original/Concatenated/'
@@ -281,8 +333,8 @@ def filter_NTD_data(args, OGLenDB):
 
 	#Creating a record of short sequences left over from translation to be removed
 	short_from_translation = []
-	if os.path.isfile('ShortTranscripts_FromTranslation.txt'):
-		for line in open('ShortTranscripts_FromTranslation.txt'):
+	for file in args.file_listShort:
+		for line in open(file):
 			short_from_translation.append(line.strip())
 
 	#Remove sequences <33% or >150% the average length of their OG in the Hook database
@@ -312,36 +364,21 @@ def filter_NTD_data(args, OGLenDB):
 	os.system(db_cmd)
 	os.system(blastn_cmd)
 
-	#Creating a record of query, subject pairs for each OG
-	pairs_per_og = { }
+	#Creating a record of query, subject pairs (within the same OG)
+	pairs = []
 	for line in open(proc_folder + '/SpreadSheets/All_NTD_SelfBLAST_Results.tsv'):
+		line = line.split('\t')
 
 		#IMPORTANT: This line is where the query coverage threshold is determined, and it might be helpful to adjust this when trying to optimally filter chimeras. By default it is set to 20%
-		if line.split('\t')[0] != line.split('\t')[1] and line.split('\t')[0][-10:] == line.split('\t')[1][-10:] and int(line.split('\t')[-1].strip()) > 20:
-			if line.split('\t')[0][-10:] not in pairs_per_og:
-				pairs_per_og.update({ line.split('\t')[0][-10:] : [] })
+		if line[0] != line[1] and line[0][-10:] == line[1][-10:] and int(line[-1].strip()) > 20:
+			pairs.append((line[0], line[1]))
 
-			pairs_per_og[line.split('\t')[0][-10:]].append([line.split('\t')[0], line.split('\t')[1]])
-
-	#For each OG, iterating through master sequences by decreasing score (cov*len), removing sequences that hit each master
-	partials_to_remove = []; pairs_with_query_removed = []
-	for og in pairs_per_og:
-
-		#Sorting the sequences by score (cov*len)
-		seqs = sorted(list(dict.fromkeys([seq for pair in pairs_per_og[og] for seq in pair])), key = lambda x : -(int(x.split('Len')[-1].split('_')[0]) * int(x.split('Cov')[-1].split('_')[0])))
-
-		#Iterating through masters and determining which sequences to remove
-		for master in seqs:
-			if master not in partials_to_remove:
-				for pair in pairs_per_og[og]:
-					if pair[1] == master:
-						partials_to_remove.append(pair[0])
-						pairs_with_query_removed.append(pair)
+	partials_to_remove, pairs_with_query_removed = remove_partials(pairs)
 
 	#Writing out a record of the BLAST hits of all relevant pairs (i.e. when removed sequences hit a master sequence)
 	with open(args.all_output_folder + args.file_prefix + '/'+args.file_prefix+'_SeqPairsAbove98.txt','w') as w:
 		for line in open(proc_folder + '/SpreadSheets/All_NTD_SelfBLAST_Results.tsv'):
-			if [line.split('\t')[0], line.split('\t')[1]] in pairs_with_query_removed:
+			if tuple(line.split('\t')[:2]) in pairs_with_query_removed:
 				w.write(line)
 
 	####################################################################
@@ -375,7 +412,7 @@ def filter_NTD_data(args, OGLenDB):
 			if i[0] not in partials_to_remove:
 				x.write('>' + i[0] + '\n' + str(i[1]) + '\n')
 
-	good_seq_names = [i[0] for i in good_NTD_seqs]
+	good_seq_names = set([i[0] for i in good_NTD_seqs])
 
 	with open(proc_folder + '/SpreadSheets/' + args.file_prefix + '_Filtered.Final.allOGCleanresults.tsv', 'w') as t:
 		for line in open(cat_folder + '/SpreadSheets/' + args.file_prefix + '_Concatenated.allOGCleanresults.tsv'):
@@ -394,6 +431,9 @@ def clean_up(args):
 		os.system('mv ' + i.replace('NTD.ORF.fasta','AA.ORF.fasta') + ' ' + args.all_output_folder + args.file_prefix + '/Original/')
 		os.system('mv ' + i.split('named')[0]+'named*allOGCleanresults.tsv ' + args.all_output_folder + args.file_prefix + '/Original/SpreadSheets/')
 
+	for i in args.file_listShort:
+		os.system('mv ' + i + ' ' + args.all_output_folder + args.file_prefix + '/Original/')
+
 	os.system('cp ' + args.all_output_folder + args.file_prefix + '/Processed/*ORF.fasta ' + args.all_output_folder + '/ToRename/')
 	os.system('cp ' + args.all_output_folder + args.file_prefix + '/Processed/SpreadSheets/*allOGCleanresults.tsv ' + args.all_output_folder + '/ToRename/')
 
@@ -421,15 +461,8 @@ def main():
 
 	merge_relevant_data(args)
 
-	OGLenDB = {}
-	for rec in SeqIO.parse(args.hook_fasta, 'fasta'):
-		if rec.id[-10:] not in OGLenDB:
-			OGLenDB.update({ rec.id[-10:] : [] })
-
-		OGLenDB[rec.id[-10:]].append(len(str(rec.seq)))
-
-	for og in OGLenDB:
-		OGLenDB[og] = mean(OGLenDB[og])
+	#Mean OG lengths in the Hook DB (cached next to the Hook fasta by HookLens.py)
+	OGLenDB = HookLens.og_mean_lens([args.hook_fasta])
 
 	filter_NTD_data(args, OGLenDB)
 
@@ -14,6 +14,7 @@ import os, sys
 import argparse
 from Bio import SeqIO
 import CUB
+import HookLens
 from statistics import mean
 from math import ceil, floor
 from tqdm import tqdm
@@ -42,19 +43,10 @@ def hook_lens(args):
 
 	print('\nGetting average OG lengths in the Hook DB...')
 
-	len_by_og = { }
-	for file in os.listdir(args.databases + '/db_OG'):
-		if file.endswith('.fasta') and os.path.isfile(args.databases + '/db_OG/' + file.replace('.fasta', '.dmnd')):
-			for rec in tqdm(SeqIO.parse(args.databases + '/db_OG/' + file, 'fasta')):
-				if rec.id[-10:] not in len_by_og:
-					len_by_og.update({ rec.id[-10:] : [] })
+	#Mean lengths are cached next to each Hook fasta by HookLens.py
+	hook_fastas = [args.databases + '/db_OG/' + file for file in os.listdir(args.databases + '/db_OG') if file.endswith('.fasta') and os.path.isfile(args.databases + '/db_OG/' + file.replace('.fasta', '.dmnd'))]
 
-				len_by_og[rec.id[-10:]].append(len(str(rec.seq)))
-
-	for og in len_by_og:
-		len_by_og[og] = mean(len_by_og[og])
-
-	return len_by_og
+	return HookLens.og_mean_lens(hook_fastas)
 
 
 def aa_comp_lengths(args, gcodes):
@@ -410,6 +410,178 @@ class SeqInfo(object):
         self.rscu_6Fold = CalcCUB.RSCU(self.cdnCounts_6F)
 
 
+class CodonEngine(object):
+    """
+    Array-based version of the SeqInfo calculations, for whole fasta files.
+
+    Each sequence is encoded once into codon indices (columns of the codon
+    table, plus one column for ambiguous codons), and the codon counts,
+    positional GC, ENc (Wright and SunEq5) and RSCU of a batch of sequences
+    are then computed with numpy instead of per-sequence codon tables.
+    """
+    def __init__(self, gCode='universal'):
+        self.gcode, self.transTable = GenUtil.convertGenCode(gCode)
+        self.cdnTbls = GenUtil.getCDNtable(self.transTable)
+        # Both tables share the same codons (in the same order), plus 'XXX'
+        self.codons = list(self.cdnTbls[1].keys())
+        self.ambCol = len(self.codons)
+
+        # Bases are coded as A/C/G/T = 0-3, X = 4 and anything else = 5, so
+        # that each codon maps to one of 6**3 codes
+        self.baseCode = np.full(256, 5, dtype=np.int64)
+        for n, base in enumerate('ACGTX'):
+            self.baseCode[ord(base)] = n
+        self.cdnCol = np.full(6**3, self.ambCol, dtype=np.int64)
+        for n, cdn in enumerate(self.codons):
+            self.cdnCol[self.cdnCode(cdn)] = n
+
+        # Characters counted as GC by Bio.SeqUtils.GC
+        self.isGC = np.zeros(256, dtype=bool)
+        for base in 'GCgcSs':
+            self.isGC[ord(base)] = True
+
+        noSixF, sixF = self.cdnTbls
+        self.fourCols = self.tableCols(noSixF, lambda k, v: v[1] == 'four')
+        self.fourGCCols = self.tableCols(noSixF, lambda k, v: v[1] == 'four' and k[-1] in 'GC')
+        self.wright = [self.wrightGroups(noSixF), self.wrightGroups(sixF)]
+        self.sun = [self.sunGroups(noSixF), self.sunGroups(sixF)]
+
+    def cdnCode(self, cdn):
+        return sum(self.baseCode[ord(base)]*6**(2-n) for n, base in enumerate(cdn))
+
+    def tableCols(self, cdnTbl, keep):
+        return np.array([n for n, (k, v) in enumerate(cdnTbl.items()) if keep(k, v)], dtype=np.int64)
+
+    def degenGroups(self, cdnTbl, skip):
+        # Amino acids of each degeneracy class, in the same order as CalcCUB,
+        # each given as the columns of all of its codons
+        degen_cdns = {}
+        for k, v in cdnTbl.items():
+            if skip(v[1]):
+                continue
+            if v[1] not in degen_cdns.keys():
+                degen_cdns[v[1]] = [v[0]]
+            elif v[0] not in degen_cdns[v[1]]:
+                degen_cdns[v[1]] += [v[0]]
+        return {k: [self.tableCols(cdnTbl, lambda key, val: val[0] == aa) for aa in v]
+            for k, v in degen_cdns.items()}
+
+    def wrightGroups(self, cdnTbl):
+        # As in CalcCUB.calcWrightENc, classes are keyed by their number of
+        # amino acids (classes of the same size are pooled)
+        groups = {}
+        for k, v in self.degenGroups(cdnTbl, lambda degen: 'one' in degen).items():
+            groups.setdefault(len(v), []).extend(v)
+        return list(groups.items())
+
+    def sunGroups(self, cdnTbl):
+        return list(self.degenGroups(cdnTbl, lambda degen: degen == 'none').values())
+
+    def encode(self, seqs):
+        # Returns per-sequence GC counts and lengths (overall and by codon
+        # position) and a matrix of codon counts
+        lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(lengths)))
+        ntds = np.frombuffer(''.join(seqs).encode('latin-1', 'replace'), dtype=np.uint8)
+
+        gcMask = self.isGC[ntds]
+        frame = (np.arange(len(ntds)) - np.repeat(starts[:-1], lengths)) % 3
+        gcCum = np.concatenate(([0], np.cumsum(gcMask)))
+        gcCounts = [(gcCum[starts[1:]] - gcCum[starts[:-1]], lengths)]
+        for pos in range(3):
+            # Same positions as GCeval.gc1/gc2/gc3 (the last full codon is
+            # left out of gc2 and gc3)
+            end = lengths - (np.maximum(lengths - pos, 0) % 3 if pos > 0 else 0)
+            posCum = np.concatenate(([0], np.cumsum(gcMask & (frame == pos))))
+            gcCounts.append((posCum[starts[:-1] + np.maximum(end, 0)] - posCum[starts[:-1]],
+                np.where(end > pos, (end - pos + 2)//3, 0)))
+
+        nCdns = lengths//3
+        seqIdx = np.repeat(np.arange(len(seqs)), nCdns)
+        cdnStarts = starts[:-1][seqIdx] + 3*(np.arange(nCdns.sum()) - np.repeat(np.cumsum(nCdns) - nCdns, nCdns))
+        bases = self.baseCode[ntds]
+        cols = self.cdnCol[bases[cdnStarts]*36 + bases[cdnStarts + 1]*6 + bases[cdnStarts + 2]]
+        cdnCounts = np.bincount(seqIdx*(self.ambCol + 1) + cols,
+            minlength=len(seqs)*(self.ambCol + 1)).reshape(len(seqs), self.ambCol + 1)
+
+        return gcCounts, cdnCounts
+
+    def gcPercent(self, gc, total):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, gc*100.0/total, 0.0)
+
+    def wrightENc(self, cdnCounts, groups):
+        # Vectorized CalcCUB.calcWrightENc (before rounding)
+        enc = np.full(len(cdnCounts), 2.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for k, aas in groups:
+                fa_sum, fa_vals = np.zeros(len(cdnCounts)), np.zeros(len(cdnCounts), dtype=np.int64)
+                for cols in aas:
+                    counts = cdnCounts[:, cols]
+                    n_aa = counts.sum(axis=1)
+                    homozyg = np.zeros(len(cdnCounts))
+                    for n in range(len(cols)):
+                        homozyg = homozyg + (counts[:, n]/n_aa)**2
+                    fa = np.where(n_aa > 1, ((n_aa*homozyg) - 1)/(n_aa - 1), 0.0)
+                    fa_sum = fa_sum + fa
+                    fa_vals += fa != 0
+                enc = enc + k/np.where(fa_vals > 0, fa_sum/fa_vals, 1)
+        return enc
+
+    def sunENc(self, cdnCounts, groups):
+        # Vectorized CalcCUB.SunEq5 (before rounding)
+        enc = np.zeros(len(cdnCounts))
+        for aas in groups:
+            fcf_sum, na_sum = np.zeros(len(cdnCounts)), np.zeros(len(cdnCounts), dtype=np.int64)
+            for cols in aas:
+                pseudocounts = cdnCounts[:, cols] + 1
+                na = pseudocounts.sum(axis=1)
+                fcf = np.zeros(len(cdnCounts))
+                for n in range(len(cols)):
+                    fcf = fcf + (pseudocounts[:, n]/na)**2
+                fcf_sum = fcf_sum + fcf*na
+                na_sum += na
+            enc = enc + len(aas)/(fcf_sum/na_sum)
+        return enc
+
+    def calcBatch(self, records):
+        # Takes (description, sequence) pairs and returns (description, SeqInfo)
+        # pairs carrying the same codon tables and statistics as
+        # SeqInfo.countCodons/GCstats/ENcStats (plus cdnCounts, the codon counts
+        # as an array, which calcRSCU pools)
+        seqs = [str(seq) for name, seq in records]
+        gcCounts, cdnCounts = self.encode(seqs)
+        gcs = [self.gcPercent(gc, total) for gc, total in gcCounts]
+        gc4F = self.gcPercent(cdnCounts[:, self.fourGCCols].sum(axis=1), cdnCounts[:, self.fourCols].sum(axis=1))
+        obsENc = [self.wrightENc(cdnCounts, groups) for groups in self.wright]
+        sunENc = [self.sunENc(cdnCounts, groups) for groups in self.sun]
+
+        seqInfo = []
+        for n, (name, seq) in enumerate(zip([name for name, seq in records], seqs)):
+            info = SeqInfo(seq, self.gcode)
+            info.cdnCounts = cdnCounts[n, :self.ambCol]
+            info.amb_cdn = int(cdnCounts[n, self.ambCol])
+            counts = info.cdnCounts.tolist()
+            info.cdnCounts_No6F, info.cdnCounts_6F = [{k: v[:-1] + [counts[col]]
+                for col, (k, v) in enumerate(cdnTbl.items())} for cdnTbl in self.cdnTbls]
+            for attr, vals in zip(['gcOverall', 'gc1', 'gc2', 'gc3'], gcs):
+                setattr(info, attr, round(float(vals[n]), 4))
+            info.gc4F = round(float(gc4F[n]), 4)
+            info.expENc = CalcCUB.expWrightENc(info.gc3)
+            info.obsENc_No6F, info.obsENc_6F = [min(61, round(float(enc[n]), 4)) for enc in obsENc]
+            info.SunENc_No6F, info.SunENc_6F = [round(float(enc[n]), 4) for enc in sunENc]
+            seqInfo.append((name, info))
+        return seqInfo
+
+    def calcRSCU(self, seqInfo):
+        # RSCU of the pooled codon counts of all sequences (as in CalcRefFasta)
+        GenCDNtable = {}
+        if len(seqInfo) > 0:
+            totals = np.sum([v.cdnCounts for v in seqInfo], axis=0)
+            GenCDNtable = {k: [v[0], int(totals[n])] for n, (k, v) in enumerate(self.cdnTbls[1].items())}
+        return CalcCUB.calcRCSU(GenCDNtable)
+
+
 def prepFolders(outName):
     if os.path.isdir(outName) == False:
         os.mkdir(outName)
@@ -419,19 +591,19 @@ def prepFolders(outName):
         os.mkdir(outName+'/SpreadSheets')
 
 
-def CalcRefFasta(fasta, gCode):
-    seqDB = {i.description:SeqInfo(i.seq, gCode) for i in SeqIO.parse(fasta,'fasta')}
-    GenCDNtable = {}
-    for k, v in seqDB.items():
-        v.countCodons()
-        v.GCstats()
-        v.ENcStats()
-        for k, v in v.cdnCounts_6F.items():
-            if k.isalpha() and k not in GenCDNtable .keys():
-                GenCDNtable[k] = [v[0],v[-1]]
-            else:
-                GenCDNtable[k][-1] += v[-1]
-    RSCU = CalcCUB.calcRCSU(GenCDNtable)
+def CalcRefFasta(fasta, gCode, batchSize=5000):
+    # Sequences are read and handed to the CodonEngine in batches, which gives
+    # the same values as SeqInfo.countCodons/GCstats/ENcStats for each one
+    engine = CodonEngine(gCode)
+    seqDB, batch = {}, []
+    for i in SeqIO.parse(fasta,'fasta'):
+        batch.append((i.description, i.seq))
+        if len(batch) == batchSize:
+            seqDB.update(engine.calcBatch(batch))
+            batch = []
+    if len(batch) > 0:
+        seqDB.update(engine.calcBatch(batch))
+    RSCU = engine.calcRSCU(list(seqDB.values()))
     return seqDB, RSCU
 
 
@@ -0,0 +1,94 @@
+# Last updated Oct 2026
+
+# This script keeps a cache of per-OG length statistics (number of sequences, total, minimum,
+# maximum and mean length) for the OG reference (Hook) database, which 6_FilterPartials.py and
+# 7b_SummaryStats.py use to compare sequence lengths to the mean length of their OG. Rather than parsing
+# the whole Hook fasta file in every step and for every taxon, the statistics are written once to a
+# tab-separated file next to it (<Hook fasta name>.OGLens.tsv), keyed on the path, size and modification
+# time of the fasta file, and rebuilt only if the Hook database changes. It is intended to be stored
+# in the 'Scripts' folder and should not be run separately.
+
+# Dependencies:
+# Python3, BioPython
+
+import os
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+
+
+#Identifies the version of a Hook fasta file that the cache was built from
+def hook_key(hook_fasta):
+
+	return [os.path.abspath(hook_fasta), str(os.path.getsize(hook_fasta)), str(os.stat(hook_fasta).st_mtime_ns)]
+
+
+#Mean length computed as statistics.mean would (an int if the mean is a whole number)
+def mean_len(total, count):
+
+	if total % count == 0:
+		return total // count
+
+	return total / count
+
+
+#Parses the Hook fasta once and returns { OG (last 10 characters of the ID) : [count, total, min, max] }
+def build_stats(hook_fasta):
+
+	stats = { }
+	for title, seq in SimpleFastaParser(open(hook_fasta)):
+		og = title.split(None, 1)[0][-10:] if title.strip() != '' else ''
+		if og not in stats:
+			stats.update({ og : [0, 0, len(seq), len(seq)] })
+
+		stats[og][0] += 1; stats[og][1] += len(seq)
+		stats[og][2] = min(stats[og][2], len(seq)); stats[og][3] = max(stats[og][3], len(seq))
+
+	return stats
+
+
+#Returns { OG : { 'count', 'total', 'min', 'max', 'mean' } } for a Hook fasta file, from the cache
+#if it is up to date and otherwise by parsing the fasta file (and then updating the cache)
+def og_len_stats(hook_fasta):
+
+	cache = hook_fasta + '.OGLens.tsv'
+	key = hook_key(hook_fasta)
+
+	stats = None
+	if os.path.isfile(cache):
+		with open(cache) as f:
+			if f.readline().rstrip('\n').split('\t')[1:] == key:
+				f.readline()
+				stats = { }
+				for line in f:
+					line = line.rstrip('\n').split('\t')
+					stats.update({ line[0] : [int(val) for val in line[1:5]] })
+
+	if stats == None:
+		stats = build_stats(hook_fasta)
+
+		#Writing to a temporary file first, so that steps running at the same time never read a partial cache
+		try:
+			with open(cache + '.' + str(os.getpid()), 'w') as o:
+				o.write('#HookDB\t' + '\t'.join(key) + '\n')
+				o.write('OG\tCount\tTotalLength\tMinLength\tMaxLength\tMeanLength\n')
+				for og in stats:
+					o.write(og + '\t' + '\t'.join([str(val) for val in stats[og]]) + '\t' + str(mean_len(stats[og][1], stats[og][0])) + '\n')
+			os.replace(cache + '.' + str(os.getpid()), cache)
+		except OSError:
+			print('\nWARNING: Unable to write the Hook length cache ' + cache + '. The Hook database will be parsed again next time.\n')
+
+	return { og : { 'count' : val[0], 'total' : val[1], 'min' : val[2], 'max' : val[3], 'mean' : mean_len(val[1], val[0]) } for og, val in stats.items() }
+
+
+#Returns { OG : mean length } across one or more Hook fasta files (sequences of an OG found in
+#several files are pooled)
+def og_mean_lens(hook_fastas):
+
+	pooled = { }
+	for hook_fasta in hook_fastas:
+		for og, val in og_len_stats(hook_fasta).items():
+			if og not in pooled:
+				pooled.update({ og : [0, 0] })
+
+			pooled[og][0] += val['count']; pooled[og][1] += val['total']
+
+	return { og : mean_len(val[1], val[0]) for og, val in pooled.items() }
@@ -8,12 +8,14 @@
 # and last scripts are desired. Run "python wrapper.py --help" for details on how to run this script. Before
 # running this script ensure that the databases are correctly located and named, and that input assembled
 # transcripts are named in the format Op_me_Hsap_assembledTranscripts.fasta, where Op_me_Hsap can be replaced
-# with any 10-digit sample identifier.
+# with any 10-digit sample identifier. Use --jobs to run several taxa through each script at the same
+# time; the --threads core budget is then split between them.
 
 #Dependencies
 import os, sys, re
 import shutil
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import CheckSetup
 
 
@@ -37,11 +39,45 @@ def get_args():
 	parser.add_argument('-max', '--maxlen', type = int, default = 12000, help = 'Maximum transcript length')
 	parser.add_argument('-c', '--seq_count', type = int, default = 50, help = 'minimum number of sequences after assigning OGs')
 	parser.add_argument('-d', '--databases', type = str, default = '../Databases', help = 'Path to databases folder')
+	parser.add_argument('--combined_BvE', action = 'store_true', help = 'In script 2b, search each transcriptome once against a combined eukaryote/prokaryote database instead of once against each. This is an approximation: a contig with many strong hits in one database can lose its best hit in the other (see 2b_Identify_Proks.py)')
+	parser.add_argument('--batched_stops', action = 'store_true', help = 'In script 4, search the TAA, TGA and TAG translations against the stop codon database in a single DIAMOND run')
+	parser.add_argument('--streaming_1a', action = 'store_true', help = 'In script 1a, read each assembly in two passes without holding its sequences in memory (for very large assemblies)')
+	parser.add_argument('-t', '--threads', default = 60, type = int, help = 'Total number of cores to use. These are shared between the taxa being run at the same time (see --jobs), and are split evenly between their DIAMOND/BLAST searches')
+	parser.add_argument('-j', '--jobs', default = 1, type = int, help = 'Number of taxa to run through each script at the same time (no more than --threads). By default taxa are run one after another')
 	
 
 
 	return parser.parse_args()
 
+
+#Number of taxa to run at the same time, and the share of the --threads budget each one gets
+def job_slots(args, n_taxa):
+
+	n_jobs = max(1, min(args.jobs, args.threads, n_taxa))
+
+	return n_jobs, max(1, args.threads // n_jobs)
+
+
+#Runs a list of jobs, one per taxon, each a list of commands run in order. Up to --jobs taxa are run
+#at the same time. This returns only once every taxon is done, so that the next script (or 1b, which
+#needs all taxa through 1a) never starts on partial results.
+def run_taxa(args, jobs):
+
+	n_jobs, threads = job_slots(args, len(jobs))
+
+	def run_job(commands):
+		for command in commands:
+			os.system(command)
+
+	if n_jobs == 1:
+		for commands in jobs:
+			run_job(commands)
+	else:
+		print('\nRunning ' + str(len(jobs)) + ' taxa, ' + str(n_jobs) + ' at a time\n')
+		with ThreadPoolExecutor(max_workers = n_jobs) as executor:
+			for result in executor.map(run_job, jobs):
+				pass
+
 		
 #running the first script on all the bare files
 def script_one(args, ten_digit_codes):
@@ -49,9 +85,12 @@ def script_one(args, ten_digit_codes):
 	CheckSetup.run(args)
 
 	#Running script 1a on all files
+	jobs = []
 	for file in os.listdir(args.assembled_transcripts):
 		if file[10:] == '_assembledTranscripts.fasta' and file[:10] in ten_digit_codes:
-			os.system('python 1a_TranscriptLengthFilter.py --input_file ' + args.assembled_transcripts + '/' + file + ' --output_file ' + args.output + '/Output/' + file[:10] + ' --minLen ' + str(args.minlen) + ' --maxLen ' + str(args.maxlen) + ' --spades') #SPADES ARGUMENT??
+			jobs.append(['python 1a_TranscriptLengthFilter.py --input_file ' + args.assembled_transcripts + '/' + file + ' --output_file ' + args.output + '/Output/' + file[:10] + ' --minLen ' + str(args.minlen) + ' --maxLen ' + str(args.maxlen) + ' --spades' + (' --streaming' if args.streaming_1a else '')]) #SPADES ARGUMENT??
+
+	run_taxa(args, jobs)
 
 	#Run script 1b if the XPC step is being run
 	if args.xplate_contam:
@@ -65,29 +104,36 @@ def script_one(args, ten_digit_codes):
 def script_two(args):
 
 	#Run scripts 2a and 2b on all files.
-	for folder in os.listdir(args.output + '/Output/'):
-		if os.path.isfile(args.output + '/Output/' + folder + '/SizeFiltered/' + folder + '.' + str(args.minlen) + 'bp.fasta'):
-			os.system('python 2a_Identify_rRNA.py --input_file ' + args.output + '/Output/' + folder + '/SizeFiltered/' + folder + '.' + str(args.minlen) + 'bp.fasta --databases ' + args.databases)
+	folders = [folder for folder in os.listdir(args.output + '/Output/') if os.path.isfile(args.output + '/Output/' + folder + '/SizeFiltered/' + folder + '.' + str(args.minlen) + 'bp.fasta')]
+	n_jobs, threads = job_slots(args, len(folders))
+
+	jobs = []
+	for folder in folders:
+		fasta_withBact = args.output + '/Output/' + folder + '/' + folder + '_NorRNAseqs.fasta'
+		jobs.append(['python 2a_Identify_rRNA.py --input_file ' + args.output + '/Output/' + folder + '/SizeFiltered/' + folder + '.' + str(args.minlen) + 'bp.fasta --databases ' + args.databases + ' --threads ' + str(threads),
+			'python 2b_Identify_Proks.py --input_file ' + fasta_withBact + ' --databases ' + args.databases + ' --threads ' + str(threads) + (' --combined_db' if args.combined_BvE else '')])
 
-			fasta_withBact = args.output + '/Output/' + folder + '/' + folder + '_NorRNAseqs.fasta'
-			os.system('python 2b_Identify_Proks.py --input_file ' + fasta_withBact + ' --databases ' + args.databases)
+	run_taxa(args, jobs)
 
 #NEED TO SORT OUT FILE NAMES ETC. BELOW HERE
 
 #running the third script on all files
 def script_three(args):
 
-	for folder in os.listdir(args.output + '/Output'):
-		if os.path.isfile(args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.fasta'):
-			os.system('python 3_AssignOGs.py --input_file ' + args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.fasta --evalue 1e-15 --databases ' + args.databases)
+	folders = [folder for folder in os.listdir(args.output + '/Output') if os.path.isfile(args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.fasta')]
+	n_jobs, threads = job_slots(args, len(folders))
+
+	run_taxa(args, [['python 3_AssignOGs.py --input_file ' + args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.fasta --evalue 1e-15 --databases ' + args.databases + ' --threads ' + str(threads)] for folder in folders])
 		
 
 
 #running the fourth script
 def script_four(args):			
-	for folder in os.listdir(args.output + '/Output'):
-		if os.path.isfile(args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.Renamed.fasta'):
-				os.system('python 4_InFrameStopCodonEstimator.py --input_file ' + args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.Renamed.fasta --databases ' + args.databases + ' --seq_count ' + str(args.seq_count))
+	folders = [folder for folder in os.listdir(args.output + '/Output') if os.path.isfile(args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.Renamed.fasta')]
+	n_jobs, threads = job_slots(args, len(folders))
+
+	run_taxa(args, [['python 4_InFrameStopCodonEstimator.py --input_file ' + args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.Renamed.fasta --databases ' + args.databases + ' --seq_count ' + str(args.seq_count) + ' --threads ' + str(threads) + (' --batched' if args.batched_stops else '')] for folder in folders])
+
 	#Checking to see if there are taxa with less than the required number of sequences.
 	if os.path.exists(args.databases + '/Taxa_with_few_sequences.txt'):
 		with open(args.databases + '/Taxa_with_few_sequences.txt', 'r') as f:
@@ -159,16 +205,19 @@ def script_five(args):
 	valid_codes = ['bleph','blepharisma','chilo','chilodonella','condy', 'condylostoma','none','eup','euplotes','peritrich','vorticella','ciliate','universal','taa','tag','tga','mesodinium']
 	
 	lines = [line.strip().split('\t') for line in open(args.output + '/Output/gcode_output.tsv', 'r')]
+	jobs = []
 	with open(args.output + '/Output/gcode_output.tsv', 'r') as g:
 		for folder in os.listdir(args.output + '/Output'):
 			if os.path.isfile(args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.Renamed.fasta') and os.path.isdir(args.output + '/Output/' + folder + '/StopCodonFreq'):
 				for line in lines:
 					if line[0] == folder and line[-1].lower() in valid_codes:
-						os.system('python 5_GCodeTranslate.py --input_file ' + args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.Renamed.fasta --genetic_code ' + line[-1])
+						jobs.append(['python 5_GCodeTranslate.py --input_file ' + args.output + '/Output/' + folder + '/' + folder + '_WTA_EPU.Renamed.fasta --genetic_code ' + line[-1]])
 					#Taxa without valid genetic codes will be skipped.
 					elif line[-1].lower() not in valid_codes and 'Genetic Code' not in line:
 						print('\n' + line[-1] + ' is not a valid genetic code. Skipping taxon ' + folder + '.\n')
 
+	run_taxa(args, jobs)
+
 #Run script 6 on all files
 def script_six(args):
 
@@ -189,15 +238,12 @@ def script_six(args):
 		print('\nNo .fasta file could be found containing Hook sequences. This should be supplied along with the .dmnd-formatted database file in the Databases/db_OG folder. Quitting before script 6.\n')
 		exit()
 	
-	for prefix in unique_prefixes:
-		os.system('python 6_FilterPartials.py --file_prefix ' + args.output + '/Output/' + prefix + ' --hook_fasta ' + hook_fasta)
+	run_taxa(args, [['python 6_FilterPartials.py --file_prefix ' + args.output + '/Output/' + prefix + ' --hook_fasta ' + hook_fasta] for prefix in unique_prefixes])
 		
 #Running scripts 7a and 7b on all taxa
 def script_seven(args):
 
-	for file in os.listdir(args.output + '/Output/ToRename'):
-		if '.AA.ORF.fasta' in file:
-			os.system('python 7a_FinalizeName.py --input_file ' + args.output + '/Output/ToRename/' + file + ' --name ' + file[:10])
+	run_taxa(args, [['python 7a_FinalizeName.py --input_file ' + args.output + '/Output/ToRename/' + file + ' --name ' + file[:10]] for file in os.listdir(args.output + '/Output/ToRename') if '.AA.ORF.fasta' in file])
 
 	os.mkdir(args.output + '/Output/Intermediate')
 
@@ -14,7 +14,8 @@
 # If a GF is not present as a taxon, its missing data are filled in with gaps in the concatenated alignment. 
 # Along with the concatenated alignment, this part of the pipeline outputs individual alignments with orthologs 
 # selected (and re-aligned with MAFFT), in case a user wants to construct a model-partitioned or other specialized 
-# kind of species tree.
+# kind of species tree, and a NEXUS partition file (ConcatenatedAlignment.partitions.nex) with the columns of
+# each OG in the concatenated alignment.
 
 #Dependencies
 import os, sys
@@ -22,6 +23,8 @@ from Bio import SeqIO
 import ete3
 import argparse
 from tqdm import tqdm
+from clade_index import CladeIndex, popcount, reroot
+import profiling
 
 
 #Small utility function to extract newick strings from nexus file
@@ -36,46 +39,6 @@ def get_newick(fname):
 	return newick
 
 
-#This function reroots the tree on the largest Ba/Za clade. If there is no prokaryote clade,
-#it roots on the largest Op clade, then Pl, then Am, then Ex, then Sr.
-def reroot(tree):
-
-	#This nested function returns the largest clade of a given taxonomic group
-	def get_best_clade(taxon):
-
-		best_size = 0; best_clade = []; seen_leaves = []
-		#Traverse all nodes
-		for node in tree.traverse('levelorder'):
-			#If the node is big enough and not subsumed by a node we've already accepted
-			if len(node) >= 3 and len(list(set(seen_leaves) & set([leaf.name for leaf in node]))) == 0:
-				leaves = [leaf.name for leaf in node]
-				
-				#Create a record of leaves that belong to the taxonomic group
-				target_leaves = set()
-				for leaf in leaves[::-1]:
-					if leaf[:2] in taxon:
-						target_leaves.add(leaf[:10])
-						leaves.remove(leaf)
-
-				#If this clade is better than any clade we've seen before, grab it
-				if len(target_leaves) > best_size and len(leaves) <= 2:
-					best_clade = node
-					best_size = len(target_leaves)
-					seen_leaves.extend([leaf.name for leaf in node])
-
-		return best_clade
-
-	#Get the biggest clade for each taxonomic group (stops once it finds one)
-	for taxon in [('Ba', 'Za'), ('Op'), ('Pl'), ('Am'), ('Ex'), ('Sr')]:
-		clade = get_best_clade(taxon)
-		if len([leaf for leaf in clade if leaf.name[:2] in taxon]) > 3:
-			tree.set_outgroup( clade)
-
-			break
-
-	return tree
-
-
 #Function to select sequences to use per tree
 def remove_paralogs(params):
 
@@ -137,25 +100,25 @@ def remove_paralogs(params):
 				elif len(taxon) >= 5 and taxon[:5] not in monophyletic_clades:
 					monophyletic_clades.update({ taxon[:5] : [] })
 
+			#Indexing the (rerooted) tree once, so that each clade test below is a few bitmask operations
+			index = CladeIndex(tree)
+
 			#Grab best clades from all target groups
-			seen_leaves = []
+			seen = 0
 			for clade in monophyletic_clades:
+				target = index.leaf_mask(lambda leaf : leaf[:2] == clade or leaf[:5] == clade)
 				for node in tree.traverse('levelorder'):
-					#If the node is big enough and not subsumed by a node we've already accepted
-					if len(list(set(seen_leaves) & set([leaf.name for leaf in node]))) == 0:
-						leaves = [leaf.name for leaf in node]
-
-						#Create a record of leaves that belong to the taxonomic group
-						target_leaves = set()
-						for leaf in leaves[::-1]:
-							if leaf[:2] == clade or leaf[:5] == clade:
-								target_leaves.add(leaf[:10])
-								leaves.remove(leaf)
-
-						#If the clade is monophyletic
-						if len(leaves) == 0:
-							monophyletic_clades[clade].append(node)
-							seen_leaves.extend([leaf.name for leaf in node])
+					#If the node is not subsumed by a node we've already accepted, and the clade is monophyletic
+					if index.mask[node] & seen == 0 and index.mask[node] & ~target == 0:
+						monophyletic_clades[clade].append(index.mask[node])
+						seen |= index.mask[node]
+
+			#Grouping the tips by taxon
+			seqs_per_tax = { }
+			for seq in tree:
+				if seq.name[:10] not in seqs_per_tax:
+					seqs_per_tax.update({ seq.name[:10] : [] })
+				seqs_per_tax[seq.name[:10]].append(seq.name)
 
 			#Get all target taxa in the alignment
 			taxa = []
@@ -171,7 +134,7 @@ def remove_paralogs(params):
 			for tax in taxa:
 
 				#Get all sequences belonging to the taxon
-				taxseqs = [seq.name for seq in tree if seq.name[:10] == tax]
+				taxseqs = seqs_per_tax[tax]
 
 				score = False
 
@@ -182,9 +145,9 @@ def remove_paralogs(params):
 
 					#Get the size of the clade in which each sequence falls (at minor clade level if available, otherwise major clade)
 					if tax[:5] in monophyletic_clades:
-						clades = { seq : len([leaf for clade in monophyletic_clades[tax[:5]] for leaf in clade if seq in [l.name for l in clade]]) for seq in taxseqs }
+						clades = { seq : sum([popcount(clade) for clade in monophyletic_clades[tax[:5]] if clade & index.name_mask(seq) != 0]) for seq in taxseqs }
 					elif tax[:2] in monophyletic_clades:
-						clades = { seq : len([leaf for clade in monophyletic_clades[tax[:2]] for leaf in clade if seq in [l.name for l in clade]]) for seq in taxseqs }
+						clades = { seq : sum([popcount(clade) for clade in monophyletic_clades[tax[:2]] if clade & index.name_mask(seq) != 0]) for seq in taxseqs }
 
 					#If there's more than one sequence that falls in a robust clade
 					if len(clades) > 0:
@@ -247,23 +210,43 @@ def concat(seqs_per_og, params):
 			for tax in seqs_per_og[og]:
 				o.write('>' + tax + '\n' + seqs_per_og[og][tax] + '\n\n')
 
-		os.system('mafft ' + params.output + '/Output/DataToConcatenate/Unaligned/' + '.'.join(og.split('.')[:-1]) + '_TargetTaxaUnaligned.fasta > ' + params.output + '/Output/DataToConcatenate/Aligned/' + '.'.join(og.split('.')[:-1]) + '_TargetTaxaAligned.fasta')
+		profiling.run(params, 'mafft ' + params.output + '/Output/DataToConcatenate/Unaligned/' + '.'.join(og.split('.')[:-1]) + '_TargetTaxaUnaligned.fasta > ' + params.output + '/Output/DataToConcatenate/Aligned/' + '.'.join(og.split('.')[:-1]) + '_TargetTaxaAligned.fasta')
 
 		seqs_per_og[og] = { rec.id[:10] : str(rec.seq) for rec in SeqIO.parse(params.output + '/Output/DataToConcatenate/Aligned/' + '.'.join(og.split('.')[:-1]) + '_TargetTaxaAligned.fasta', 'fasta') }
 
-	concat_seqs_per_tax = { tax : '' for tax in taxa }
-	for taxon in taxa:
-		for og in seqs_per_og:
-			if taxon in seqs_per_og[og]:
-				concat_seqs_per_tax[taxon] += seqs_per_og[og][taxon]
-			else:
-				print(list(seqs_per_og[og].values()))
-				print(og)
-				concat_seqs_per_tax[taxon] += ''.join(['-' for i in range(len(list(seqs_per_og[og].values())[0]))])
+	write_supermatrix(seqs_per_og, taxa, params)
+
+
+#Function to write the concatenated alignment and a partition file giving the columns of each OG. The width
+#of every OG block is worked out first, and each taxon's row is preallocated as gaps and then filled in block
+#by block, so that building the matrix takes time and memory linear in its size.
+def write_supermatrix(seqs_per_og, taxa, params):
+
+	#Columns (1-based, inclusive) of each OG in the concatenated alignment
+	coords = { }; width = 0
+	for og in seqs_per_og:
+		og_width = max([len(seq) for seq in seqs_per_og[og].values()] + [0])
+		if og_width > 0:
+			coords.update({ og : (width + 1, width + og_width) })
+			width += og_width
+
+	rows = { tax : bytearray(b'-' * width) for tax in taxa }
+	for og in coords:
+		for tax in seqs_per_og[og]:
+			if tax in rows:
+				seq = seqs_per_og[og][tax].encode()
+				rows[tax][coords[og][0] - 1 : coords[og][0] - 1 + len(seq)] = seq
 
 	with open(params.output + '/Output/ConcatenatedAlignment.fasta', 'w') as o:
-		for tax in concat_seqs_per_tax:
-			o.write('>' + tax + '\n' + concat_seqs_per_tax[tax] + '\n\n')
+		for tax in rows:
+			o.write('>' + tax + '\n' + rows[tax].decode() + '\n\n')
+
+	#Nexus charset block, which can be given to IQ-Tree (-p/-q) or converted for RAxML
+	with open(params.output + '/Output/ConcatenatedAlignment.partitions.nex', 'w') as o:
+		o.write('#nexus\nbegin sets;\n')
+		for og in coords:
+			o.write('\tcharset ' + og.split('.')[0] + ' = ' + str(coords[og][0]) + '-' + str(coords[og][1]) + ';\n')
+		o.write('end;\n')
 			
 
 #wrapper
@@ -14,6 +14,9 @@
 # re-builds each tree excluding all removed sequences, and then repeats a specified number of times
 # (--n_loops). Running in botb of these modes requires the user to input several parameters, 
 # which can be found in the manual, and in the 'CL' argument group in utils.py.
+# Only gene families from which sequences were removed in an iteration are re-aligned
+# and have their trees re-built; all other alignments and trees are carried forward
+# into the next iteration's folders, and the loop stops early once nothing changes.
 
 #Dependencies
 import os, sys, re
@@ -22,6 +25,8 @@ import ete3
 import guidance
 import trees
 from statistics import mean
+from clade_index import CladeIndex, popcount, reroot
+import profiling
 
 #Utility function to extract Newick strings from Nexus files.
 def get_newick(fname):
@@ -35,45 +40,6 @@ def get_newick(fname):
 	return newick
 
 
-#This function reroots the tree on the largest Ba/Za clade. If there is no prokaryote clade,
-#it roots on the largest Op clade, then Pl, then Am, then Ex, then Sr.
-def reroot(tree):
-
-	#This nested function returns the largest clade of a given taxonomic group
-	def get_best_clade(taxon):
-
-		best_size = 0; best_clade = []; seen_leaves = []
-		#Traverse all nodes
-		for node in tree.traverse('levelorder'):
-			#If the node is big enough and not subsumed by a node we've already accepted
-			if len(node) >= 3 and len(list(set(seen_leaves) & set([leaf.name for leaf in node]))) == 0:
-				leaves = [leaf.name for leaf in node]
-				
-				#Create a record of leaves that belong to the taxonomic group
-				target_leaves = set()
-				for leaf in leaves[::-1]:
-					if leaf[:2] in taxon:
-						target_leaves.add(leaf[:10])
-						leaves.remove(leaf)
-
-				#If this clade is better than any clade we've seen before, grab it
-				if len(target_leaves) > best_size and len(leaves) <= 2:
-					best_clade = node
-					best_size = len(target_leaves)
-					seen_leaves.extend([leaf.name for leaf in node])
-
-		return best_clade
-
-	#Get the biggest clade for each taxonomic group (stops once it finds one)
-	for taxon in [('Ba', 'Za'), ('Op'), ('Pl'), ('Am'), ('Ex'), ('Sr')]:
-		clade = get_best_clade(taxon)
-		if len([leaf for leaf in clade if leaf.name[:2] in taxon]) > 3:
-			tree.set_outgroup( clade)
-
-			break
-
-	return tree
-	
 #Clade-based contamination removal
 def get_subtrees(args, file):
 
@@ -137,58 +103,45 @@ def get_subtrees(args, file):
 		else:
 			clade['required_taxa'] = []
 
+	#Indexing the (rerooted) tree once, so that each clade test below is a few bitmask operations
+	index = CladeIndex(tree)
+
 	#Creating a record of selected subtrees, and all of the leaves in those subtrees
-	selected_leaves = []
+	selected = 0
 
 	#For each set of rules (set of target taxa)
 	for clade in rules_per_clade:
-		seen_leaves = []
+		seen = 0
+
+		target = index.leaf_mask(lambda leaf : any([leaf.startswith(code) for code in clade['target_taxa']]))
+		at_least = target & index.leaf_mask(lambda leaf : any([leaf.startswith(req) for req in clade['required_taxa']]))
+		target_taxa = index.group_mask(target)
+		at_least_taxa = index.group_mask(at_least)
 
 		#Iterating through all nodes in tree, starting at "root" then working towards leaves
 		for node in tree.traverse('levelorder'):
 			#If a node is large enough and is not contained in an already selected clade
-			if len(node) >= clade['min_target_presence'] and len(list(set(seen_leaves) & set([leaf.name for leaf in node]))) == 0:
-				leaves = [leaf.name for leaf in node]
+			if index.size[node] >= clade['min_target_presence'] and index.mask[node] & seen == 0:
 
 				#Accounting for cases where e.g. one child is a contaminant, and the other child is a good clade with 1 fewer than the max number of contaminants
-				children_keep = 0
-				for child in node.children:
-					for code in clade['target_taxa']:
-						taken = False
-						for leaf in child:
-							if leaf.name.startswith(code):
-								children_keep += 1
-								taken = True
-								break
-
-						if taken:
-							break
+				children_keep = len([child for child in node.children if index.mask[child] & target != 0])
 
 				if children_keep == len(node.children):
 
-					#Creating a record of all leaves belonging to the target/"at least" group of taxa, and any other leaves are contaminants
-					target_leaves = set(); at_least_leaves = set(); target_leaves_full_names = []
-					for code in clade['target_taxa']:
-						for leaf in leaves[::-1]:
-							if leaf.startswith(code):
-								target_leaves.add(leaf[:10])
-								target_leaves_full_names.append(leaf)
-
-								for req in clade['required_taxa']:
-									if leaf.startswith(req):
-										at_least_leaves.add(leaf[:10])
-										break
-
-								leaves.remove(leaf)
+					#Counting the leaves belonging to the target/"at least" group of taxa; any other leaves are contaminants
+					n_target = index.count_groups(node, 10, target_taxa)
+					n_at_least = index.count_groups(node, 10, at_least_taxa)
+					n_contams = popcount(index.mask[node] & ~target)
 
 					#Grab a clade as a subtree if 1) it has enough target taxa; 2) it has enough "at least" taxa; 3) it does not have too many contaminants
-					if len(target_leaves) >= clade['min_target_presence'] and len(at_least_leaves) >= clade['required_taxa_num'] and ((clade['num_contams'] < 1 and len(leaves) <= clade['num_contams'] * len(target_leaves)) or len(leaves) <= clade['num_contams']):
-						selected_leaves.extend(target_leaves_full_names)
+					if n_target >= clade['min_target_presence'] and n_at_least >= clade['required_taxa_num'] and ((clade['num_contams'] < 1 and n_contams <= clade['num_contams'] * n_target) or n_contams <= clade['num_contams']):
+						selected |= index.mask[node] & target
 
-						seen_leaves.extend([leaf.name for leaf in node])
+						seen |= index.mask[node]
 
 	all_clades = [clade for group in rules_per_clade for clade in group['target_taxa']]
 
+	selected_leaves = set(index.leaf_names(selected))
 	seqs2keep = [leaf.name for leaf in tree if leaf.name in selected_leaves or not any([leaf.name.startswith(clade) for clade in all_clades]) or any([leaf.name.startswith(ex) for ex in exceptions])]
 
 	return seqs2keep
@@ -306,30 +259,54 @@ def write_new_preguidance(params, seqs2keep, seqs_per_og, tree_file):
 		print('\nMore than one sequence file found matching the tree file ' + tree_file + '. Please make your file names more unique: there should be one sequence file for every tree file, with a matching unique prefix (everything before the first "."). Skipping this gene family.\n')
 		return None, []
 	elif len(seq_file) == 1:
-		with open(params.output + '/Output/Pre-Guidance/' + seq_file[0], 'w') as o:
-			for rec in seqs_per_og[seq_file[0]]:
-				if rec in seqs2keep and rec[:10] not in exclude_taxa and rec[:2] not in exclude_taxa and rec[:5] not in exclude_taxa:
+		seqs2keep = set(seqs2keep)
+		kept_seqs = [rec for rec in seqs_per_og[seq_file[0]] if rec in seqs2keep and rec[:10] not in exclude_taxa and rec[:2] not in exclude_taxa and rec[:5] not in exclude_taxa]
+		kept_set = set(kept_seqs)
+		seqs_removed_from_og = [seq for seq in seqs_per_og[seq_file[0]] if seq not in kept_set]
+
+		#Only gene families that lost sequences get a new unaligned file (and so are re-aligned and have
+		#their trees re-built); the alignments and trees of all other gene families are carried forward.
+		if len(seqs_removed_from_og) > 0:
+			with open(params.output + '/Output/Pre-Guidance/' + seq_file[0], 'w') as o:
+				for rec in kept_seqs:
 					o.write('>' + rec + '\n' + seqs_per_og[seq_file[0]][rec] + '\n\n')
 
-		seqs_removed_from_og = [seq for seq in seqs_per_og[seq_file[0]] if seq not in seqs2keep]
-
 		return seq_file[0], seqs_removed_from_og
 
 
+#Utility function to get the gene family of an output file, matching up the unaligned, aligned and tree files
+def og_key(fname):
+
+	return fname.split('.')[0].split('_preguidance')[0]
+
+
+#Copying the alignments and trees of gene families that did not change in this iteration from the
+#folders of the previous iteration, so that they do not need to be re-aligned and re-built.
+def carry_forward(params, loop, completed_ogs):
+
+	unchanged = set([og_key(tree_file) for tree_file in completed_ogs])
+
+	for folder in ('Guidance', 'NotGapTrimmed', 'Trees'):
+		if os.path.isdir(params.output + '/Output/' + folder + '_' + str(loop)):
+			for file in os.listdir(params.output + '/Output/' + folder + '_' + str(loop)):
+				if og_key(file) in unchanged and not os.path.isfile(params.output + '/Output/' + folder + '/' + file):
+					os.system('cp ' + params.output + '/Output/' + folder + '_' + str(loop) + '/' + file + ' ' + params.output + '/Output/' + folder + '/' + file)
+
+
 #Utility function to run MAFFT in between iterations (if this is the chosen alignment method)
 def cl_mafft(params):
 
 	for file in os.listdir(params.output + '/Output/Pre-Guidance'):
 		if file.split('.')[-1] in ('fasta', 'fas', 'faa'):
-			os.system('mafft ' + params.output + '/Output/Pre-Guidance/' + file + ' > ' + params.output + '/Output/NotGapTrimmed/' + file)
+			profiling.run(params, 'mafft ' + params.output + '/Output/Pre-Guidance/' + file + ' > ' + params.output + '/Output/NotGapTrimmed/' + file)
 
-			os.system('Scripts/trimal-trimAl/source/trimal -in ' + params.output + '/Output/NotGapTrimmed/' + file + ' -out ' + params.output + '/Output/Guidance/' + file.split('.')[0] + '.95gapTrimmed.fasta' + ' -gapthreshold ' + str(params.trimal_cutoff) + ' -fasta')
+			profiling.run(params, 'Scripts/trimal-trimAl/source/trimal -in ' + params.output + '/Output/NotGapTrimmed/' + file + ' -out ' + params.output + '/Output/Guidance/' + file.split('.')[0] + '.95gapTrimmed.fasta' + ' -gapthreshold ' + str(params.trimal_cutoff) + ' -fasta')
 
 #Utility function to run FastTree in between iterations (if this is the chosen tree-building method)
 def cl_fasttree(params):
 	for file in os.listdir(params.output + '/Output/Guidance'):
 		if file.split('.')[-1] in ('fasta', 'fas', 'faa'):
-			os.system('FastTree ' + params.output + '/Output/Guidance/' + file + ' > ' + params.output + '/Output/Trees/' + file.split('.')[0] + '.FastTree.tre')
+			profiling.run(params, 'FastTree ' + params.output + '/Output/Guidance/' + file + ' > ' + params.output + '/Output/Trees/' + file.split('.')[0] + '.FastTree.tre')
 
 
 #Utility function to run Iqtree in between iterations (if this is the chosen tree-building method)
@@ -340,7 +317,7 @@ def cl_iqtree(params):
 				os.mkdir(params.output + '/Output/Intermediate/IQTree')
 			tax_iqtree_outdir = params.output + '/Output/Intermediate/IQTree/' + file.split('.')[0].split('_preguidance')[0]
 			os.mkdir(tax_iqtree_outdir)
-			os.system('iqtree2 -s ' + params.output + '/Output/Guidance/' + file + ' -m LG+G -T 10 --prefix ' +  tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')	
+			profiling.run(params, 'iqtree2 -s ' + params.output + '/Output/Guidance/' + file + ' -m LG+G -T 10 --prefix ' +  tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')	
 			#Copy over the final output
 			if os.path.isfile(tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile'):
 				os.system('cp ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile ' + params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.tree')
@@ -355,7 +332,7 @@ def cl_iqtree_fast(params):
 				os.mkdir(params.output + '/Output/Intermediate/IQTree')
 			tax_iqtree_outdir = params.output + '/Output/Intermediate/IQTree/' + file.split('.')[0].split('_preguidance')[0]
 			os.mkdir(tax_iqtree_outdir)
-			os.system('iqtree2 -s ' + params.output + '/Output/Guidance/' + file + ' -m LG+G -T 10 --fast --prefix ' +  tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')	
+			profiling.run(params, 'iqtree2 -s ' + params.output + '/Output/Guidance/' + file + ' -m LG+G -T 10 --fast --prefix ' +  tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')	
 			#Copy over the final output
 			if os.path.isfile(tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile'):
 				os.system('cp ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile ' + params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.tree')
@@ -375,13 +352,15 @@ def run(params):
 	for loop in range(params.nloops):
 		seqs_removed_loop = []
 
-		#Finding input files
-		if params.start == 'raw':
-			seqs_per_og = { file : { rec.id : str(rec.seq) for rec in SeqIO.parse(params.output + '/Output/Pre-Guidance/' + file, 'fasta') } for file in os.listdir(params.output + '/Output/Pre-Guidance') if file.split('.')[-1] in ('fasta', 'fas', 'faa') }
-		elif params.start in ('unaligned', 'aligned', 'trees'):
-			seqs_per_og = { file : { rec.id : str(rec.seq).replace('-', '') for rec in SeqIO.parse(params.data + '/' + file, 'fasta') } for file in os.listdir(params.data) if file.split('.')[-1] in ('fasta', 'fas', 'faa') }
+		#Finding input files. The sequences of each gene family are read once, and after each iteration only
+		#the sequences kept in that iteration are carried forward, so that every iteration is compared
+		#against the sequences of the previous one.
+		if loop == 0:
+			if params.start == 'raw':
+				seqs_per_og = { file : { rec.id : str(rec.seq) for rec in SeqIO.parse(params.output + '/Output/Pre-Guidance/' + file, 'fasta') } for file in os.listdir(params.output + '/Output/Pre-Guidance') if file.split('.')[-1] in ('fasta', 'fas', 'faa') }
+			elif params.start in ('unaligned', 'aligned', 'trees'):
+				seqs_per_og = { file : { rec.id : str(rec.seq).replace('-', '') for rec in SeqIO.parse(params.data + '/' + file, 'fasta') } for file in os.listdir(params.data) if file.split('.')[-1] in ('fasta', 'fas', 'faa') }
 
-			if loop == 0:
 				for file in os.listdir(params.data):
 					if file.split('.')[-1] in ('tre', 'tree', 'treefile'):
 						os.system('cp ' + params.data + '/' + file + ' ' + params.output + '/Output/Trees')
@@ -402,6 +381,8 @@ def run(params):
 						completed_ogs.append(tree_file)
 					else:
 						seqs_removed_loop += [seq for seq in seqs_per_og[seq_file] if seq not in seqs2keep and seq not in seqs_removed]
+						seqs_removed_from_og = set(seqs_removed_from_og)
+						seqs_per_og[seq_file] = { rec : seqs_per_og[seq_file][rec] for rec in seqs_per_og[seq_file] if rec not in seqs_removed_from_og }
 		#Wrapper for running sisters-based contamination removal on all trees
 		elif params.contamination_loop == 'seq':
 
@@ -441,6 +422,16 @@ def run(params):
 						completed_ogs.append(tree_file)
 					else:
 						seqs_removed_loop += [seq for seq in seqs_per_og[seq_file] if seq not in seqs2keep and seq not in seqs_removed]
+						seqs_removed_from_og = set(seqs_removed_from_og)
+						seqs_per_og[seq_file] = { rec : seqs_per_og[seq_file][rec] for rec in seqs_per_og[seq_file] if rec not in seqs_removed_from_og }
+
+		#If no gene family changed, every following iteration would give the same result
+		if len([file for file in os.listdir(params.output + '/Output/Pre-Guidance') if file.split('.')[-1] in ('fasta', 'fas', 'faa')]) == 0:
+			print('\nNo sequences were removed in contamination loop iteration ' + str(loop) + '; stopping the contamination loop.\n')
+			if os.path.isdir(params.output + '/Output/Pre-Guidance_' + str(loop)):
+				os.rmdir(params.output + '/Output/Pre-Guidance')
+				os.system('mv ' + params.output + '/Output/Pre-Guidance_' + str(loop) + ' ' + params.output + '/Output/Pre-Guidance')
+			break
 
 		#Keeping record of removed sequences
 		seqs_removed += seqs_removed_loop
@@ -463,10 +454,12 @@ def run(params):
 		params.tree_method = params.cl_tree_method
 
 		#Re-aligning and building trees without contaminant sequences... then ready for next iteration.
+		#Only the changed gene families written to Output/Pre-Guidance in this iteration are re-aligned.
 		if params.cl_alignment_method == 'mafft_only':
 			cl_mafft(params)
 		else:
-			guidance.run(params)
+			os.system('rm -rf ' + params.output + '/Output/Intermediate/Guidance/Input')
+			guidance.run(params, params.output + '/Output/Pre-Guidance')
 
 		if params.cl_tree_method == 'fasttree':
 			cl_fasttree(params)
@@ -478,6 +471,9 @@ def run(params):
 			os.system('rm -r ' + params.output + '/Output/Intermediate/IQTree/*')
 		elif params.cl_tree_method == 'raxml':
 			os.system('rm -r ' + params.output + '/Output/Intermediate/RAxML/*')
+
+		#Bringing over the unchanged alignments and trees from this iteration
+		carry_forward(params, loop, completed_ogs)
 		
 
 
@@ -17,6 +17,7 @@ import preguidance
 import guidance
 import trees
 import concatenate
+import profiling
 
 
 if __name__ == '__main__':
@@ -25,7 +26,8 @@ if __name__ == '__main__':
 	params = utils.get_params()
 
 	#First, checking for and cleaning up existing outputs from previous runs,
-	#then setting up an empty output folder structure for the new run
+	#then setting up an empty output folder structure for the new run (or, with
+	#--resume, keeping the existing outputs and checkpoints of the previous run)
 	if not (params.concatenate and params.start == 'trees'):
 		print('\nCleaning up existing files and organizing output folder\n')
 		utils.clean_up(params)
@@ -33,25 +35,32 @@ if __name__ == '__main__':
 	#Running pre-Guidance (preguidance.py)
 	if params.start == 'raw':
 		print('\nRunning preguidance\n')
-		preguidance.run(params)
+		with profiling.stage(params, 'preguidance'):
+			preguidance.run(params)
 
 	#Running Guidance (guidance.py)
 	if params.start in ('unaligned', 'raw') and params.end in ('aligned', 'trees'):
 		print('\nRunning guidance\n')
-		guidance.run(params)
+		with profiling.stage(params, 'guidance'):
+			guidance.run(params)
 
 	#Building trees (trees.py)
 	if params.start != 'trees' and params.end == 'trees':
 		print('\nBuilding trees\n')
-		trees.run(params)
+		with profiling.stage(params, 'trees'):
+			trees.run(params)
 
 	#Running the contamination loop (contamination.py)
 	if params.contamination_loop != None:
 		print('\nRunning contamination loop\n')
-		contamination.run(params)
+		with profiling.stage(params, 'contamination'):
+			contamination.run(params)
 
 	#Running concatenation (concatenate.py)
 	if params.concatenate:
 		print('\nChoosing orthologs and concatenating alignments...\n')
-		concatenate.run(params)
-	
+		with profiling.stage(params, 'concatenate'):
+			concatenate.run(params)
+
+	#Summarizing the run profile (--profile) in Output/Profile.json and Output/Profile.csv
+	profiling.write_report(params)
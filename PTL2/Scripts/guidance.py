@@ -25,18 +25,216 @@
 # and in contamination.py if the contamination loop is using Guidance as the re-alignment
 # method.
 
+# OGs are independent of one another, so several can be run through Guidance at once
+# (--guidance_jobs), each in its own folder under Intermediate/Guidance/Output. The
+# --guidance_threads budget is then split evenly between the concurrent OGs. Each finished
+# OG is recorded in Output/Checkpoints.tsv, so that --resume can skip it after a crash.
+
 #Dependencies
 import os, sys, re
 from Bio import SeqIO
+import numpy as np
+from multiprocessing import Pool
+from functools import partial
+import utils
+import profiling
+
+#Reads a Guidance score file into a matrix. The first line of each Guidance score file names its columns,
+#and is checked against the expected ones so that reading the wrong score file fails loudly. The header and
+#any other lines starting with '#' (such as the #END footer) are skipped.
+def read_scores(path, columns):
+
+	lines = open(path).readlines()
+	header = [field.lstrip('#') for field in lines[0].split()] if len(lines) > 0 else []
+	if header != columns:
+		raise ValueError('Unexpected Guidance score file ' + path + ': the columns are ' + ' '.join(header) + ' instead of ' + ' '.join(columns))
+
+	rows = [line for line in lines[1:] if line.strip() != '' and not line.startswith('#')]
+	if len(rows) == 0:
+		return np.zeros((0, len(columns)))
+
+	return np.array(' '.join(rows).split(), dtype = float).reshape(len(rows), -1)
+
+
+#Applies the residue (--res_cutoff) and column (--col_cutoff) cutoffs to the final Guidance alignment of an OG.
+#The alignment is loaded as a character matrix, residues scoring below the residue cutoff are masked with 'X'
+#and columns scoring below the column cutoff are dropped, each with a single boolean mask. Returns a
+#dictionary of { sequence name : filtered aligned sequence } for the sequences kept by Guidance.
+def mask_alignment(tax_guidance_outdir, res_cutoff, col_cutoff):
+
+	seqs2keep = set([rec.description for rec in SeqIO.parse(tax_guidance_outdir + '/Seqs.Orig.fas.FIXED.Without_low_SP_Seq.With_Names', 'fasta')])
+	orig_seqs = []; aln = []
+	for rec in SeqIO.parse(tax_guidance_outdir + '/MSA.MAFFT.aln.With_Names', 'fasta'):
+		orig_seqs.append(rec.description); aln.append(str(rec.seq))
+
+	if len(aln) == 0:
+		return { }
+
+	aln = np.frombuffer(''.join(aln).encode(), dtype = np.uint8).reshape(len(aln), -1).copy()
+
+	#Residue scores are given as (column number, row number, score), both numbers starting at 1 and the rows
+	#in the order of the alignment. Cells scored as nan are never masked. Scores are never below 0, so a
+	#score file is only read when its cutoff is above 0.
+	if res_cutoff > 0:
+		res_scores = read_scores(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_res.scr', ['COL_NUMBER', 'ROW_NUMBER', 'RES_PAIR_RES_SCORE'])
+		below = res_scores[:, 2] < res_cutoff
+		aln[res_scores[below, 1].astype(int) - 1, res_scores[below, 0].astype(int) - 1] = ord('X')
+
+	#Column scores are given as (column number, score)
+	keep_cols = np.ones(aln.shape[1], dtype = bool)
+	if col_cutoff > 0:
+		col_scores = read_scores(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_col.scr', ['COL_NUMBER', 'RES_PAIR_COLUMN_SCORE'])
+		keep_cols[col_scores[col_scores[:, 1] < col_cutoff, 0].astype(int) - 1] = False
+
+	keep_rows = np.array([seq in seqs2keep for seq in orig_seqs])
+	aln = aln[keep_rows][:, keep_cols]
+
+	return { seq : row.tobytes().decode() for seq, row in zip([seq for seq in orig_seqs if seq in seqs2keep], aln) }
+
+
+#Runs all Guidance iterations, the residue/column cutoffs, MAFFT and TrimAl for a single
+#unaligned OG file, working only inside its own folder in Intermediate/Guidance/Output.
+#Returns the file name along with the lines of the sequence score file for every sequence
+#removed by Guidance. This function is called from run(), either directly or in a worker
+#process (--guidance_jobs).
+@profiling.per_og('guidance')
+def guidance_og(params, guidance_input, file, guidance_threads):
+
+	removed_lines = []
+
+	tax_guidance_outdir = params.output + '/Output/Intermediate/Guidance/Output/' + file.split('.')[0].split('_preguidance')[0]
+	#Clearing out a partial run of this OG (only when resuming with --resume)
+	if os.path.isdir(tax_guidance_outdir):
+		os.system('rm -rf ' + tax_guidance_outdir)
+	os.mkdir(tax_guidance_outdir)
+
+	fail = False
+	#For each iteration
+	for i in range(params.guidance_iters):
+		n_recs = len([r for r in SeqIO.parse(guidance_input + '/' + file, 'fasta')])
+
+		#Guidance can't handle inputs with fewer than 4 sequences
+		if n_recs < 4:
+			print('\nWARNING: Gene famiily ' + file.split('.')[0].split('_preguidance')[0] + ' contains fewer than 4 sequences after ' + str(i) + ' Guidance iterations, therefore no alignment will be produced for this gene family.\n')
+			os.system('rm -rf ' + tax_guidance_outdir)
+			if i == 0:
+				fail = True
+			break
+
+		#Determining MAFFT algorithm based on the number of input sequences
+		if n_recs < 200:
+			mafft_alg = 'genafpair'
+		else:
+			mafft_alg = 'auto'
+
+		#For Guidance v2.1 (2025 version) on the grid ... COMMENT OUT THE FOLLOWING LINE IF USING v2.0.2
+		profiling.run(params, 'python ' + params.guidance_path + '/script/guidance_main.py --seqFile ' + guidance_input + '/' + file + ' --msaProgram MAFFT --seqType aa --outDir ' + tax_guidance_outdir + ' --seqCutoff ' + str(params.seq_cutoff) + ' --colCutoff ' + str(params.col_cutoff) + " --outOrder as_input --bootstraps 10 --MSA_Param '\\--" + mafft_alg + " --maxiterate 1000 --thread " + str(guidance_threads) + " --bl 62 --anysymbol' > " + params.output + '/Output/Intermediate/Guidance/Output/' + file[:10] + '/log.txt')
+
+		#For Guidance v2.0.2 (origin version in PhyloTol6). UNCOMMENT THE FOLLOWING LINE IF USING v2.0.2
+		#os.system('Scripts/guidance.v2.02/www/Guidance/guidance.pl --seqFile ' + guidance_input + '/' + file + ' --msaProgram MAFFT --seqType aa --outDir ' + tax_guidance_outdir + ' --seqCutoff ' + str(params.seq_cutoff) + ' --colCutoff ' + str(params.col_cutoff) + " --outOrder as_input --bootstraps 10 --MSA_Param '\\--" + mafft_alg + " --maxiterate 1000 --thread " + str(guidance_threads) + " --bl 62 --anysymbol' > " + params.output + '/Output/Intermediate/Guidance/Output/' + file[:10] + '/log.txt')
+
+		#For UMass Unity users, use the following line and comment out the others:
+		#os.system('python3 /work/pi_lkatz_smith_edu/Guidance/guidance_Linux/script/guidance_main.py --seqFile ' + guidance_input + '/' + file + ' --msaProgram MAFFT --seqType aa --outDir ' + tax_guidance_outdir + ' --seqCutoff ' + str(params.seq_cutoff) + ' --colCutoff ' + str(params.col_cutoff) + " --outOrder as_input --bootstraps 10 --MSA_Param '\\--" + mafft_alg + " --maxiterate 1000 --thread " + str(guidance_threads) + " --bl 62 --anysymbol' > " + params.output + '/Output/Intermediate/Guidance/Output/' + file[:10] + '/log.txt')
+
+		#For Smith College Grid users, use the following line and comment about the others:
+		#os.system('python /gridapps/software/Guidance_mid/2.1b-foss-2023a/bin/script/guidance_main.py --seqFile ' + guidance_input + '/' + file + ' --msaProgram MAFFT --seqType aa --outDir ' + tax_guidance_outdir + ' --seqCutoff ' + str(params.seq_cutoff) + ' --colCutoff ' + str(params.col_cutoff) + " --outOrder as_input --bootstraps 10 --MSA_Param '\\--" + mafft_alg + " --maxiterate 1000 --thread " + str(guidance_threads) + " --bl 62 --anysymbol' > " + params.output + '/Output/Intermediate/Guidance/Output/' + file[:10] + '/log.txt')
+
+		#Checking for a sequence score file; if not available, Guidance failed.
+		if os.path.isfile(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names'):
+			#All sequences below score cutoff
+			seqs_below = len([line for line in open(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names').readlines()[1:-1] if float(line.split()[-1]) < params.seq_cutoff])
+			#If fewer than four were above the cutoff, this OG is done iterating.
+			if n_recs - seqs_below < 4:
+				print('\nWARNING: Gene famiily ' + file.split('.')[0].split('_preguidance')[0] + ' contains fewer than 4 sequences after ' + str(i + 1) + ' Guidance iterations, therefore no alignment will be produced for this gene family.\n')
+				os.system('rm -rf ' + tax_guidance_outdir)
+				fail = True
+				break
+			#If all sequences were above the cutoff, this OG is done iterating.
+			if seqs_below == 0 or i == params.guidance_iters - 1:
+				print('\nGuidance complete after ' + str(i + 1) + ' iterations for gene family ' + file.split('.')[0].split('_preguidance')[0] + '\n')
+				break
+			#Recording list of sequences removed by Guidance.
+			for line in [line for line in open(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names').readlines()[1:-1] if float(line.split()[-1]) < params.seq_cutoff]:
+				removed_lines.append(line)
+			#Copying over the old file with the new results
+			os.system('cp ' + tax_guidance_outdir + '/Seqs.Orig.fas.FIXED.Without_low_SP_Seq.With_Names ' + guidance_input + '/' + file)
+			
+			#Handling intermediate files for each iteration.	
+			if params.keep_iter:
+				if i +1 < params.guidance_iters:
+					os.makedirs(params.output + '/Output/Intermediate/Guidance/Iterations/', exist_ok = True)
+					os.makedirs(params.output + '/Output/Intermediate/Guidance/Iterations/' + str(i+1)+'/', exist_ok = True)
+					os.makedirs(params.output + '/Output/Intermediate/Guidance/Iterations/' + str(i+1) + '/' + file.split('.')[0].split('_preguidance')[0], exist_ok = True)
+					iteration_folder = params.output + '/Output/Intermediate/Guidance/Iterations/' + str(i +1) + '/' + file.split('.')[0].split('_preguidance')[0]
+					os.system('cp -r ' + tax_guidance_outdir + '/* ' + iteration_folder)
+					
+					
+					if not params.keep_temp:
+						for gdir_file in os.listdir(iteration_folder):
+							if gdir_file not in ('MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names', 'MSA.MAFFT.aln.With_Names', 'MSA.MAFFT.Guidance2_res_pair_col.scr', 'log', 'postGuidance_preTrimAl_unaligned.fasta'):
+								os.system('rm -r ' + iteration_folder + '/' + gdir_file)
+							else:
+								if gdir_file == 'MSA.MAFFT.aln.With_Names':
+									os.system('mv ' + iteration_folder + '/' + gdir_file + ' ' + iteration_folder + '/' + file.split('.')[0].split('_preguidance')[0] + '_' + gdir_file + '.aln')
+								else:
+									os.system('mv ' + iteration_folder + '/' + gdir_file + ' ' + iteration_folder + '/' + file.split('.')[0].split('_preguidance')[0] + '_' + gdir_file)
+		
+			os.system('rm -r ' + tax_guidance_outdir + '/*')
+		else:
+			fail = True
+			break
+
+	#After all iterations, THEN apply residue and column cutoffs
+	if not fail:
+		#Residues below the --res_cutoff are replaced with 'X' and columns below the --col_cutoff are removed
+		running_aln = mask_alignment(tax_guidance_outdir, params.res_cutoff, params.col_cutoff)
+
+		with open(tax_guidance_outdir + '/postGuidance_preTrimAl_unaligned.fasta', 'w') as o:
+			for seq in running_aln:
+				o.write('>' + seq + '\n' + str(running_aln[seq]).replace('-', '') + '\n\n')
+
+		#Aligning one last time after removing the final set of sequences and applying the res and col cutoffs
+		print('mafft ' + tax_guidance_outdir + '/postGuidance_preTrimAl_unaligned.fasta > ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '_postGuidance_preTrimAl_aligned.fasta')
+		profiling.run(params, 'mafft ' + tax_guidance_outdir + '/postGuidance_preTrimAl_unaligned.fasta > ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.postGuidance_preTrimAl_aligned.fasta')
+
+		#Gap trimming
+		profiling.run(params, 'Scripts/trimal-trimAl/source/trimal -in ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.postGuidance_preTrimAl_aligned.fasta -out ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.70gapTrimmed.fasta -gapthreshold ' + str(params.trimal_cutoff) + ' -fasta')
+
+		#Copying over final aligments (pre and post gap trimming) into output folder.
+		os.system('cp ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.70gapTrimmed.fasta ' + params.output + '/Output/Guidance/' + file.split('.')[0].split('_preguidance')[0] + '.70gapTrimmed.fasta')
+		os.system('cp ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.postGuidance_preTrimAl_aligned.fasta ' + params.output + '/Output/NotGapTrimmed/' + file.split('.')[0].split('_preguidance')[0] + '.postGuidance_preTrimAl_aligned.fasta')
+		
+		#Removing intermediate files if not --keep_temp
+		if not params.keep_temp:
+			for gdir_file in os.listdir(tax_guidance_outdir):
+				if gdir_file not in ('MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names', 'MSA.MAFFT.aln.With_Names', 'MSA.MAFFT.Guidance2_res_pair_col.scr', 'log', 'postGuidance_preTrimAl_unaligned.fasta'):
+					os.system('rm -r ' + tax_guidance_outdir + '/' + gdir_file)
+				else:
+					if gdir_file == 'MSA.MAFFT.aln.With_Names':
+						os.system('mv ' + tax_guidance_outdir + '/' + gdir_file + ' ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '_' + gdir_file + '.aln')
+					else:
+						os.system('mv ' + tax_guidance_outdir + '/' + gdir_file + ' ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '_' + gdir_file)
+
+	return file, removed_lines
+
+
+#The final outputs of Guidance for one OG, as recorded in the checkpoint file
+def guidance_outputs(params, file):
+
+	og = file.split('.')[0].split('_preguidance')[0]
+
+	return [params.output + '/Output/Guidance/' + og + '.70gapTrimmed.fasta', params.output + '/Output/NotGapTrimmed/' + og + '.postGuidance_preTrimAl_aligned.fasta']
+
 
 #Called in eukphylo.py and contamination.py
-def run(params):
+def run(params, preguidance_path = None):
 
 	if params.start == 'raw' or params.start == 'unaligned':
-		#Checking that pre-Guidance has been run or that unaligned files per OG are provided.
-		if params.start == 'raw':
+		#Checking that pre-Guidance has been run or that unaligned files per OG are provided. The contamination
+		#loop passes its own folder of unaligned files (preguidance_path).
+		if preguidance_path == None and params.start == 'raw':
 			preguidance_path = params.output + '/Output/Pre-Guidance'
-		else:
+		elif preguidance_path == None:
 			preguidance_path = params.data
 
 		if not os.path.isdir(preguidance_path):
@@ -48,15 +246,18 @@ def run(params):
 			exit()
 
 		#Creating intermedate folders that will later be deleted unless running with --keep_temp
-		os.mkdir(params.output + '/Output/Intermediate/Guidance')
-		os.mkdir(params.output + '/Output/Intermediate/Guidance/Input')
-		os.mkdir(params.output + '/Output/Intermediate/Guidance/Output')
+		os.makedirs(params.output + '/Output/Intermediate/Guidance/Input', exist_ok = True)
+		os.makedirs(params.output + '/Output/Intermediate/Guidance/Output', exist_ok = True)
 
 		guidance_input = params.output + '/Output/Intermediate/Guidance/Input/'
 		os.system('cp -r ' + preguidance_path + '/* ' + guidance_input)
 
-		guidance_removed_file = open(params.output + '/Output/GuidanceRemovedSeqs.txt', 'w')
-		guidance_removed_file.write('Sequence\tScore\n')
+		#When resuming, adding to the record of removed sequences from the previous run
+		if params.resume and os.path.isfile(params.output + '/Output/GuidanceRemovedSeqs.txt'):
+			guidance_removed_file = open(params.output + '/Output/GuidanceRemovedSeqs.txt', 'a')
+		else:
+			guidance_removed_file = open(params.output + '/Output/GuidanceRemovedSeqs.txt', 'w')
+			guidance_removed_file.write('Sequence\tScore\n')
 
 		too_many_seqs = False
 
@@ -77,128 +278,36 @@ def run(params):
 		if too_many_seqs and not params.allow_large_files:
 			return False
 
-		#For each unaligned AA fasta file
-		for file in [f for f in os.listdir(guidance_input) if f.endswith('.fa') or f.endswith('.faa') or f.endswith('.fasta')]:
-			tax_guidance_outdir = params.output + '/Output/Intermediate/Guidance/Output/' + file.split('.')[0].split('_preguidance')[0]
-			os.mkdir(tax_guidance_outdir)
-
-			fail = False
-			#For each iteration
-			for i in range(params.guidance_iters):
-				n_recs = len([r for r in SeqIO.parse(guidance_input + '/' + file, 'fasta')])
-
-				#Guidance can't handle inputs with fewer than 4 sequences
-				if n_recs < 4:
-					print('\nWARNING: Gene famiily ' + file.split('.')[0].split('_preguidance')[0] + ' contains fewer than 4 sequences after ' + str(i) + ' Guidance iterations, therefore no alignment will be produced for this gene family.\n')
-					os.system('rm -rf ' + tax_guidance_outdir)
-					if i == 0:
-						fail = True
-					break
-
-				#Determining MAFFT algorithm based on the number of input sequences
-				if n_recs < 200:
-					mafft_alg = 'genafpair'
-				else:
-					mafft_alg = 'auto'
-
-				#For Guidance v2.1 (2025 version) on the grid ... COMMENT OUT THE FOLLOWING LINE IF USING v2.0.2
-				os.system('python ' + params.guidance_path + '/script/guidance_main.py --seqFile ' + guidance_input + '/' + file + ' --msaProgram MAFFT --seqType aa --outDir ' + tax_guidance_outdir + ' --seqCutoff ' + str(params.seq_cutoff) + ' --colCutoff ' + str(params.col_cutoff) + " --outOrder as_input --bootstraps 10 --MSA_Param '\\--" + mafft_alg + " --maxiterate 1000 --thread " + str(params.guidance_threads) + " --bl 62 --anysymbol' > " + params.output + '/Output/Intermediate/Guidance/Output/' + file[:10] + '/log.txt')
-
-				#For Guidance v2.0.2 (origin version in PhyloTol6). UNCOMMENT THE FOLLOWING LINE IF USING v2.0.2
-				#os.system('Scripts/guidance.v2.02/www/Guidance/guidance.pl --seqFile ' + guidance_input + '/' + file + ' --msaProgram MAFFT --seqType aa --outDir ' + tax_guidance_outdir + ' --seqCutoff ' + str(params.seq_cutoff) + ' --colCutoff ' + str(params.col_cutoff) + " --outOrder as_input --bootstraps 10 --MSA_Param '\\--" + mafft_alg + " --maxiterate 1000 --thread " + str(params.guidance_threads) + " --bl 62 --anysymbol' > " + params.output + '/Output/Intermediate/Guidance/Output/' + file[:10] + '/log.txt')
-
-				#For UMass Unity users, use the following line and comment out the others:
-				#os.system('python3 /work/pi_lkatz_smith_edu/Guidance/guidance_Linux/script/guidance_main.py --seqFile ' + guidance_input + '/' + file + ' --msaProgram MAFFT --seqType aa --outDir ' + tax_guidance_outdir + ' --seqCutoff ' + str(params.seq_cutoff) + ' --colCutoff ' + str(params.col_cutoff) + " --outOrder as_input --bootstraps 10 --MSA_Param '\\--" + mafft_alg + " --maxiterate 1000 --thread " + str(params.guidance_threads) + " --bl 62 --anysymbol' > " + params.output + '/Output/Intermediate/Guidance/Output/' + file[:10] + '/log.txt')
-
-				#For Smith College Grid users, use the following line and comment about the others:
-				#os.system('python /gridapps/software/Guidance_mid/2.1b-foss-2023a/bin/script/guidance_main.py --seqFile ' + guidance_input + '/' + file + ' --msaProgram MAFFT --seqType aa --outDir ' + tax_guidance_outdir + ' --seqCutoff ' + str(params.seq_cutoff) + ' --colCutoff ' + str(params.col_cutoff) + " --outOrder as_input --bootstraps 10 --MSA_Param '\\--" + mafft_alg + " --maxiterate 1000 --thread " + str(params.guidance_threads) + " --bl 62 --anysymbol' > " + params.output + '/Output/Intermediate/Guidance/Output/' + file[:10] + '/log.txt')
-
-				#Checking for a sequence score file; if not available, Guidance failed.
-				if os.path.isfile(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names'):
-					#All sequences below score cutoff
-					seqs_below = len([line for line in open(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names').readlines()[1:-1] if float(line.split()[-1]) < params.seq_cutoff])
-					#If fewer than four were above the cutoff, this OG is done iterating.
-					if n_recs - seqs_below < 4:
-						print('\nWARNING: Gene famiily ' + file.split('.')[0].split('_preguidance')[0] + ' contains fewer than 4 sequences after ' + str(i + 1) + ' Guidance iterations, therefore no alignment will be produced for this gene family.\n')
-						os.system('rm -rf ' + tax_guidance_outdir)
-						break
-					#If all sequences were above the cutoff, this OG is done iterating.
-					if seqs_below == 0 or i == params.guidance_iters - 1:
-						print('\nGuidance complete after ' + str(i + 1) + ' iterations for gene family ' + file.split('.')[0].split('_preguidance')[0] + '\n')
-						break
-					#Recording list of sequences removed by Guidance.
-					for line in [line for line in open(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names').readlines()[1:-1] if float(line.split()[-1]) < params.seq_cutoff]:
+		#Largest files first, so that the long tail of small OGs fills in the remaining slots
+		og_files = sorted([f for f in os.listdir(guidance_input) if f.endswith('.fa') or f.endswith('.faa') or f.endswith('.fasta')], key = lambda f : -os.path.getsize(guidance_input + '/' + f))
+
+		#Skipping OGs that already finished Guidance with the same input (--resume)
+		input_hashes = { file : utils.file_hash(guidance_input + '/' + file) for file in og_files }
+		checkpoints = utils.load_checkpoints(params)
+		done_ogs = [file for file in og_files if utils.og_complete(checkpoints, 'guidance', file.split('.')[0].split('_preguidance')[0], input_hashes[file])]
+		if len(done_ogs) > 0:
+			print('\nSkipping ' + str(len(done_ogs)) + ' gene families that already completed Guidance\n')
+			og_files = [file for file in og_files if file not in done_ogs]
+
+		#Splitting the --guidance_threads core budget between the OGs run concurrently (--guidance_jobs)
+		n_jobs = max(1, min(params.guidance_jobs, len(og_files)))
+		threads_per_job = max(1, params.guidance_threads // n_jobs)
+
+		if n_jobs == 1:
+			for file in og_files:
+				file, removed_lines = guidance_og(params, guidance_input, file, threads_per_job)
+				for line in removed_lines:
+					guidance_removed_file.write(line)
+				guidance_removed_file.flush()
+				utils.record_checkpoint(params, 'guidance', file.split('.')[0].split('_preguidance')[0], input_hashes[file], guidance_outputs(params, file))
+		else:
+			print('\nRunning Guidance on ' + str(n_jobs) + ' gene families at a time, with ' + str(threads_per_job) + ' threads each\n')
+			with Pool(n_jobs, initializer = profiling.set_stage, initargs = (profiling.current_stage,)) as pool:
+				for file, removed_lines in pool.imap_unordered(partial(guidance_og, params, guidance_input, guidance_threads = threads_per_job), og_files):
+					for line in removed_lines:
 						guidance_removed_file.write(line)
-					#Copying over the old file with the new results
-					os.system('cp ' + tax_guidance_outdir + '/Seqs.Orig.fas.FIXED.Without_low_SP_Seq.With_Names ' + guidance_input + '/' + file)
-					
-					#Handling intermediate files for each iteration.	
-					if params.keep_iter:
-						if i +1 < params.guidance_iters:
-							os.makedirs(params.output + '/Output/Intermediate/Guidance/Iterations/', exist_ok = True)
-							os.makedirs(params.output + '/Output/Intermediate/Guidance/Iterations/' + str(i+1)+'/', exist_ok = True)
-							os.makedirs(params.output + '/Output/Intermediate/Guidance/Iterations/' + str(i+1) + '/' + file.split('.')[0].split('_preguidance')[0], exist_ok = True)
-							iteration_folder = params.output + '/Output/Intermediate/Guidance/Iterations/' + str(i +1) + '/' + file.split('.')[0].split('_preguidance')[0]
-							os.system('cp -r ' + tax_guidance_outdir + '/* ' + iteration_folder)
-							
-							
-							if not params.keep_temp:
-								for gdir_file in os.listdir(iteration_folder):
-									if gdir_file not in ('MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names', 'MSA.MAFFT.aln.With_Names', 'MSA.MAFFT.Guidance2_res_pair_col.scr', 'log', 'postGuidance_preTrimAl_unaligned.fasta'):
-										os.system('rm -r ' + iteration_folder + '/' + gdir_file)
-									else:
-										if gdir_file == 'MSA.MAFFT.aln.With_Names':
-											os.system('mv ' + iteration_folder + '/' + gdir_file + ' ' + iteration_folder + '/' + file.split('.')[0].split('_preguidance')[0] + '_' + gdir_file + '.aln')
-										else:
-											os.system('mv ' + iteration_folder + '/' + gdir_file + ' ' + iteration_folder + '/' + file.split('.')[0].split('_preguidance')[0] + '_' + gdir_file)
-				
-					os.system('rm -r ' + tax_guidance_outdir + '/*')
-				else:
-					fail = True
-					break
-
-			#After all iterations, THEN apply residue and column cutoffs
-			if not fail:
-				#Getting a list of sequences to keep
-				seqs2keep = [rec.description for rec in SeqIO.parse(tax_guidance_outdir + '/Seqs.Orig.fas.FIXED.Without_low_SP_Seq.With_Names', 'fasta')]
-				orig_seqs = [rec.description for rec in SeqIO.parse(tax_guidance_outdir + '/MSA.MAFFT.aln.With_Names', 'fasta')]
-				running_aln = { rec.description : str(rec.seq) for rec in SeqIO.parse(tax_guidance_outdir + '/MSA.MAFFT.aln.With_Names', 'fasta') if rec.description in seqs2keep }
-
-				#Residues that fall below the confidence cutoff (--res_cutoff) are replaced with 'X'
-				for site in [(int(line.split()[1]), int(line.split()[0]) - 1) for line in open(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_seq.scr').readlines()[1:-1] if float(line.split(' ')[-1].strip()) < params.res_cutoff]:
-					if(orig_seqs[site[0]] in seqs2keep):
-						running_aln[orig_seqs[site[0]]][site[1]] = 'X'
-
-				#Removing columns below the --col_cutoff
-				cols2remove = [int(line.split()[0]) - 1 for line in open(tax_guidance_outdir + '/MSA.MAFFT.Guidance2_res_pair_col.scr').readlines()[1:-1] if float(line.split(' ')[-1].strip()) < params.col_cutoff]
-				for seq in running_aln:
-					running_aln[seq] = ''.join([running_aln[seq][i] for i in range(len(running_aln[seq])) if i not in cols2remove])
-
-				with open(tax_guidance_outdir + '/postGuidance_preTrimAl_unaligned.fasta', 'w') as o:
-					for seq in running_aln:
-						o.write('>' + seq + '\n' + str(running_aln[seq]).replace('-', '') + '\n\n')
-
-				#Aligning one last time after removing the final set of sequences and applying the res and col cutoffs
-				print('mafft ' + tax_guidance_outdir + '/postGuidance_preTrimAl_unaligned.fasta > ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '_postGuidance_preTrimAl_aligned.fasta')
-				os.system('mafft ' + tax_guidance_outdir + '/postGuidance_preTrimAl_unaligned.fasta > ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.postGuidance_preTrimAl_aligned.fasta')
-
-				#Gap trimming
-				os.system('Scripts/trimal-trimAl/source/trimal -in ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.postGuidance_preTrimAl_aligned.fasta -out ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.70gapTrimmed.fasta -gapthreshold ' + str(params.trimal_cutoff) + ' -fasta')
-
-				#Copying over final aligments (pre and post gap trimming) into output folder.
-				os.system('cp ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.70gapTrimmed.fasta ' + params.output + '/Output/Guidance/' + file.split('.')[0].split('_preguidance')[0] + '.70gapTrimmed.fasta')
-				os.system('cp ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.postGuidance_preTrimAl_aligned.fasta ' + params.output + '/Output/NotGapTrimmed/' + file.split('.')[0].split('_preguidance')[0] + '.postGuidance_preTrimAl_aligned.fasta')
-				
-				#Removing intermediate files if not --keep_temp
-				if not params.keep_temp:
-					for gdir_file in os.listdir(tax_guidance_outdir):
-						if gdir_file not in ('MSA.MAFFT.Guidance2_res_pair_seq.scr_with_Names', 'MSA.MAFFT.aln.With_Names', 'MSA.MAFFT.Guidance2_res_pair_col.scr', 'log', 'postGuidance_preTrimAl_unaligned.fasta'):
-							os.system('rm -r ' + tax_guidance_outdir + '/' + gdir_file)
-						else:
-							if gdir_file == 'MSA.MAFFT.aln.With_Names':
-								os.system('mv ' + tax_guidance_outdir + '/' + gdir_file + ' ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '_' + gdir_file + '.aln')
-							else:
-								os.system('mv ' + tax_guidance_outdir + '/' + gdir_file + ' ' + tax_guidance_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '_' + gdir_file)
+					guidance_removed_file.flush()
+					utils.record_checkpoint(params, 'guidance', file.split('.')[0].split('_preguidance')[0], input_hashes[file], guidance_outputs(params, file))
 
 		guidance_removed_file.close()
 		return True
@@ -14,6 +14,9 @@
 # If users are concerned about only a particular taxon or set of taxa having highly redundant sequences 
 # (e.g. human genome), or want to remove highly similar sequences from all but a focal group of taxa, 
 # they can input a list of taxa on which the similarity filter is to be exclusively applied (--sim_taxa).
+# By default, the similarity filter runs a single all-vs-all DIAMOND search per taxon and then repeats the
+# longest-sequence clustering in memory from that hit table, with e-values scaled to those of a search against
+# each master sequence alone; --sim_iterative runs one search per master sequence instead, as in earlier versions.
 
 # One other optional filter is a simple blacklist of sequences (--blacklist). Any sequences with IDs that are in this 
 # (text) file will be removed from the output Pre-Guidance files.
@@ -21,11 +24,81 @@
 # The script also reads in the --gf_list (to select a certain list of OGs from input ReadyToGo files) and
 # --taxon_list (a list of all taxon names corresponding to the first ten digits of the ReadyToGo files to use)
 # and reorganizes the sequence data by OG rather than by taxa. It does this whether the above filters are used
-# or not.
+# or not. Each taxon file is read only once: its sequences are indexed by OG up front, and
+# every Pre-Guidance file is then written from that index.
 
 #Dependencies
 import os, sys, re
 from Bio import SeqIO
+import profiling
+
+#Streams each taxon file exactly once and buckets its sequences by OG (the last 10
+#characters of the sequence ID), keeping only OGs in the --gf_list. Returns a
+#dictionary of { OG : { taxon file : [records] } } from which every Pre-Guidance file
+#can be written without re-reading the taxon files.
+def index_taxon_files(params, aa_files, ogs, blacklist_seqs):
+
+	og_index = { og : { } for og in ogs }
+	for taxon_file in aa_files:
+		for rec in SeqIO.parse(params.data + '/' + taxon_file, 'fasta'):
+			og = rec.id[-10:]
+			if og in og_index and og.startswith(params.og_identifier) and rec.id not in blacklist_seqs:
+				if taxon_file not in og_index[og]:
+					og_index[og].update({ taxon_file : [] })
+				og_index[og][taxon_file].append(rec)
+
+	return og_index
+
+
+#Runs one all-vs-all DIAMOND search of all of a taxon's sequences (in all OGs) and returns, for each
+#sequence, the set of sequences from the same OG that it hits at or above the --sim_cutoff identity.
+#DIAMOND scales e-values by the size of the database, which here is the whole taxon rather than the one
+#master sequence of the iterative filter. The search is therefore run with an effective database size of
+#one letter, and each e-value is scaled back up by the length of the hit sequence, so that hits pass the
+#same e-value cutoff (DIAMOND's default of 0.001) as they would when searched against that sequence alone.
+def sim_hits_per_taxon(params, taxon_file, og_index, ogs):
+
+	file_name = params.output + '/Output/Intermediate/SF_Diamond/' + taxon_file[:10] + '_all'
+	seq_lens = { }
+	with open(file_name + '.faa', 'w') as o:
+		for og in ogs:
+			for rec in og_index[og].get(taxon_file, []):
+				if rec.id == rec.description:
+					o.write('>' + rec.id + '\n' + str(rec.seq) + '\n\n'); seq_lens.update({ rec.id : len(rec.seq) })
+
+	hits = { }
+	if len(seq_lens) < 2:
+		return hits
+
+	profiling.run(params, 'diamond makedb --in ' + file_name + '.faa -d ' + file_name)
+	profiling.run(params, 'diamond blastp -d ' + file_name + '.dmnd -q ' + file_name + '.faa --max-target-seqs 0 --dbsize 1 --outfmt 6 -o ' + file_name + '_diamond_results.tsv')
+
+	for line in open(file_name + '_diamond_results.tsv'):
+		line = line.strip().split('\t')
+
+		#Only hits between different sequences of the same OG (the last 10 characters of the ID) are used
+		if line[0] != line[1] and line[0][-10:] == line[1][-10:] and float(line[2])/100 >= params.sim_cutoff and float(line[10]) * seq_lens.get(line[1], 0) <= 0.001:
+			if line[0] not in hits:
+				hits.update({ line[0] : set() })
+			hits[line[0]].add(line[1])
+
+	return hits
+
+
+#Greedy clustering from an all-vs-all hit table, giving the same result as the iterative filter: the longest
+#remaining sequence becomes a master, every remaining sequence that hits it at or above --sim_cutoff is
+#removed, and this is repeated until fewer than two sequences are left.
+def cluster_by_similarity(recs, hits):
+
+	masters = []; recs_to_remove = []; cycle = -1
+	while len(recs) > 1:
+		cycle += 1
+		master = recs[0]; masters.append(master)
+		recs_to_remove += [rec.id for rec in recs[1:] if master.id in hits.get(rec.id, ())]
+		recs = [rec for rec in recs[1:] if master.id not in hits.get(rec.id, ())]
+
+	return recs, masters, recs_to_remove, cycle
+
 
 #This function is called ONLY in eukphylo.py.
 def run(params):
@@ -57,12 +130,12 @@ def run(params):
 	#Reading in any black-listed sequences.
 	if params.blacklist != None:
 		try:
-			blacklist_seqs = list(dict.fromkeys([line.strip() for line in open(params.blacklist)]))
+			blacklist_seqs = set([line.strip() for line in open(params.blacklist)])
 		except (FileNotFoundError, TypeError) as e:
 			print('\nERROR: Unable to read blacklist file. Please make sure that the path is correct and that the file is formatted correctly.\n\n' + str(e) + '\n')
 			exit()
 	else:
-		blacklist_seqs = []
+		blacklist_seqs = set()
 
 	#Looking for input data
 	if not os.path.isdir(params.data):
@@ -74,10 +147,20 @@ def run(params):
 	if(len(missing_taxa) > 0):
 		print('\nWARNING: The following taxa in the taxon list are missing amino-acid files in ' + params.data + ':\n' + '\n'.join(['\t' + t for t in missing_taxa]) + '\n')
 
-	os.mkdir(params.output + '/Output/Intermediate/SF_Diamond')
+	os.makedirs(params.output + '/Output/Intermediate/SF_Diamond', exist_ok = True)
 	
 	removed_file = open(params.output + '/Output/Pre-Guidance/SimFilter_removed.txt', 'w')
 
+	#Reading each taxon file once, rather than once per OG
+	og_index = index_taxon_files(params, aa_files, ogs, blacklist_seqs)
+
+	#One all-vs-all similarity search per taxon that the similarity filter is applied to
+	sim_hits = { }
+	if params.similarity_filter and not params.sim_iterative:
+		for taxon_file in aa_files:
+			if sim_taxa == 'all' or taxon_file[:10] in sim_taxa:
+				sim_hits.update({ taxon_file : sim_hits_per_taxon(params, taxon_file, og_index, ogs) })
+
 	#Applying similarity filter to each OG and taxon.
 	for og in ogs:
 		print('\nProcessing ' + og + '\n')
@@ -85,7 +168,7 @@ def run(params):
 			for taxon_file in aa_files:
 				recs = []
 				#Sorting the records by length
-				for rec in sorted([rec for rec in SeqIO.parse(params.data + '/' + taxon_file, 'fasta') if rec.id[-10:] == og and rec.id not in blacklist_seqs and rec.id[-10:].startswith(params.og_identifier)], key=lambda x: -len(x.seq)):
+				for rec in sorted(og_index[og].get(taxon_file, []), key=lambda x: -len(x.seq)):
 					if(rec.id == rec.description):
 						recs.append(rec)
 					else:
@@ -102,7 +185,13 @@ def run(params):
 
 				masters = []; removed = 0; flag = 0; cycle = 0
 				if params.similarity_filter and use_taxon:
-					if len(recs) > 1:
+					if len(recs) > 1 and not params.sim_iterative:
+						recs, masters, recs_to_remove, cycle = cluster_by_similarity(recs, sim_hits[taxon_file])
+						removed = len(recs_to_remove)
+
+						for item in recs_to_remove:
+							removed_file.write(f"{item}\n")
+					elif len(recs) > 1:
 						while flag == 0:
 							#Creating output files to use in similarity searching
 							master_file_name = params.output + '/Output/Intermediate/SF_Diamond/' + og + '_' + taxon_file[:10] + '_master_' + str(cycle)
@@ -119,8 +208,8 @@ def run(params):
 									queries.write('>' + rec.id + '\n' + str(rec.seq) + '\n\n')
 
 							#Similarity searching all query sequences against the master sequence
-							os.system('diamond makedb --in ' + master_file_name + '.faa -d ' + master_file_name)
-							os.system('diamond blastp -d ' + master_file_name + '.dmnd -q ' + query_file_name + ' --outfmt 6 -o ' + diamond_out_name)
+							profiling.run(params, 'diamond makedb --in ' + master_file_name + '.faa -d ' + master_file_name)
+							profiling.run(params, 'diamond blastp -d ' + master_file_name + '.dmnd -q ' + query_file_name + ' --outfmt 6 -o ' + diamond_out_name)
 
 							#Reading the result
 							diamond_out = open(diamond_out_name).readlines()
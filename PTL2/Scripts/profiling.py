@@ -0,0 +1,174 @@
+# Last updated Oct 2026
+
+# This script holds the optional run profiler (--profile). When it is on, eukphylo.py times each
+# stage (pre-Guidance, Guidance, trees, contamination loop, concatenation), guidance.py and trees.py
+# time each gene family, and the external programs (DIAMOND, MAFFT, Guidance, trimAl, IQ-Tree,
+# RAxML, FastTree) are launched through run() instead of os.system, which records the wall time,
+# CPU time and peak memory of every command. Each record is appended to Output/Profile.jsonl as
+# soon as it is finished, so that records made in Guidance worker processes are kept and a crashed
+# run still leaves a partial profile. At the end of the run, write_report() summarizes all records
+# into Output/Profile.json (per stage, per gene family, per command and per program) and
+# Output/Profile.csv (one row per record).
+
+# Peak memory (max_rss_mb) is the largest resident set size of the command itself (including any
+# processes it waited on). For a gene family it is the largest of its commands, and for a stage
+# it is the high-water mark of the EukPhylo process so far, next to the largest of the stage's
+# commands. With --resume, records from earlier attempts in the same Output folder are included.
+
+#Dependencies
+import os, sys, time, json, csv
+import resource, subprocess, threading
+from contextlib import contextmanager
+from functools import wraps
+
+#The stage currently being run (set in eukphylo.py, and passed to worker processes with set_stage) and,
+#per thread, the gene family currently being run, so that commands can be attributed to both
+current_stage = None
+context = threading.local()
+
+
+#Sets the current stage in a worker process (used as the initializer of the Guidance Pool), since
+#worker processes that are spawned rather than forked (the default on macOS) do not inherit it
+def set_stage(name):
+
+	global current_stage
+	current_stage = name
+
+
+#ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+def rss_mb(maxrss):
+
+	if sys.platform == 'darwin':
+		return maxrss / (1024 * 1024)
+
+	return maxrss / 1024
+
+
+#Appending one finished record to the profile log
+def log_record(params, record):
+
+	os.makedirs(params.output + '/Output', exist_ok = True)
+	with open(params.output + '/Output/Profile.jsonl', 'a') as o:
+		o.write(json.dumps(record) + '\n')
+
+
+#Name of the program a command runs (Guidance is run through python)
+def tool_name(command):
+
+	if 'guidance_main.py' in command or 'guidance.pl' in command:
+		return 'guidance'
+
+	return os.path.basename(command.split()[0])
+
+
+#Runs a shell command like os.system (returning the same exit status), recording its wall time,
+#CPU time and peak memory when profiling
+def run(params, command):
+
+	if not params.profile:
+		return os.system(command)
+
+	start = time.time(); wall = time.perf_counter()
+	process = subprocess.Popen(command, shell = True)
+	pid, status, usage = os.wait4(process.pid, 0)
+	process.returncode = os.waitstatus_to_exitcode(status)
+
+	og_stage, og = getattr(context, 'og', (None, None))
+	record = { 'type' : 'command', 'stage' : current_stage, 'step' : og_stage, 'og' : og, 'tool' : tool_name(command), 'start' : start, 'wall_s' : time.perf_counter() - wall, 'cpu_s' : usage.ru_utime + usage.ru_stime, 'max_rss_mb' : rss_mb(usage.ru_maxrss), 'exit_status' : process.returncode, 'command' : command }
+
+	if og != None:
+		context.og_cpu += record['cpu_s']
+		context.og_rss = max(context.og_rss, record['max_rss_mb'])
+
+	log_record(params, record)
+
+	return status
+
+
+#Times one stage of the pipeline (called in eukphylo.py). CPU time includes all child processes
+#(external programs and Guidance workers) that finished during the stage.
+@contextmanager
+def stage(params, name):
+
+	global current_stage
+
+	if not params.profile:
+		yield
+		return
+
+	current_stage = name
+	start = time.time(); wall = time.perf_counter(); cpu = os.times()
+	try:
+		yield
+	finally:
+		end_cpu = os.times()
+		log_record(params, { 'type' : 'stage', 'stage' : name, 'step' : None, 'og' : None, 'tool' : None, 'start' : start, 'wall_s' : time.perf_counter() - wall, 'cpu_s' : sum(end_cpu[:4]) - sum(cpu[:4]), 'max_rss_mb' : rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss), 'exit_status' : None, 'command' : None })
+		current_stage = None
+
+
+#Times the work on one gene family in a given step (e.g. 'guidance' or 'trees'). CPU time is that of
+#the calling thread plus that of the commands it ran.
+@contextmanager
+def og(params, step, og):
+
+	if not params.profile:
+		yield
+		return
+
+	context.og = (step, og); context.og_cpu = 0.0; context.og_rss = 0.0
+	start = time.time(); wall = time.perf_counter(); cpu = time.thread_time()
+	try:
+		yield
+	finally:
+		log_record(params, { 'type' : 'og', 'stage' : current_stage, 'step' : step, 'og' : og, 'tool' : None, 'start' : start, 'wall_s' : time.perf_counter() - wall, 'cpu_s' : time.thread_time() - cpu + context.og_cpu, 'max_rss_mb' : context.og_rss, 'exit_status' : None, 'command' : None })
+		context.og = (None, None)
+
+
+#Decorator for the per-gene family functions of guidance.py and trees.py, which all take
+#(params, input folder, file name, ...)
+def per_og(step):
+
+	def decorator(func):
+		@wraps(func)
+		def wrapper(params, path, file, *args, **kwargs):
+			with og(params, step, file.split('.')[0].split('_preguidance')[0]):
+				return func(params, path, file, *args, **kwargs)
+		return wrapper
+
+	return decorator
+
+
+#Adds up the wall time, CPU time, peak memory and count of a list of records
+def totals(records):
+
+	return { 'count' : len(records), 'wall_s' : sum([r['wall_s'] for r in records]), 'cpu_s' : sum([r['cpu_s'] for r in records]), 'max_rss_mb' : max([r['max_rss_mb'] for r in records] + [0]) }
+
+
+#Summarizing the profile log into Output/Profile.json and Output/Profile.csv
+def write_report(params):
+
+	if not params.profile or not os.path.isfile(params.output + '/Output/Profile.jsonl'):
+		return
+
+	records = [json.loads(line) for line in open(params.output + '/Output/Profile.jsonl') if line.strip() != '']
+
+	stages = [r for r in records if r['type'] == 'stage']
+	ogs = sorted([r for r in records if r['type'] == 'og'], key = lambda r : -r['wall_s'])
+	commands = sorted([r for r in records if r['type'] == 'command'], key = lambda r : -r['wall_s'])
+
+	for s in stages:
+		s['max_command_rss_mb'] = totals([c for c in commands if c['stage'] == s['stage']])['max_rss_mb']
+
+	tools = { tool : totals([c for c in commands if c['tool'] == tool]) for tool in dict.fromkeys([c['tool'] for c in commands]) }
+
+	with open(params.output + '/Output/Profile.json', 'w') as o:
+		json.dump({ 'stages' : stages, 'tools' : tools, 'ogs' : ogs, 'commands' : commands }, o, indent = 1)
+
+	fields = ['type', 'stage', 'step', 'og', 'tool', 'start', 'wall_s', 'cpu_s', 'max_rss_mb', 'exit_status', 'command']
+	with open(params.output + '/Output/Profile.csv', 'w', newline = '') as o:
+		writer = csv.DictWriter(o, fieldnames = fields, extrasaction = 'ignore')
+		writer.writeheader()
+		for record in records:
+			writer.writerow(record)
+
+	print('\nRun profile written to Output/Profile.json and Output/Profile.csv\n')
@@ -6,11 +6,114 @@
 # in contamination.py, where it is used to re-build trees. When starting at this
 # step, users must input one aligned amino acid fasta file per OG. Otherwise, if 
 # starting at the pre-Guidance or Guidance steps, this step will be run if --end = trees.
+# Up to --tree_jobs trees can be built at once; the --tree_threads core budget is then
+# split between them in proportion to alignment size (sequences x columns). Each finished
+# tree is recorded in Output/Checkpoints.tsv, so that --resume can skip it after a crash.
 
 #Dependencies
 import os, sys, re
 from Bio import SeqIO
 from color import color
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import utils
+import profiling
+
+#Builds the tree for a single alignment with the given number of threads. Called from run(),
+#possibly from several scheduler threads at once.
+@profiling.per_og('trees')
+def tree_og(params, guidance_path, file, threads):
+
+	#Run IQ-Tree
+	if params.tree_method == 'iqtree' or params.tree_method == 'iqtree_fast':
+		#Make intermediate folders
+		os.makedirs(params.output + '/Output/Intermediate/IQTree', exist_ok = True)
+			
+		tax_iqtree_outdir = params.output + '/Output/Intermediate/IQTree/' + file.split('.')[0].split('_preguidance')[0]
+		#Clearing out a partial run of this OG (only when resuming with --resume)
+		if os.path.isdir(tax_iqtree_outdir):
+			os.system('rm -rf ' + tax_iqtree_outdir)
+		os.mkdir(tax_iqtree_outdir)
+
+		#Examples on how to run IQ-Tree
+		#Comment on the lines that do not fit your system
+		#Run IQ-Tree on the Smith College grid
+		if params.tree_method == 'iqtree':
+			profiling.run(params, 'iqtree2 -s ' + guidance_path + '/' + file + ' -m LG+G -T ' + str(threads) + ' --prefix ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')
+		elif params.tree_method == 'iqtree_fast':
+			profiling.run(params, 'iqtree2 -s ' + guidance_path + '/' + file + ' -m LG+G -T ' + str(threads) + ' --fast --prefix ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')
+			
+		#Run IQ-Tree in HPC Unity Cluster
+		#if params.tree_method == 'iqtree':
+			#os.system('iqtree2 -s ' + guidance_path + '/' + file + ' -m LG+G --prefix ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')
+		#elif params.tree_method == 'iqtree_fast':
+			#os.system('iqtree2 -s ' + guidance_path + '/' + file + ' -m LG+G --fast --prefix ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')
+		
+		# Copy over the final output
+		if os.path.isfile(tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile'):
+			os.system('cp ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile ' + params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.tree')
+			#color(params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.tree')
+		else:
+			print('\nWARNING: No tree file created by IQ-Tree for OG ' + file[:10] + '\n')
+
+	#If not IQ-Tree, then run RAxML
+	elif params.tree_method == 'raxml':
+		#Make intermediate folders
+		os.makedirs(params.output + '/Output/Intermediate/RAxML', exist_ok = True)
+			
+		tax_raxml_outdir = params.output + '/Output/Intermediate/RAxML/' + file.split('.')[0].split('_preguidance')[0]
+		if os.path.isdir(tax_raxml_outdir):
+			os.system('rm -rf ' + tax_raxml_outdir)
+		os.mkdir(tax_raxml_outdir)
+
+		#Reformat the alignment as phylip
+		profiling.run(params, './Scripts/trimal-trimAl/source/trimal -in ' + guidance_path + '/' + file + ' -phylip -out ' + tax_raxml_outdir + '/aligned.phy')
+
+		#Run RAxML
+		profiling.run(params, 'raxmlHPC -s ' + tax_raxml_outdir + '/aligned.phy -m PROTGAMMALG -f d -p 12345 -# 10 -n ' + file.split('.')[0].split('_preguidance')[0] + '_RAxML -T ' + str(threads) + ' -w ' + os.path.abspath(tax_raxml_outdir))
+		
+		#Copy over final output
+		if os.path.isfile(tax_raxml_outdir + '/RAxML_bestTree.' + file.split('.')[0].split('_preguidance')[0] + '_RAxML'):
+			os.system('cp ' + tax_raxml_outdir + '/RAxML_bestTree.' + file.split('.')[0].split('_preguidance')[0] + '_RAxML ' + params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '_RAxML.tree')
+			#color(params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '_RAxML.tree')
+		else:
+			print('\nWARNING: No tree file created by RAxML for OG ' + file[:10] + '\n')
+
+
+#The final tree file for one alignment, as recorded in the checkpoint file
+def tree_outputs(params, file):
+
+	if params.tree_method == 'raxml':
+		return [params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '_RAxML.tree']
+	else:
+		return [params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.tree']
+
+
+#Alignment size (sequences x columns), used to decide how many threads each tree gets
+def alignment_size(path):
+
+	nseqs = 0; ncols = 0
+	for rec in SeqIO.parse(path, 'fasta'):
+		nseqs += 1
+		ncols = max(ncols, len(rec.seq))
+
+	return nseqs * ncols
+
+
+#Giving each alignment a share of the --tree_threads core budget in proportion to its size,
+#relative to the --tree_jobs largest alignments (which are expected to run side by side).
+#Every job gets at least one thread and at most the whole budget.
+def allocate_threads(sizes, total_threads, n_jobs):
+
+	ref_size = sum(sorted(sizes.values(), reverse = True)[:n_jobs])
+
+	threads = { }
+	for file in sizes:
+		if ref_size == 0:
+			threads.update({ file : max(1, total_threads // n_jobs) })
+		else:
+			threads.update({ file : max(1, min(total_threads, round(total_threads * sizes[file] / ref_size))) })
+
+	return threads
 
 #Called in eukphylo.py and contamination.py
 def run(params):
@@ -30,60 +133,49 @@ def run(params):
 		print('\nERROR: No Guidance (unaligned) files could be found at the path ' + guidance_path + '. Make sure that the --start and --data parameters are correct, that the Guidance step ran successfully, and that the aligned files are formatted correctly (they must have the file extension .faa, .fa, .aln, .fas, or .fasta).\n')
 		exit()
 
-	#For each input alignment
-	for file in [f for f in os.listdir(guidance_path)  if f.endswith('.fa') or f.endswith('.faa') or f.endswith('.fasta') or f.endswith('.fas') or f.endswith('.aln')]:
-
-		#Run IQ-Tree
-		if params.tree_method == 'iqtree' or params.tree_method == 'iqtree_fast':
-			#Make intermediate folders
-			if not os.path.isdir(params.output + '/Output/Intermediate/IQTree'):
-				os.mkdir(params.output + '/Output/Intermediate/IQTree')
-				
-			tax_iqtree_outdir = params.output + '/Output/Intermediate/IQTree/' + file.split('.')[0].split('_preguidance')[0]
-			os.mkdir(tax_iqtree_outdir)
-
-			#Examples on how to run IQ-Tree
-			#Comment on the lines that do not fit your system
-			#Run IQ-Tree on the Smith College grid
-			if params.tree_method == 'iqtree':
-				os.system('iqtree2 -s ' + guidance_path + '/' + file + ' -m LG+G -T 10 --prefix ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')
-			elif params.tree_method == 'iqtree_fast':
-				os.system('iqtree2 -s ' + guidance_path + '/' + file + ' -m LG+G -T 10 --fast --prefix ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')
-				
-			#Run IQ-Tree in HPC Unity Cluster
-			#if params.tree_method == 'iqtree':
-				#os.system('iqtree2 -s ' + guidance_path + '/' + file + ' -m LG+G --prefix ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')
-			#elif params.tree_method == 'iqtree_fast':
-				#os.system('iqtree2 -s ' + guidance_path + '/' + file + ' -m LG+G --fast --prefix ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree')
-			
-			# Copy over the final output
-			if os.path.isfile(tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile'):
-				os.system('cp ' + tax_iqtree_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile ' + params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.tree')
-				#color(params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.tree')
-			else:
-				print('\nWARNING: No tree file created by IQ-Tree for OG ' + file[:10] + '\n')
-
-		#If not IQ-Tree, then run RAxML
-		elif params.tree_method == 'raxml':
-			#Make intermediate folders
-			if not os.path.isdir(params.output + '/Output/Intermediate/RAxML'):
-				os.mkdir(params.output + '/Output/Intermediate/RAxML')
-				
-			tax_raxml_outdir = params.output + '/Output/Intermediate/RAxML/' + file.split('.')[0].split('_preguidance')[0]
-			os.mkdir(tax_raxml_outdir)
-
-			#Reformat the alignment as phylip
-			os.system('./Scripts/trimal-trimAl/source/trimal -in ' + guidance_path + '/' + file + ' -phylip -out ' + tax_raxml_outdir + '/aligned.phy')
-
-			#Run RAxML
-			os.system('raxmlHPC -s ' + tax_raxml_outdir + '/aligned.phy -m PROTGAMMALG -f d -p 12345 -# 10 -n ' + file.split('.')[0].split('_preguidance')[0] + '_RAxML -T ' + str(params.guidance_threads))
-			
-			#Copy over final output
-			if os.path.isfile(tax_raxml_outdir + '/' + file.split('.')[0].split('_preguidance')[0] + '.IQTree.treefile'):
-				os.system('cp ' + tax_raxml_outdir + '/RAxML_bestTree.' + file.split('.')[0].split('_preguidance')[0] + '_RAxML ' + params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '_RAxML.tree')
-				#color(params.output + '/Output/Trees/' + file.split('.')[0].split('_preguidance')[0] + '_RAxML.tree')
-			else:
-				print('\nWARNING: No tree file created by RAxML for OG ' + file[:10] + '\n')
+	og_files = [f for f in os.listdir(guidance_path)  if f.endswith('.fa') or f.endswith('.faa') or f.endswith('.fasta') or f.endswith('.fas') or f.endswith('.aln')]
+
+	#Skipping alignments that already have a tree built from the same input (--resume)
+	input_hashes = { file : utils.file_hash(guidance_path + '/' + file) for file in og_files }
+	checkpoints = utils.load_checkpoints(params)
+	done_ogs = [file for file in og_files if utils.og_complete(checkpoints, 'trees', file.split('.')[0].split('_preguidance')[0], input_hashes[file])]
+	if len(done_ogs) > 0:
+		print('\nSkipping ' + str(len(done_ogs)) + ' gene families that already have trees\n')
+		og_files = [file for file in og_files if file not in done_ogs]
+
+	n_jobs = max(1, min(params.tree_jobs, len(og_files)))
+
+	#Running one tree at a time with all threads, as before
+	if n_jobs == 1:
+		for file in og_files:
+			tree_og(params, guidance_path, file, params.tree_threads)
+			utils.record_checkpoint(params, 'trees', file.split('.')[0].split('_preguidance')[0], input_hashes[file], tree_outputs(params, file))
+		return
+
+	#Otherwise, largest alignments first with the most threads. Whenever a job finishes, any waiting job
+	#that fits in the free threads is started, so that small OGs are packed in around the large ones, but
+	#never more than --tree_jobs trees at the same time.
+	sizes = { file : alignment_size(guidance_path + '/' + file) for file in og_files }
+	threads = allocate_threads(sizes, params.tree_threads, n_jobs)
+	queue = sorted(og_files, key = lambda f : -sizes[f])
+
+	running = { }; free_threads = params.tree_threads
+	with ThreadPoolExecutor(max_workers = n_jobs) as executor:
+		while len(queue) > 0 or len(running) > 0:
+			for file in list(queue):
+				if len(running) >= n_jobs:
+					break
+				if threads[file] <= free_threads or len(running) == 0:
+					running.update({ executor.submit(tree_og, params, guidance_path, file, threads[file]) : file })
+					free_threads -= threads[file]
+					queue.remove(file)
+
+			done, not_done = wait(list(running), return_when = FIRST_COMPLETED)
+			for job in done:
+				job.result()
+				file = running.pop(job)
+				free_threads += threads[file]
+				utils.record_checkpoint(params, 'trees', file.split('.')[0].split('_preguidance')[0], input_hashes[file], tree_outputs(params, file))
 
 
 
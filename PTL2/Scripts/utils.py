@@ -5,12 +5,15 @@
 # a function to read in all EukPhylo parameters, which is called in eukphylo.py.
 # It also has a function that checks for and cleans up existing EukPhylo part 2
 # output files from previous runs, and creates a new, empty Output folder structure
-# for the new run. This function is also called only in eukphylo.py.
+# for the new run. This function is also called only in eukphylo.py. Finally, it has a few
+# small functions to keep a checkpoint file (Output/Checkpoints.tsv) recording which gene
+# families have finished each stage, so that a crashed run can be picked up with --resume.
 
 #Dependencies
 import os, sys, re
 import argparse
 import shutil
+import hashlib
 
 #Reading in all parameters. This function is only called once, in eukphylo.py
 def get_params():
@@ -28,7 +31,10 @@ def get_params():
 	common.add_argument('--data', help = 'Path to the input dataset. The format of this varies depending on your --start parameter. If you are running the contamination loop starting with trees, this folder must include both trees AND a fasta file for each tree (with identical file names other than the extension) that includes an amino-acid sequence for each tip of the tree (with the sequence names matching exactly the tip names).')
 	common.add_argument('--output', default = './', help = 'Directory where the output folder should be created. If not given, the folder will be created in the parent directory of the folder containing the scripts.')
 	common.add_argument('--force', action = 'store_true', help = 'Overwrite all existing files in the "Output" folder.')
+	common.add_argument('--resume', action = 'store_true', help = 'Continue a previous run in the existing "Output" folder, skipping gene families that already finished Guidance and/or tree-building with the same input (as recorded in Output/Checkpoints.tsv). Gene families that failed are tried again. A run that already started the contamination loop cannot be resumed.')
 	common.add_argument('--tree_method', default = 'iqtree_fast', choices = {'iqtree', 'iqtree_fast', 'raxml', 'all'}, help = 'Program to use for tree-building')
+	common.add_argument('--tree_threads', default = 10, type = int, help = 'Total number of threads to use for tree-building (shared between all trees being built at the same time)')
+	common.add_argument('--tree_jobs', default = 1, type = int, help = 'Maximum number of trees to build at the same time. Larger alignments are given a larger share of the --tree_threads.')
 	common.add_argument('--blacklist', type = str, help = 'A text file with a list of sequence names not to consider')
 	common.add_argument('--og_identifier', default = 'OG', choices = {'OG','OG6','OGA','OGG'}, help = 'Program to use for selecting seq by GC width')
 	common.add_argument('--sim_taxa', default = None, help = 'Path to the file with the taxa (10-digit codes) to apply the similarity filter on.')
@@ -37,6 +43,7 @@ def get_params():
 	core.add_argument('--blast_cutoff', default = 1e-20, type = float, help = 'Blast e-value cutoff')
 	core.add_argument('--len_cutoff', default = 10, type = int, help = 'Amino acid length cutoff for removal of very short sequences after column removal in Guidance.')
 	core.add_argument('--similarity_filter', action = 'store_true', help = 'Run the similarity filter in pre-Guidance')
+	core.add_argument('--sim_iterative', action = 'store_true', help = 'Run the similarity filter with one DIAMOND search per master sequence (slow), rather than one all-vs-all search per taxon')
 	core.add_argument('--sim_cutoff', default = 1, type = float, help = 'Sequences from the same taxa that are assigned to the same OG are removed if they are more similar than this cutoff')
 	core.add_argument('--guidance_iters', default = 5, type = int, help = 'Number of Guidance iterations for sequence removal')
 	core.add_argument('--guidance_path', help = 'Path to the downloaded Guidance folder (probably called guidance_Linux or guidance_MacOS-arm64, this folder should contain a folder called "script" which contains the guidance_main.py script). You can download this folder from this link: https://github.com/XseniaP/Guidance_mid/tree/main')
@@ -44,6 +51,7 @@ def get_params():
 	core.add_argument('--col_cutoff', default = 0.0, type = float, help = 'During guidance, columns are removed if their score is below this cutoff')
 	core.add_argument('--res_cutoff', default = 0.0, type = float, help = 'During guidance, residues are removed if their score is below this cutoff')
 	core.add_argument('--guidance_threads', default = 20, type = int, help = 'Number of threads to allocate to Guidance')
+	core.add_argument('--guidance_jobs', default = 1, type = int, help = 'Number of gene families to run through Guidance at the same time. The --guidance_threads are split evenly between these concurrent runs.')
 	core.add_argument('--trimal_cutoff', default = 0.3, type = float, help = 'Gap masking threshold for TrimAl. The maximum proportion of sequences without gaps for a site to be removed (i.e. to remove sites with 70% or more gaps, set this parameter to 0.3).')
 	core.add_argument('--allow_large_files', action = 'store_true', help = 'Allow files with more than 2,000 sequences to run through Guidance.')
 
@@ -72,6 +80,7 @@ def get_params():
 	other.add_argument('--tree_font_size', default = 12, help = "Change this if you're not quite happy with the font size in the output trees. If you want smaller font in your trees, you can lower this value; and if you want larger font in your trees, you can raise this value. Some common values are 8, 10, and 12. Size 16 font is pretty big, and size 4 font is probably too small for most purposes. Iconoclasts use size 9, 11, or 13 font.")
 	other.add_argument('--keep_temp', action = 'store_true', help = "Use this to keep ALL Guidance intermediate files")
 	other.add_argument('--keep_iter', '-z', action = 'store_true', help = 'Keep all Guidance iterations (beware this will be very large)')
+	other.add_argument('--profile', action = 'store_true', help = 'Record the wall time, CPU time and peak memory of each stage, gene family and external program (DIAMOND, MAFFT, Guidance, trimAl, IQ-Tree, RAxML, FastTree), summarized in Output/Profile.json and Output/Profile.csv')
 
 
 	return parser.parse_args()
@@ -80,6 +89,20 @@ def get_params():
 #Cleaning up existing output and creating a new output folder structure. This function is only called once, in eukphylo.py
 def clean_up(params):
 
+	#If resuming a previous run, keep all existing output and only create any missing folders.
+	if params.resume and os.path.isdir(params.output + '/Output'):
+		#The contamination loop renames the output folders of each iteration (e.g. Pre-Guidance to Pre-Guidance_0),
+		#so a run that already got into the contamination loop cannot be picked up where it stopped.
+		loop_folders = [d for d in os.listdir(params.output + '/Output') if re.match('(Pre-Guidance|Guidance|NotGapTrimmed|Trees)_[0-9]+$', d)]
+		if params.contamination_loop != None and len(loop_folders) > 0:
+			print('\nERROR: The existing "Output" folder is from a run that already started the contamination loop (' + ', '.join(sorted(loop_folders)) + '), which cannot be resumed with --resume. Please start a new run instead.\n')
+			exit()
+
+		print('\nResuming the run in the existing "Output" folder.\n')
+		for dirname in ('Intermediate', 'Pre-Guidance', 'Guidance', 'NotGapTrimmed', 'Trees', 'ColoredTrees'):
+			os.makedirs(params.output + '/Output/' + dirname, exist_ok = True)
+		return
+
 	#If an output folder doesn't exist, create one.
 	if not os.path.isdir(params.output + '/Output'):
 		os.mkdir(params.output + '/Output')
@@ -131,36 +154,47 @@ def clean_up(params):
 	
 
 
+#Hash of a file's contents, used to tell whether the input to a stage has changed since it was checkpointed
+def file_hash(path):
 
+	md5 = hashlib.md5()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 20), b''):
+			md5.update(chunk)
 
+	return md5.hexdigest()
 
 
+#Reading in the checkpoint file as { (stage, OG) : (input hash, [output files]) }. Only used with --resume.
+def load_checkpoints(params):
 
+	checkpoints = { }
+	if params.resume and os.path.isfile(params.output + '/Output/Checkpoints.tsv'):
+		for line in open(params.output + '/Output/Checkpoints.tsv'):
+			line = line.rstrip('\n').split('\t')
+			if len(line) == 4:
+				checkpoints.update({ (line[0], line[1]) : (line[2], [f for f in line[3].split(',') if f != '']) })
 
+	return checkpoints
 
 
+#An OG can be skipped if it was checkpointed for this stage with the same input, and all of its outputs are still there
+def og_complete(checkpoints, stage, og, input_hash):
 
+	if (stage, og) not in checkpoints:
+		return False
 
+	checkpoint_hash, outputs = checkpoints[(stage, og)]
 
+	return checkpoint_hash == input_hash and len(outputs) > 0 and all([os.path.isfile(f) for f in outputs])
 
 
+#Recording that an OG finished a stage, along with the output files expected from it. Nothing is recorded if
+#any of these files is missing (the OG failed), so that the OG is tried again with --resume.
+def record_checkpoint(params, stage, og, input_hash, outputs):
 
+	if len(outputs) == 0 or not all([os.path.isfile(f) for f in outputs]):
+		return
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+	with open(params.output + '/Output/Checkpoints.tsv', 'a') as o:
+		o.write(stage + '\t' + og + '\t' + input_hash + '\t' + ','.join(outputs) + '\n')
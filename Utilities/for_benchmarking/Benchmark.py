@@ -0,0 +1,434 @@
+#Author, date: last updated Oct 2026
+#Motivation: Catch performance regressions in the pure-Python parts of EukPhylo before they reach production runs
+#Intent: Time and measure the memory use of the pipeline's hot paths (PTL2 pre-Guidance, rerooting, clade grabbing, sister-based removal and concatenation; PTL1 codon usage statistics, best OG hit selection and ORF translation) on inputs built from the bundled test data, with DIAMOND and MAFFT replaced by small local stand-ins
+#Dependencies: Python3, numpy, Biopython, ete3, tqdm
+#Inputs: None required; uses PTL1/Genomes/TestData/*_GenBankCDS.fasta, PTL2/test_ogs.txt and PTL2/test_taxa.txt from the repository this script is in
+#Outputs: A folder (--output) with the generated inputs and a Benchmark.json of the results, and one line per benchmark appended to a history file (--history) so that results can be compared over time
+#Example: python3 Benchmark.py --scale 10 --repeats 5
+#IMPORTANT: key parameters explained in "add_argument" section below
+
+#Each coding sequence in the test data is assigned to one of the test gene families (in turn) and translated to
+#make the pre-Guidance input, and --scale makes that many copies of each test taxon (named e.g. Ba_pg_E001) to
+#grow every input. Gene trees are random topologies (with a fixed --seed) whose tips are named after the test taxa
+#and the test data taxa. Each benchmark is run --repeats times after an untimed setup, and the best and median wall
+#times are reported along with the throughput (items per second, using the best time). Peak memory is measured in
+#one extra run with tracemalloc (which slows the code down, so it is never part of the timed runs) and counts the
+#Python allocations of the benchmarked code. Times from the pre-Guidance and concatenation benchmarks include the
+#stand-ins for DIAMOND and MAFFT, which are cheap (identity over the first 100 residues; gap padding) but not free.
+
+#Dependencies
+import os, sys, ast, io, json, time, types, random, shutil
+import argparse, tracemalloc, resource, statistics
+from contextlib import redirect_stdout
+from Bio import SeqIO
+from Bio.Seq import Seq
+import ete3
+
+repo = os.path.abspath(os.path.dirname(os.path.abspath(__file__)) + '/../..')
+
+sys.path.insert(0, repo + '/PTL2/Scripts')
+import preguidance
+import contamination
+import concatenate
+from clade_index import reroot
+
+
+def get_args():
+
+	parser = argparse.ArgumentParser(
+		prog = 'EukPhylo benchmarks, Version 1.0',
+		description = "Updated Oct 2026"
+	)
+#add_argument section with parameters explained
+	parser.add_argument('-o', '--output', type = str, default = 'Benchmark', help = 'Folder for the generated inputs and outputs of the benchmarks, and Benchmark.json. Only the files and folders written by the benchmarks (Data, Stubs, PreGuidance, Concat, Benchmark.json) are replaced at the start of each run.')
+	parser.add_argument('-s', '--scale', type = int, default = 1, help = 'Number of copies of each test taxon to use, to grow every input. Default is 1 (the test data as is).')
+	parser.add_argument('-r', '--repeats', type = int, default = 3, help = 'Number of timed runs of each benchmark. Default is 3.')
+	parser.add_argument('-n', '--trees', type = int, default = 20, help = 'Number of gene trees for the tree benchmarks. Default is 20.')
+	parser.add_argument('-l', '--tree_size', type = int, default = 500, help = 'Number of tips in each gene tree. Default is 500.')
+	parser.add_argument('-b', '--benchmarks', type = str, default = None, help = 'A comma-separated list of benchmarks to run (any of ' + ', '.join(benchmarks) + '). Default is all of them.')
+	parser.add_argument('--seed', type = int, default = 12345, help = 'Seed for the random trees and DIAMOND scores. Default is 12345.')
+	parser.add_argument('--history', type = str, default = None, help = 'Tab-separated file to which one line per benchmark is appended. Default is BenchmarkHistory.tsv next to the --output folder.')
+
+	args = parser.parse_args()
+
+	args.output = os.path.abspath(args.output)
+	if args.history == None:
+		args.history = os.path.dirname(args.output) + '/BenchmarkHistory.tsv'
+
+	if args.benchmarks == None:
+		args.benchmarks = list(benchmarks)
+	else:
+		args.benchmarks = [b.strip() for b in args.benchmarks.split(',') if b.strip() != '']
+		for b in args.benchmarks:
+			if b not in benchmarks:
+				print('\nERROR: unknown benchmark ' + b + '. Choose from ' + ', '.join(benchmarks) + '\n')
+				exit()
+
+	return args
+
+
+#Loads a PTL1 script as a module without running it (these scripts call main() when they are loaded)
+def load_script(path, name):
+
+	tree = ast.parse(open(path).read(), path)
+	tree.body = [node for node in tree.body if not (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and getattr(node.value.func, 'id', None) == 'main')]
+
+	module = types.ModuleType(name)
+	module.__file__ = path
+	exec(compile(tree, path, 'exec'), module.__dict__)
+
+	return module
+
+
+###-------------------------------- Stand-ins for external tools --------------------------------###
+
+#DIAMOND stand-in: makedb copies the input, and blastp reports every query against every database
+#sequence, with the identity over the first 100 residues
+diamond_stub = '''
+import sys, shutil
+
+args = sys.argv[1:]
+def opt(flag):
+	return args[args.index(flag) + 1]
+
+def read_fasta(path):
+	seqs = { }; name = None
+	for line in open(path):
+		line = line.strip()
+		if line.startswith('>'):
+			name = line[1:].split()[0]; seqs.update({ name : '' })
+		elif name != None:
+			seqs[name] += line
+	return seqs
+
+if args[0] == 'makedb':
+	shutil.copy(opt('--in'), opt('-d') + '.dmnd')
+elif args[0] == 'blastp':
+	db = read_fasta(opt('-d')); queries = read_fasta(opt('-q'))
+	with open(opt('-o'), 'w') as o:
+		for q in queries:
+			for d in db:
+				n = min(len(queries[q]), len(db[d]), 100)
+				ident = 100 * sum([a == b for a, b in zip(queries[q][:n], db[d][:n])]) / max(n, 1)
+				o.write('\\t'.join([q, d, '%.1f' % ident, str(n), '0', '0', '1', str(n), '1', str(n), '1e-50', str(n)]) + '\\n')
+'''
+
+#MAFFT stand-in: pads all sequences with gaps to the length of the longest
+mafft_stub = '''
+import sys
+
+seqs = { }; name = None
+for line in open(sys.argv[-1]):
+	line = line.strip()
+	if line.startswith('>'):
+		name = line[1:]; seqs.update({ name : '' })
+	elif name != None:
+		seqs[name] += line
+
+width = max([len(seq) for seq in seqs.values()] + [0])
+for name in seqs:
+	print('>' + name + '\\n' + seqs[name] + '-' * (width - len(seqs[name])))
+'''
+
+
+#Writes the stand-ins to the output folder and puts them first on the PATH
+def write_stubs(args):
+
+	os.makedirs(args.output + '/Stubs', exist_ok = True)
+	for tool, code in (('diamond', diamond_stub), ('mafft', mafft_stub)):
+		with open(args.output + '/Stubs/' + tool, 'w') as o:
+			o.write('#!' + sys.executable + '\n' + code)
+		os.chmod(args.output + '/Stubs/' + tool, 0o755)
+
+	os.environ['PATH'] = args.output + '/Stubs' + os.pathsep + os.environ['PATH']
+
+
+###----------------------------------------- Test data -----------------------------------------###
+
+#Builds all benchmark inputs from the bundled test data. Returns a dictionary of what the benchmarks need.
+def prep_data(args):
+
+	rand = random.Random(args.seed)
+
+	ogs = list(dict.fromkeys([line.strip() for line in open(repo + '/PTL2/test_ogs.txt') if line.strip() != '']))
+	test_taxa = list(dict.fromkeys([line.strip() for line in open(repo + '/PTL2/test_taxa.txt') if line.strip() != '']))
+
+	test_files = sorted([f for f in os.listdir(repo + '/PTL1/Genomes/TestData') if f.endswith('_GenBankCDS.fasta')])
+
+	#Copies of each test taxon (--scale), as { taxon code : [(name, nucleotide sequence, OG)] }
+	cds_per_taxon = { }
+	for file in test_files:
+		recs = [(rec.description, str(rec.seq).upper()) for rec in SeqIO.parse(repo + '/PTL1/Genomes/TestData/' + file, 'fasta')]
+		for k in range(args.scale):
+			taxon = file[:10] if k == 0 else file[:7] + '%03d' % k
+			cds_per_taxon.update({ taxon : [(taxon + '_' + name, seq, ogs[i % len(ogs)]) for i, (name, seq) in enumerate(recs)] })
+
+	for folder in ('NTD', 'AA', 'Trees', 'KeepBest/DiamondOG'):
+		os.makedirs(args.output + '/Data/' + folder, exist_ok = True)
+
+	#Nucleotide files (codon usage) and translated files with OG-assigned names (pre-Guidance)
+	for taxon in cds_per_taxon:
+		with open(args.output + '/Data/NTD/' + taxon + '_GenBankCDS.fasta', 'w') as o:
+			for name, seq, og in cds_per_taxon[taxon]:
+				o.write('>' + name + '\n' + seq + '\n')
+
+		with open(args.output + '/Data/AA/' + taxon + '.faa', 'w') as o:
+			for name, seq, og in cds_per_taxon[taxon]:
+				o.write('>' + name + '_' + og + '\n' + str(Seq(seq[:len(seq) - len(seq) % 3]).translate()).rstrip('*') + '\n')
+
+	with open(args.output + '/Data/taxa.txt', 'w') as o:
+		for taxon in cds_per_taxon:
+			o.write(taxon + '\n')
+
+	#Random gene trees with tips from the test taxa and the test data taxa
+	random.seed(args.seed)
+	tip_taxa = test_taxa + [taxon for taxon in cds_per_taxon if taxon not in test_taxa]
+	tree_files = []; n_leaves = 0
+	for t in range(args.trees):
+		og = ogs[t % len(ogs)]
+		names = [rand.choice(tip_taxa) + '_Contig_' + str(i + 1) + '_Len' + str(rand.randint(300, 3000)) + '_' + og for i in range(args.tree_size)]
+
+		tree = ete3.Tree()
+		tree.populate(args.tree_size, names_library = names, random_branches = True)
+
+		tree_files.append(args.output + '/Data/Trees/' + og + '_' + str(t + 1) + '.tre')
+		with open(tree_files[-1], 'w') as o:
+			o.write(tree.write() + '\n')
+		n_leaves += len(tree)
+
+	#A DIAMOND table of OG hits (ten per transcript, with random bit scores) for keep_best
+	n_hits = 0
+	with open(args.output + '/Data/KeepBest/DiamondOG/allOGresults.tsv', 'w') as o:
+		for taxon in cds_per_taxon:
+			for name, seq, og in cds_per_taxon[taxon]:
+				for h in range(10):
+					subject = rand.choice(test_taxa) + '_' + str(rand.randint(1, 99999)) + '_' + rand.choice(ogs)
+					o.write('\t'.join([name, subject, '%.1f' % rand.uniform(30, 100), '300', '10', '1', '1', '900', '1', '300', '1e-30', '%.1f' % rand.uniform(50, 1000)]) + '\n')
+					n_hits += 1
+
+	return { 'ogs' : ogs, 'cds' : cds_per_taxon, 'tree_files' : tree_files, 'n_leaves' : n_leaves, 'n_hits' : n_hits }
+
+
+###----------------------------------------- Benchmarks -----------------------------------------###
+
+#Each benchmark has an untimed setup, which returns the state for the timed run and the number of items it
+#processes, and the timed run itself.
+
+def setup_preguidance(args, data):
+
+	params = argparse.Namespace(gf_list = repo + '/PTL2/test_ogs.txt', taxon_list = args.output + '/Data/taxa.txt', sim_taxa = None, blacklist = None, data = args.output + '/Data/AA', output = args.output + '/PreGuidance', og_identifier = 'OG', similarity_filter = True, sim_iterative = False, sim_cutoff = 1, keep_temp = False, profile = False)
+
+	shutil.rmtree(params.output, ignore_errors = True)
+	os.makedirs(params.output + '/Output/Pre-Guidance')
+
+	return params, sum([len(recs) for recs in data['cds'].values()])
+
+def run_preguidance(params):
+
+	preguidance.run(params)
+
+
+def setup_reroot(args, data):
+
+	return [ete3.Tree(contamination.get_newick(file)) for file in data['tree_files']], data['n_leaves']
+
+def run_reroot(trees):
+
+	for tree in trees:
+		reroot(tree)
+
+
+def setup_subtrees(args, data):
+
+	params = argparse.Namespace(clade_grabbing_exceptions = None, clade_grabbing_rules_file = None, target_taxa = 'Op,Sr', num_contams = 2, min_target_presence = 8, required_taxa = None, required_taxa_num = 0)
+
+	return (params, data['tree_files']), data['n_leaves']
+
+def run_subtrees(state):
+
+	params, tree_files = state
+	for file in tree_files:
+		contamination.get_subtrees(params, file)
+
+
+def setup_sisters(args, data):
+
+	params = argparse.Namespace(cocontaminants = None, subsister_rules = 'benchmark')
+	sister_contam_per_tax = { 'Sr' : [('Ba', float('inf')), ('Za', float('inf'))], 'Op' : [('Pl', 1.0)], 'Am' : [('Ex', 2.0)] }
+	subsister_contam_per_tax = { 'Sr' : ['Ba'], 'Ex' : ['Op_me'] }
+
+	return (params, data['tree_files'], sister_contam_per_tax, subsister_contam_per_tax), data['n_leaves']
+
+def run_sisters(state):
+
+	params, tree_files, sister_contam_per_tax, subsister_contam_per_tax = state
+	for file in tree_files:
+		contamination.get_sisters(params, file, sister_contam_per_tax, subsister_contam_per_tax)
+
+
+def setup_concat(args, data):
+
+	params = argparse.Namespace(output = args.output + '/Concat', profile = False)
+
+	shutil.rmtree(params.output, ignore_errors = True)
+	os.makedirs(params.output + '/Output')
+
+	#One sequence per taxon (the first of each taxon in the gene family)
+	seqs_per_og = { }
+	for og in data['ogs']:
+		seqs_per_og.update({ og + '.fasta' : [] })
+		for taxon in data['cds']:
+			for rec in SeqIO.parse(args.output + '/Data/AA/' + taxon + '.faa', 'fasta'):
+				if rec.id.endswith(og):
+					seqs_per_og[og + '.fasta'].append(rec)
+					break
+
+	return (seqs_per_og, params), sum([len(recs) for recs in seqs_per_og.values()])
+
+def run_concat(state):
+
+	seqs_per_og, params = state
+	concatenate.concat(seqs_per_og, params)
+
+
+def setup_cub(args, data):
+
+	files = [args.output + '/Data/NTD/' + taxon + '_GenBankCDS.fasta' for taxon in data['cds']]
+
+	return files, sum([len(seq) for recs in data['cds'].values() for name, seq, og in recs])
+
+def run_cub(files):
+
+	for file in files:
+		CUB.CalcRefFasta(file, 'universal')
+
+
+def setup_keep_best(args, data):
+
+	return argparse.Namespace(input_file = args.output + '/Data/KeepBest/Transcripts.fasta'), data['n_hits']
+
+def run_keep_best(params):
+
+	AssignOGs.keep_best(params)
+
+
+#prot_dict entries as made by prep_translations in 5_GCodeTranslate.py, for a forward BLAST hit covering all
+#but the first and last five codons of each coding sequence, so that the start codon search is run as well
+def setup_translate(args, data):
+
+	prot_dicts = []; n_bases = 0
+	for taxon in data['cds']:
+		prot_dict = { }
+		for name, seq, og in data['cds'][taxon]:
+			n_codons = len(seq)//3
+			if n_codons > 20:
+				prot_dict.update({ name : ['F', 15, 3*(n_codons - 5) + 3, '6..' + str(n_codons - 5), seq] })
+				n_bases += len(seq)
+		prot_dicts.append(prot_dict)
+
+	return (prot_dicts, argparse.Namespace(genetic_code = 'universal', short_out = args.output + '/ShortTranscripts_FromTranslation.txt')), n_bases
+
+def run_translate(state):
+
+	prot_dicts, params = state
+	for prot_dict in prot_dicts:
+		GCodeTranslate.extract_ORF(prot_dict, 1, params)
+
+
+#Name : (setup, timed run, unit of the items counted by the setup)
+benchmarks = {
+	'preguidance' : (setup_preguidance, run_preguidance, 'seqs'),
+	'reroot' : (setup_reroot, run_reroot, 'tips'),
+	'get_subtrees' : (setup_subtrees, run_subtrees, 'tips'),
+	'get_sisters' : (setup_sisters, run_sisters, 'tips'),
+	'concat' : (setup_concat, run_concat, 'seqs'),
+	'CalcRefFasta' : (setup_cub, run_cub, 'nt'),
+	'keep_best' : (setup_keep_best, run_keep_best, 'hits'),
+	'translate' : (setup_translate, run_translate, 'nt')
+}
+
+
+###------------------------------------- Running and reporting -------------------------------------###
+
+#Runs one benchmark --repeats times and once more under tracemalloc. Output printed by the pipeline code is hidden.
+def run_benchmark(args, data, name):
+
+	setup, run, unit = benchmarks[name]
+
+	times = []
+	for r in range(args.repeats):
+		state, n_items = setup(args, data)
+		with redirect_stdout(io.StringIO()):
+			start = time.perf_counter()
+			run(state)
+			times.append(time.perf_counter() - start)
+
+	state, n_items = setup(args, data)
+	tracemalloc.start()
+	with redirect_stdout(io.StringIO()):
+		run(state)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	return { 'benchmark' : name, 'items' : n_items, 'unit' : unit, 'best_s' : min(times), 'median_s' : statistics.median(times), 'items_per_s' : n_items / max(min(times), 1e-9), 'peak_py_mb' : peak / (1024 * 1024) }
+
+
+def write_results(args, results):
+
+	commit = os.popen('git -C ' + repo + ' rev-parse --short HEAD 2>/dev/null').read().strip()
+	date = time.strftime('%Y-%m-%d %H:%M:%S')
+
+	#ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+	max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+	with open(args.output + '/Benchmark.json', 'w') as o:
+		json.dump({ 'date' : date, 'commit' : commit, 'python' : sys.version.split()[0], 'platform' : sys.platform, 'scale' : args.scale, 'repeats' : args.repeats, 'trees' : args.trees, 'tree_size' : args.tree_size, 'seed' : args.seed, 'max_rss_mb' : max_rss, 'results' : results }, o, indent = 1)
+
+	fields = ['date', 'commit', 'benchmark', 'scale', 'repeats', 'items', 'unit', 'best_s', 'median_s', 'items_per_s', 'peak_py_mb']
+	new_file = not os.path.isfile(args.history)
+	with open(args.history, 'a') as o:
+		if new_file:
+			o.write('\t'.join(fields) + '\n')
+		for result in results:
+			row = dict(result, date = date, commit = commit, scale = args.scale, repeats = args.repeats)
+			o.write('\t'.join([('%.4f' % row[field]) if type(row[field]) == float else str(row[field]) for field in fields]) + '\n')
+
+	print('\n' + '%-14s%12s%8s%12s%12s%16s%14s' % ('Benchmark', 'Items', 'Unit', 'Best (s)', 'Median (s)', 'Items/s', 'Peak (MB)'))
+	for result in results:
+		print('%-14s%12d%8s%12.4f%12.4f%16.1f%14.2f' % (result['benchmark'], result['items'], result['unit'], result['best_s'], result['median_s'], result['items_per_s'], result['peak_py_mb']))
+	print('\nMax RSS of the benchmark process: %.1f MB' % max_rss)
+	print('Results written to ' + args.output + '/Benchmark.json and appended to ' + args.history + '\n')
+
+
+def main():
+
+	global CUB, AssignOGs, GCodeTranslate
+
+	args = get_args()
+
+	CUB = load_script(repo + '/PTL1/Transcriptomes/Scripts/CUB.py', 'CUB')
+	AssignOGs = load_script(repo + '/PTL1/Transcriptomes/Scripts/3_AssignOGs.py', 'AssignOGs')
+	GCodeTranslate = load_script(repo + '/PTL1/Transcriptomes/Scripts/5_GCodeTranslate.py', 'GCodeTranslate')
+
+	#Only removing what an earlier benchmark run wrote to this folder, never the folder itself
+	for folder in ('Data', 'Stubs', 'PreGuidance', 'Concat'):
+		shutil.rmtree(args.output + '/' + folder, ignore_errors = True)
+	for file in ('Benchmark.json', 'ShortTranscripts_FromTranslation.txt'):
+		if os.path.isfile(args.output + '/' + file):
+			os.remove(args.output + '/' + file)
+	os.makedirs(args.output, exist_ok = True)
+
+	write_stubs(args)
+
+	print('\nBuilding benchmark inputs from the test data (scale ' + str(args.scale) + ')\n')
+	data = prep_data(args)
+
+	results = []
+	for name in args.benchmarks:
+		print('Running ' + name)
+		results.append(run_benchmark(args, data, name))
+
+	write_results(args, results)
+
+
+main()
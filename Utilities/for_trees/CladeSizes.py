@@ -11,6 +11,7 @@ import os, sys, re
 import ete3
 import argparse
 from tqdm import tqdm
+from clade_index import CladeIndex, reroot
 
 
 #Extract Newick string
@@ -25,46 +26,6 @@ def get_newick(fname):
 	return newick
 
 
-#This function reroots the tree on the largest Ba/Za clade. If there is no prokaryote clade,
-#it roots on the largest Op clade, then Pl, then Am, then Ex, then Sr.
-def reroot(tree):
-
-	#This nested function returns the largest clade of a given taxonomic group
-	def get_best_clade(taxon):
-
-		best_size = 0; best_clade = []; seen_leaves = []
-		#Traverse all nodes
-		for node in tree.traverse('levelorder'):
-			#If the node is big enough and not subsumed by a node we've already accepted
-			if len(node) >= 3 and len(list(set(seen_leaves) & set([leaf.name for leaf in node]))) == 0:
-				leaves = [leaf.name for leaf in node]
-				
-				#Create a record of leaves that belong to the taxonomic group
-				target_leaves = set()
-				for leaf in leaves[::-1]:
-					if leaf[:2] in taxon:
-						target_leaves.add(leaf[:10])
-						leaves.remove(leaf)
-
-				#If this clade is better than any clade we've seen before, grab it
-				if len(target_leaves) > best_size and len(leaves) <= 2:
-					best_clade = node
-					best_size = len(target_leaves)
-					seen_leaves.extend([leaf.name for leaf in node])
-
-		return best_clade
-
-	#Get the biggest clade for each taxonomic group (stops once it finds one)
-	for taxon in [('Ba', 'Za'), ('Op'), ('Pl'), ('Am'), ('Ex'), ('Sr')]:
-		clade = get_best_clade(taxon)
-		if len([leaf for leaf in clade if leaf.name[:2] in taxon]) > 3:
-			tree.set_outgroup( clade)
-
-			break
-
-	return tree
-	
-	
 def get_clades(file, args):
 
 	newick = get_newick(file)	
@@ -85,53 +46,47 @@ def get_clades(file, args):
 		mins = list(dict.fromkeys([leaf.name[:5] for leaf in tree]))
 
 
+	#Indexing the (rerooted) tree once, so that each clade test below is a few bitmask operations
+	index = CladeIndex(tree)
+
 	#For each major and minor clade, find all monophyletic clades of that taxon
-	clades_per_tax = { }; majs_per_clade = { }; mins_per_clade = { }; seen_leaves_majs = []
+	clades_per_tax = { }; majs_per_clade = { }; mins_per_clade = { }; seen_majs = 0
 	for clade_code in majs + mins:
 
 		if type(clade_code) is str:
 			clades_per_tax.update({ clade_code : [] })
+			target_taxa = index.group_mask(index.leaf_mask(lambda leaf : leaf.startswith(clade_code)))
 		elif type(clade_code) is list:
 			clades_per_tax.update({ args.taxon_group : [] })
 			majs_per_clade.update({ args.taxon_group : [] })
 			mins_per_clade.update({ args.taxon_group : [] })
+			target_taxa = index.group_mask(index.leaf_mask(lambda leaf : any([leaf.startswith(code) for code in clade_code])))
 
-		seen_leaves = []
+		seen = 0
 		for node in tree.traverse('levelorder'):
-			if len(list(set(seen_leaves) & set([leaf.name for leaf in node]))) == 0 and len([leaf for leaf in node]) >= args.size:
-				if (len(clade_code) == 5 and args.single_mins_only and len(list(set(seen_leaves_majs) & set([leaf.name for leaf in node]))) == 0) or (len(clade_code) == 2 or not args.single_mins_only):
-					
-					leaves = [leaf.name for leaf in node]
+			if index.mask[node] & seen == 0 and index.size[node] >= args.size:
+				if (len(clade_code) == 5 and args.single_mins_only and index.mask[node] & seen_majs == 0) or (len(clade_code) == 2 or not args.single_mins_only):
 
-					taxa = list(dict.fromkeys([leaf[:10] for leaf in leaves]))
-
-					target_leaves = set()
-					for leaf in leaves[::-1]:
-						if type(clade_code) is str:
-							if leaf.startswith(clade_code):
-								target_leaves.add(leaf[:10])
-						elif type(clade_code) is list:
-							for code in clade_code:
-								if leaf.startswith(code):
-									target_leaves.add(leaf[:10])
-									break
+					n_taxa = index.count_groups(node, 10)
+					n_target = index.count_groups(node, 10, target_taxa)
 
-					minors = len(list(dict.fromkeys([l[:5] for l in target_leaves])))
+					#Only used below when every taxon in the clade is a target taxon
+					minors = index.count_groups(node, 5)
 
-					if len(target_leaves) == len(taxa) and len(target_leaves) >= args.size:
+					if n_target == n_taxa and n_target >= args.size:
 						if type(clade_code) is str and ((len(clade_code) == 2 and args.majs_req_mult_mins and minors > 1) or (len(clade_code) == 2 and not args.majs_req_mult_mins) or len(clade_code) == 5):
-							clades_per_tax[clade_code].append(len(list(dict.fromkeys([l[:10] for l in target_leaves]))))
-							seen_leaves.extend([leaf.name for leaf in node])
+							clades_per_tax[clade_code].append(n_target)
+							seen |= index.mask[node]
 
 							if len(clade_code) == 2:
-								seen_leaves_majs.extend(seen_leaves)
+								seen_majs |= seen
 
 						elif type(clade_code) is list:
-							clades_per_tax[args.taxon_group].append(len(list(dict.fromkeys([l[:10] for l in target_leaves]))))
-							majs_per_clade[args.taxon_group].append(len(list(dict.fromkeys([l[:2] for l in target_leaves]))))
+							clades_per_tax[args.taxon_group].append(n_target)
+							majs_per_clade[args.taxon_group].append(index.count_groups(node, 2))
 							mins_per_clade[args.taxon_group].append(minors)
 
-							seen_leaves.extend([leaf.name for leaf in node])
+							seen |= index.mask[node]
 
 					
 
@@ -0,0 +1,130 @@
+#Author, date: last updated Oct 2026
+#Motivation: Make clade searches on large gene trees fast
+#Intent: Shared engine (same as PTL2/Scripts/clade_index.py) that stores, for every node of a tree, bitmasks of its leaves and of the taxa (10 digits), minor clades (5 digits) and major clades (2 digits) under it, built in one postorder pass
+#Dependencies: Python3, ete3
+#Inputs: An ete3 tree (imported by CladeSizes.py, not run directly)
+#Outputs: None
+#Example: from clade_index import CladeIndex, reroot
+
+
+#Number of set bits in a mask
+def popcount(mask):
+
+	return bin(mask).count('1')
+
+
+class CladeIndex:
+
+	#Builds all node masks in one postorder pass. The tree must not be rerooted or
+	#otherwise restructured after the index is built.
+	def __init__(self, tree):
+
+		self.tree = tree
+		self.names = []
+		self.name_masks = { }
+		self.mask = { }
+		self.size = { }
+		self.codes = { 2 : { }, 5 : { }, 10 : { } }
+		self.groups = { 2 : { }, 5 : { }, 10 : { } }
+
+		for node in tree.traverse('postorder'):
+			if node.is_leaf():
+				self.mask.update({ node : 1 << len(self.names) })
+				self.size.update({ node : 1 })
+				self.name_masks.update({ node.name : self.name_masks.get(node.name, 0) | 1 << len(self.names) })
+				self.names.append(node.name)
+
+				for level in self.codes:
+					code = node.name[:level]
+					if code not in self.codes[level]:
+						self.codes[level].update({ code : len(self.codes[level]) })
+					self.groups[level].update({ node : 1 << self.codes[level][code] })
+			else:
+				mask = 0; size = 0; groups = { level : 0 for level in self.groups }
+				for child in node.children:
+					mask |= self.mask[child]
+					size += self.size[child]
+					for level in groups:
+						groups[level] |= self.groups[level][child]
+
+				self.mask.update({ node : mask })
+				self.size.update({ node : size })
+				for level in groups:
+					self.groups[level].update({ node : groups[level] })
+
+	#Mask of all leaves whose names satisfy the given function
+	def leaf_mask(self, predicate):
+
+		mask = 0
+		for i, name in enumerate(self.names):
+			if predicate(name):
+				mask |= 1 << i
+
+		return mask
+
+	#Mask of the codes at the given level (2, 5 or 10 characters) of all leaves in a leaf mask
+	def group_mask(self, leaf_mask, level = 10):
+
+		mask = 0
+		for i, name in enumerate(self.names):
+			if leaf_mask >> i & 1:
+				mask |= 1 << self.codes[level][name[:level]]
+
+		return mask
+
+	#Mask of all leaves with the given name
+	def name_mask(self, name):
+
+		return self.name_masks.get(name, 0)
+
+	#Leaf names in a mask, in tree order
+	def leaf_names(self, mask):
+
+		return [name for i, name in enumerate(self.names) if mask >> i & 1]
+
+	#Number of distinct codes at the given level among the leaves of a node, optionally
+	#restricted to the codes in a group mask
+	def count_groups(self, node, level = 10, group_mask = -1):
+
+		return popcount(self.groups[level][node] & group_mask)
+
+
+#This function finds the largest clade of a given taxonomic group (a tuple of two-letter
+#major clade codes) with no more than two leaves outside of the group. Nodes are visited
+#from the root down, and nodes inside an already accepted clade are skipped.
+def get_best_clade(tree, index, taxon):
+
+	target = index.leaf_mask(lambda leaf : leaf[:2] in taxon)
+	target_taxa = index.group_mask(target)
+
+	best_size = 0; best_clade = []; seen = 0
+	for node in tree.traverse('levelorder'):
+		#If the node is big enough and not subsumed by a node we've already accepted
+		if index.size[node] >= 3 and index.mask[node] & seen == 0:
+			n_target = index.count_groups(node, 10, target_taxa)
+			n_other = popcount(index.mask[node] & ~target)
+
+			#If this clade is better than any clade we've seen before, grab it
+			if n_target > best_size and n_other <= 2:
+				best_clade = node
+				best_size = n_target
+				seen |= index.mask[node]
+
+	return best_clade
+
+
+#This function reroots the tree on the largest Ba/Za clade. If there is no prokaryote clade,
+#it roots on the largest Op clade, then Pl, then Am, then Ex, then Sr.
+def reroot(tree):
+
+	index = CladeIndex(tree)
+
+	#Get the biggest clade for each taxonomic group (stops once it finds one)
+	for taxon in [('Ba', 'Za'), ('Op'), ('Pl'), ('Am'), ('Ex'), ('Sr')]:
+		clade = get_best_clade(tree, index, taxon)
+		if len([leaf for leaf in clade if leaf.name[:2] in taxon]) > 3:
+			tree.set_outgroup( clade)
+
+			break
+
+	return tree